@@ -1,5 +1,6 @@
 import os
-import requests
+
+from http_client import get_http
 
 API_URL = "https://bootloader.czarmetricsystem.com/api/auth/serviceEngineer/phonelogin"
 
@@ -17,7 +18,7 @@ def login_api(phone, password):
     print("Payload:", payload)
 
     try:
-        res = requests.post(API_URL, json=payload, timeout=10)
+        res = get_http().post(API_URL, json=payload)
 
         print("Status Code:", res.status_code)
         print("Raw Response:", res.text)
@@ -0,0 +1,58 @@
+# benchmarks/bench_crc16.py
+"""
+Compare the CRC-16 implementations in du_utils.
+
+Run from the repo root:
+    python benchmarks/bench_crc16.py [frames]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import du_utils
+from du_utils import (
+    FRAME_SIZE,
+    FRAME_CRC_OFFSET,
+    calculate_crc16,
+    calculate_crc16_bitwise,
+    calculate_crc16_bulk,
+)
+
+
+def _best_of(fn, repeat=3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    data = os.urandom(FRAME_SIZE * frame_count)
+    view = memoryview(data)
+    frames = [view[i:i + FRAME_CRC_OFFSET] for i in range(0, len(data), FRAME_SIZE)]
+
+    expected = [calculate_crc16_bitwise(f) for f in frames]
+    assert [calculate_crc16(f) for f in frames] == expected
+    assert calculate_crc16_bulk(data) == expected
+
+    results = [
+        ("bitwise (old calculate_crc16)", _best_of(lambda: [calculate_crc16_bitwise(f) for f in frames])),
+        ("table calculate_crc16", _best_of(lambda: [calculate_crc16(f) for f in frames])),
+        ("calculate_crc16_bulk" + (" (numpy)" if du_utils.get_numpy() is not None else " (pure python)"),
+         _best_of(lambda: calculate_crc16_bulk(data))),
+    ]
+
+    mb = len(data) / (1024 * 1024)
+    baseline = results[0][1]
+    print(f"{frame_count} frames x {FRAME_SIZE} bytes ({mb:.2f} MiB)")
+    for name, secs in results:
+        print(f"  {name:<40} {secs * 1000:9.2f} ms  {mb / secs:8.2f} MiB/s  x{baseline / secs:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_gpio.py
+"""
+Compare GPIO toggle latency of the gpio_control backends.
+
+Run from the repo root (on the Pi for the hardware backends):
+    python benchmarks/bench_gpio.py [toggles] [pin]
+
+Backends that cannot be used here (no gpioset, no gpiod bindings) are skipped.
+The mock backend shows the Python overhead alone.
+"""
+import os
+import shutil
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpio_control import BL_DETECT_Pin, LibgpiodBackend, MockBackend, SubprocessBackend
+
+
+def _toggle(backend, pin: int, count: int) -> list:
+    times = []
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for i in range(count):
+            start = time.perf_counter()
+            backend.set(pin, i & 1)
+            times.append(time.perf_counter() - start)
+    return sorted(times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pin = int(sys.argv[2]) if len(sys.argv) > 2 else BL_DETECT_Pin
+
+    backends = [("mock", MockBackend)]
+    if shutil.which("gpioset"):
+        backends.append(("subprocess (gpioset)", SubprocessBackend))
+    backends.append(("libgpiod (persistent lines)", LibgpiodBackend))
+
+    print(f"{count} toggles on pin {pin}")
+    for name, factory in backends:
+        try:
+            backend = factory()
+        except Exception as e:
+            print(f"  {name:<30} skipped: {e}")
+            continue
+        try:
+            times = _toggle(backend, pin, count)
+        finally:
+            backend.close()
+        mean = sum(times) / len(times)
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        print(f"  {name:<30} mean {mean * 1e6:10.1f} us  p99 {p99 * 1e6:10.1f} us  "
+              f"max {times[-1] * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
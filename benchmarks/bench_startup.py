@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+"""
+Kiosk startup cost: import time per module and construction time per page.
+
+Run from the repo root (needs a display for the page part):
+    python benchmarks/bench_startup.py
+
+Each import is timed in a fresh interpreter so modules already loaded by an
+earlier import do not hide their cost. "import main" also lists which heavy
+libraries it pulled in (should be none of boto3 / Crypto / requests).
+"""
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = [
+    # what main.py imports at startup
+    "ttkbootstrap", "wifi_utils", "t9_keypad", "t9_predict", "ui_utils", "task_runner", "gpio_control", "main",
+    # loaded later, on first use
+    "du_reader", "bootloader_download", "http_client", "requests", "Crypto.Cipher.AES", "boto3",
+]
+HEAVY = ("boto3", "Crypto", "requests", "serial", "numpy")
+
+_PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+try:
+    import {module}
+except ImportError as e:
+    print("skip", e)
+else:
+    print(time.perf_counter() - start, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_import(module: str):
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(root=ROOT, module=module, heavy=HEAVY)],
+        capture_output=True, text=True, cwd=ROOT,
+    ).stdout.strip().splitlines()
+    return out[-1] if out else "skip (no output)"
+
+
+def time_pages() -> None:
+    try:
+        import main
+    except ImportError as e:
+        print(f"  skipped: {e}")
+        return
+    import tkinter
+
+    try:
+        start = time.perf_counter()
+        app = main.App()
+        app.update()  # first paint
+    except tkinter.TclError as e:
+        print(f"  skipped: {e}")
+        return
+    print(f"  {'App() + first paint':<24} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    try:
+        for page in (main.ScanPage, main.WifiListPage, main.WifiPasswordPage,
+                     main.WifiConnectingPage, main.LoginPage, main.ProgramPage):
+            app.frames[page]
+        for name, secs in app.frames.build_times.items():
+            print(f"  {name:<24} {secs * 1000:8.1f} ms")
+    finally:
+        app.destroy()
+
+
+def main():
+    print("import time (fresh interpreter each)")
+    for module in MODULES:
+        result = time_import(module)
+        if result.startswith("skip"):
+            print(f"  {module:<24} {result}")
+            continue
+        secs, _, heavy = result.partition(" ")
+        note = f"  loads: {heavy}" if heavy else ""
+        print(f"  {module:<24} {float(secs) * 1000:8.1f} ms{note}")
+
+    print("page construction")
+    time_pages()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_t9.py
+"""
+T9Keypad latency: layout switch (key 10), keypad construction and re-targeting,
+and predictive lookups (t9_predict) against a synthetic dictionary.
+
+Run from the repo root (needs a display for the Tk part):
+    python benchmarks/bench_t9.py [rounds]
+
+"build keypad" is what every layout switch and every Entry focus used to
+cost (all 12 keys destroyed and rebuilt); "layout switch" and "retarget"
+are what they cost now. The key lookup and prediction parts run without a
+display.
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import timeit
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+KEY_ORDER = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "0", "11"]
+
+
+def _report(name: str, times: list) -> None:
+    times = sorted(times)
+    avg = sum(times) / len(times)
+    p95 = times[int(len(times) * 0.95) - 1]
+    print(f"  {name:<28} avg {avg * 1000:7.3f} ms   p95 {p95 * 1000:7.3f} ms")
+
+
+def bench_lookup(rounds: int) -> None:
+    keys = [{"number": n, "letters": [n], "showletters": [""]} for n in KEY_ORDER]
+    key_map = {k["number"]: k for k in keys}
+    number = 10000 * rounds
+    for key in ("1", "11"):
+        linear = timeit.timeit(lambda: next((k for k in keys if k["number"] == key), None), number=number)
+        mapped = timeit.timeit(lambda: key_map.get(key), number=number)
+        print(f"  key {key:<3} next(...) {linear / number * 1e9:7.0f} ns   dict {mapped / number * 1e9:7.0f} ns")
+
+
+def bench_predict(rounds: int, words: int = 50000) -> None:
+    from t9_predict import T9Dictionary, key_sequence
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "words.txt")
+        with open(path, "w") as f:
+            for _ in range(words):
+                word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12)))
+                f.write(f"{word}\t{rng.randint(1, 100)}\n")
+        start = time.perf_counter()
+        dictionary = T9Dictionary(history_path=os.path.join(tmp, "history.json"), words_path=path)
+        print(f"  load {words} words           {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    dictionary.set_ssids(["Home-WiFi", "Office_5G", "Guest"])
+    queries = [key_sequence("".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 8))))
+               for _ in range(rounds * 100)]
+    times = []
+    for sequence in queries:
+        start = time.perf_counter()
+        dictionary.suggest(sequence)
+        times.append(time.perf_counter() - start)
+    _report("suggest()", times)
+
+
+def bench_tk(rounds: int) -> None:
+    import tkinter as tk
+    from t9_keypad import T9Keypad
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"  skipped: {e}")
+        return
+    try:
+        entries = [tk.Entry(root), tk.Entry(root)]
+        for entry in entries:
+            entry.pack()
+
+        builds = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            keypad = T9Keypad(root, entries[0], lambda: None)
+            keypad.pack(side="bottom", fill="x")
+            root.update_idletasks()
+            builds.append(time.perf_counter() - start)
+            keypad.destroy()
+        _report("build keypad (old path)", builds)
+
+        keypad = T9Keypad(root, entries[0], lambda: None)
+        keypad.pack(side="bottom", fill="x")
+        root.update_idletasks()
+
+        switches = []
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            for _ in range(rounds):
+                start = time.perf_counter()
+                keypad.handle_key_press("10")
+                root.update_idletasks()
+                switches.append(time.perf_counter() - start)
+        _report("layout switch", switches)
+
+        retargets = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            keypad.retarget(entries[i & 1])
+            keypad.pack(side="bottom", fill="x")
+            root.update_idletasks()
+            retargets.append(time.perf_counter() - start)
+        _report("retarget + show", retargets)
+    finally:
+        root.destroy()
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print("key lookup")
+    bench_lookup(rounds)
+    print("predictive dictionary")
+    bench_predict(rounds)
+    print(f"Tk ({rounds} rounds)")
+    bench_tk(rounds)
+
+
+if __name__ == "__main__":
+    main()
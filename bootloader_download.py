@@ -3,16 +3,22 @@ import time
 import json
 import base64
 import requests
-import serial
 import tempfile
+import mmap
+from collections import deque
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait as wait_futures
 
 from du_utils import (
-    generate_hash,           # hex-string version (we will use bytes variant locally)
-    decrypt_file,            # expects (hex_string, key_bytes) -> bytes
+    generate_hash_bytes,     # sha256 hex of bytes-like data
+    decrypt_file_bytes,      # expects (bytes, key_bytes) -> bytes
     decrypt_key_kms,         # KMS decrypt (ciphertext bytes) -> plaintext bytes
     format_hash_to_64_bytes, # hex-string -> 64-byte packet
 )
-from gpio_control import turn_BL_Detect_High, turn_BL_Detect_Low
+from firmware_cache import FirmwareCache, get_firmware_cache
+from firmware_transfer import FirmwareTransferError, transfer_image
+from serial_session import DEFAULT_SERIAL_PORT, get_session
+from http_client import HTTP_POOL_SIZE, HTTP_PROBE_TIMEOUT, get_http
+from task_runner import CancelToken, TaskCancelled
 
 import hashlib
 
@@ -21,7 +27,622 @@ load_dotenv()
 
 # --------- helper: sha256 of bytes (hex) ----------
 def sha256_hex_of_bytes(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
+    return generate_hash_bytes(b)
+
+# --------- streaming download pipeline ----------
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", "65536"))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "5"))
+DOWNLOAD_CHECKPOINT_BYTES = 1024 * 1024  # sidecar offset refresh interval
+FIRMWARE_DOWNLOAD_DIR = os.getenv(
+    "FIRMWARE_DOWNLOAD_DIR", os.path.join(tempfile.gettempdir(), "fw_downloads")
+)
+AES_BLOCK_SIZE = 16
+
+
+class FirmwareDownloadError(Exception):
+    """Download/verify failure. str(exc) is the UI message incl. error code."""
+
+
+class FirmwarePipeline:
+    """
+    Single pass over the encrypted image as it downloads:
+    sha256(encrypted) -> AES-256-ECB decrypt -> sha256(plain) -> sink.write(plain)
+
+    Chunks may be any size; bytes past the last 16-byte boundary are held
+    back until the next chunk. Peak memory is about one chunk, not the image.
+    """
+
+    def __init__(self, key: bytes, sink):
+        self.key = key
+        self.sink = sink
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over from byte 0 (also empties the sink)."""
+        self.encrypted_hash = hashlib.sha256()
+        self.original_hash = hashlib.sha256()
+        self.size = 0
+        self._tail = b""
+        self.sink.seek(0)
+        self.sink.truncate()
+
+    def feed(self, chunk: bytes) -> None:
+        self.encrypted_hash.update(chunk)
+        self.size += len(chunk)
+
+        data = self._tail + chunk if self._tail else chunk
+        aligned = len(data) - (len(data) % AES_BLOCK_SIZE)
+        if aligned:
+            plain = decrypt_file_bytes(memoryview(data)[:aligned], self.key)
+            self.original_hash.update(plain)
+            self.sink.write(plain)
+        self._tail = bytes(data[aligned:])
+
+    def finish(self) -> None:
+        if self._tail:
+            raise ValueError("encrypted file length is not a multiple of 16 bytes")
+        self.sink.flush()
+
+
+class PartialDownload:
+    """
+    Encrypted bytes received so far for one file_id (<file_id>.part) plus a
+    JSON sidecar (<file_id>.part.json) holding the offset and the expected
+    hashes / key header, so an interrupted download can continue with Range.
+    """
+
+    def __init__(self, file_id: str, directory: str = FIRMWARE_DOWNLOAD_DIR):
+        safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(file_id))
+        self.path = os.path.join(directory, f"{safe_id}.part")
+        self.meta_path = self.path + ".json"
+        self.meta = None
+        self._fh = None
+        self._last_checkpoint = 0
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def load(self) -> dict | None:
+        """Saved sidecar metadata if a usable partial file exists, else None."""
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.path) or not meta.get("encrypted_hash"):
+            return None
+        # bytes written after the last checkpoint are fine too (append-only),
+        # but never trust more than the file actually holds
+        meta["offset"] = self.size
+        return meta
+
+    def open(self, meta: dict, truncate: bool = False) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.close()
+        self.meta = dict(meta)
+        self._fh = open(self.path, "wb" if truncate else "ab")
+        self._last_checkpoint = self.size
+        self.checkpoint()
+
+    def append(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        if self._fh.tell() - self._last_checkpoint >= DOWNLOAD_CHECKPOINT_BYTES:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Flush data to disk, then record the offset in the sidecar."""
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self.meta["offset"] = self._last_checkpoint = self._fh.tell()
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def replay(self, pipeline: FirmwarePipeline, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> None:
+        """Re-hash / re-decrypt the bytes already on disk to restore pipeline state."""
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                pipeline.feed(chunk)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self.checkpoint()
+            self._fh.close()
+            self._fh = None
+
+    def discard(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        for path in (self.path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_firmware_headers(resp) -> dict:
+    """x-original-file-hash / x-encrypted-file-hash / x-encrypted-key from a download response."""
+    # requests headers are case-insensitive
+    meta = {
+        "original_hash": resp.headers.get("x-original-file-hash"),
+        "encrypted_hash": resp.headers.get("x-encrypted-file-hash"),
+        "encrypted_key": resp.headers.get("x-encrypted-key"),
+    }
+    if not all(meta.values()):
+        raise FirmwareDownloadError("Missing required headers from server")
+    return meta
+
+
+def decrypt_data_key(encrypted_key_hdr: str, callback_message) -> bytes:
+    """Parse the x-encrypted-key header (JSON array, first element base64) and decrypt it via KMS."""
+    try:
+        parsed = json.loads(encrypted_key_hdr)
+        if not isinstance(parsed, list) or len(parsed) == 0:
+            raise FirmwareDownloadError("Invalid encrypted key header")
+        buffer_key_bytes = base64.b64decode(parsed[0])
+    except FirmwareDownloadError:
+        raise
+    except Exception as e:
+        raise FirmwareDownloadError(f"Failed to parse encrypted key header: {e}")
+
+    callback_message("Decrypting data key via KMS...")
+    decrypted_key = decrypt_key_kms(buffer_key_bytes)
+    if not decrypted_key:
+        raise FirmwareDownloadError("Failed to decrypt data key via KMS")
+
+    # decrypted_key likely bytes (Uint8Array equivalent). Ensure length 32
+    if len(decrypted_key) not in (16, 24, 32):
+        # Expect 32 for AES-256; if AWS returns different, still allow but warn
+        callback_message(f"Warning: decrypted key length = {len(decrypted_key)}")
+    return decrypted_key
+
+
+def stream_response(resp, pipeline: FirmwarePipeline, callback_message,
+                    partial: PartialDownload | None = None,
+                    chunk_size: int = DOWNLOAD_CHUNK_SIZE, total: int = 0,
+                    cancel_token: CancelToken | None = None) -> None:
+    """Feed a streamed requests response into the pipeline (and partial file) chunk by chunk."""
+    next_report = 0
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if not chunk:
+            continue
+        pipeline.feed(chunk)
+        if partial is not None:
+            partial.append(chunk)
+        if pipeline.size >= next_report:
+            if total:
+                callback_message(f"Downloaded {pipeline.size}/{total} bytes")
+            else:
+                callback_message(f"Downloaded {pipeline.size} bytes")
+            next_report = pipeline.size + max(chunk_size, total // 20)
+
+
+def _range_start(resp) -> int | None:
+    """First byte of a 206 body per Content-Range ("bytes 100-199/200" -> 100), None if absent/garbled."""
+    content_range = resp.headers.get("Content-Range", "")
+    unit, _, spec = content_range.partition(" ")
+    start, sep, _ = spec.partition("-")
+    if unit != "bytes" or not sep or not start.strip().isdigit():
+        return None
+    return int(start)
+
+
+def _total_size(resp, offset: int) -> int:
+    """Full image size from Content-Range (206) or Content-Length (200), 0 if unknown."""
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = int(resp.headers.get("Content-Length") or 0)
+    return offset + length if length else 0
+
+
+def fetch_firmware(download_url: str, headers: dict, file_id: str, sink, callback_message,
+                   http=None, cancel_token: CancelToken | None = None) -> dict:
+    """
+    Download, decrypt and verify one firmware image, writing the plaintext to sink.
+
+    Resumable: encrypted bytes are kept in a PartialDownload; after a dropped
+    connection the download continues with a Range request (up to
+    DOWNLOAD_MAX_RETRIES times, with backoff), and a partial file left by an
+    earlier run is re-hashed from disk and continued the same way. If the
+    server ignores Range or the expected x-encrypted-file-hash changed, the
+    download starts over from byte zero.
+
+    http: session to use (default: the shared http_client session).
+    cancel_token: cancelling it closes the response and raises TaskCancelled;
+    the partial file is kept for the next attempt.
+
+    Returns the header metadata (original_hash, encrypted_hash, encrypted_key, size).
+    Raises FirmwareDownloadError with the UI error message.
+    """
+    http = http or get_http()
+    cancel_token = cancel_token or CancelToken()
+    partial = PartialDownload(file_id, FIRMWARE_DOWNLOAD_DIR)
+    saved = partial.load()
+    pipeline = None
+    expected = None
+    retries = 0
+
+    try:
+        while True:
+            offset = pipeline.size if pipeline is not None else (saved["offset"] if saved else 0)
+            req_headers = dict(headers)
+            if offset:
+                req_headers["Range"] = f"bytes={offset}-"
+                callback_message(f"Resuming download at byte {offset}...")
+
+            try:
+                cancel_token.raise_if_cancelled()
+                resp = http.get(download_url, headers=req_headers, stream=True)
+                with resp, cancel_token.on_cancel(resp.close):
+                    if resp.status_code == 416 and offset:
+                        # partial is larger than the file now served: start over
+                        saved = None
+                        if pipeline is not None:
+                            pipeline.reset()
+                        partial.discard()
+                        continue
+                    if resp.status_code not in (200, 206):
+                        raise FirmwareDownloadError(f"Failed to fetch file: HTTP {resp.status_code}")
+                    if resp.status_code == 206 and _range_start(resp) != offset:
+                        # body does not start where the partial ends: never append it
+                        callback_message("Server returned the wrong byte range, restarting download...")
+                        saved = None
+                        if pipeline is not None:
+                            pipeline.reset()
+                        partial.discard()
+                        continue
+
+                    meta = read_firmware_headers(resp)
+                    reference = expected or saved
+                    if reference and reference["encrypted_hash"] != meta["encrypted_hash"]:
+                        # file changed on the server since the partial was written
+                        callback_message("Server file changed, restarting download...")
+                        saved = expected = pipeline = None
+                        partial.discard()
+                        if resp.status_code == 206:
+                            continue
+
+                    if pipeline is None:
+                        callback_message("Validating headers...")
+                        key = decrypt_data_key(meta["encrypted_key"], callback_message)
+                        callback_message("Downloading and decrypting file (AES-256-ECB)...")
+                        pipeline = FirmwarePipeline(key, sink)
+                    expected = meta
+
+                    if resp.status_code == 206 and offset:
+                        if pipeline.size < offset:
+                            callback_message("Re-hashing partial download...")
+                            partial.replay(pipeline)
+                        partial.open(meta)
+                    else:
+                        # full body: server ignored Range (or fresh start)
+                        pipeline.reset()
+                        partial.open(meta, truncate=True)
+
+                    total = _total_size(resp, offset if resp.status_code == 206 else 0)
+                    stream_response(resp, pipeline, callback_message, partial, total=total,
+                                    cancel_token=cancel_token)
+                    if total and pipeline.size < total:
+                        raise requests.exceptions.ChunkedEncodingError(
+                            f"connection closed at {pipeline.size}/{total} bytes"
+                        )
+                break
+            except requests.exceptions.RequestException as e:
+                partial.close()
+                cancel_token.raise_if_cancelled()  # the error came from closing the response
+                retries += 1
+                if retries > DOWNLOAD_MAX_RETRIES:
+                    raise FirmwareDownloadError(f"Download failed after {retries - 1} retries: {e}")
+                delay = min(2 ** (retries - 1), 30)
+                callback_message(f"Download interrupted ({e}), retrying in {delay}s...")
+                cancel_token.sleep(delay)
+
+        try:
+            return verify_firmware(pipeline, expected, callback_message)
+        finally:
+            # a finished download is either verified or corrupt: never resume it
+            partial.discard()
+    finally:
+        partial.close()
+
+
+def verify_firmware(pipeline: FirmwarePipeline, expected: dict, callback_message) -> dict:
+    """Finish the pipeline and check both hashes against the server headers."""
+    try:
+        pipeline.finish()
+    except Exception as e:
+        raise FirmwareDownloadError(f"Failed to download/decrypt file content: {e}")
+
+    callback_message(f"Received {pipeline.size} bytes. Checking encrypted file hash...")
+    if pipeline.encrypted_hash.hexdigest() != expected["encrypted_hash"]:
+        raise FirmwareDownloadError("E23 - Encrypted File Mismatch")
+
+    callback_message("Encrypted file hash OK. Verifying original hash...")
+    if pipeline.original_hash.hexdigest() != expected["original_hash"]:
+        raise FirmwareDownloadError("E24 - Original file Mismatch")
+
+    return dict(expected, size=pipeline.size)
+
+
+# --------- segmented (parallel Range) download ----------
+DOWNLOAD_SEGMENTS = int(os.getenv("DOWNLOAD_SEGMENTS", "1"))
+DOWNLOAD_SEGMENT_MIN_SIZE = int(os.getenv("DOWNLOAD_SEGMENT_MIN_SIZE", str(1024 * 1024)))
+
+
+def _fetch_segment(session, download_url: str, headers: dict, buf, start: int, end: int,
+                   index: int, count: int, callback_message, cancel_token: CancelToken) -> None:
+    """Fetch bytes start..end (inclusive) into buf[start:end + 1], resuming within the segment on errors."""
+    pos = start
+    retries = 0
+    began = time.time()
+    while pos <= end:
+        req_headers = dict(headers, Range=f"bytes={pos}-{end}")
+        try:
+            cancel_token.raise_if_cancelled()
+            with session.get(download_url, headers=req_headers, stream=True) as resp, \
+                    cancel_token.on_cancel(resp.close):
+                if resp.status_code != 206:
+                    raise FirmwareDownloadError(
+                        f"Failed to fetch file segment {index + 1}/{count}: HTTP {resp.status_code}"
+                    )
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    cancel_token.raise_if_cancelled()
+                    if not chunk:
+                        continue
+                    chunk = chunk[:end + 1 - pos]
+                    buf[pos:pos + len(chunk)] = chunk
+                    pos += len(chunk)
+            if pos <= end:
+                raise requests.exceptions.ChunkedEncodingError(f"segment closed at byte {pos}")
+        except requests.exceptions.RequestException as e:
+            cancel_token.raise_if_cancelled()
+            retries += 1
+            if retries > DOWNLOAD_MAX_RETRIES:
+                raise FirmwareDownloadError(f"Download failed after {retries - 1} retries: {e}")
+            cancel_token.sleep(min(2 ** (retries - 1), 30))
+
+    elapsed = max(time.time() - began, 1e-6)
+    size = end + 1 - start
+    callback_message(
+        f"Segment {index + 1}/{count}: {size} bytes in {elapsed:.1f}s ({size / 1024 / elapsed:.0f} KiB/s)"
+    )
+
+
+def fetch_firmware_segmented(download_url: str, headers: dict, file_id: str, sink, callback_message,
+                             segments: int = DOWNLOAD_SEGMENTS, http=None,
+                             cancel_token: CancelToken | None = None) -> dict:
+    """
+    Same contract as fetch_firmware(), but fetches `segments` byte ranges at
+    once over the pooled HTTP session into a preallocated memory-mapped
+    file, then hashes/decrypts the assembled image in one pass.
+
+    Falls back to the single-stream fetch_firmware() when the server ignores
+    Range or the image is smaller than DOWNLOAD_SEGMENT_MIN_SIZE.
+    At most HTTP_POOL_SIZE segments run at once (more would make urllib3
+    drop and reopen pooled connections). If one segment fails, the others
+    are cancelled and waited for before the error is raised.
+    """
+    session = http or get_http()
+    cancel_token = cancel_token or CancelToken()
+    segments = max(1, min(segments, HTTP_POOL_SIZE))
+    # probe: one byte tells us whether Range works, the total size and the headers
+    with session.get(download_url, headers=dict(headers, Range="bytes=0-0"),
+                     stream=True) as probe:
+        if probe.status_code not in (200, 206):
+            raise FirmwareDownloadError(f"Failed to fetch file: HTTP {probe.status_code}")
+        meta = read_firmware_headers(probe)
+        total = _total_size(probe, 0) if probe.status_code == 206 else 0
+
+    if total < max(DOWNLOAD_SEGMENT_MIN_SIZE, 1):
+        if probe.status_code != 206:
+            callback_message("Server does not support Range, using a single stream...")
+        return fetch_firmware(download_url, headers, file_id, sink, callback_message, http, cancel_token)
+
+    callback_message("Validating headers...")
+    with ThreadPoolExecutor(max_workers=segments + 1) as pool:
+        # KMS runs while the segments download
+        key_future = pool.submit(decrypt_data_key, meta["encrypted_key"], callback_message)
+
+        with tempfile.TemporaryFile(prefix="fw_", suffix=".enc") as enc_file:
+            enc_file.truncate(total)
+            with mmap.mmap(enc_file.fileno(), total) as buf:
+                callback_message(f"Downloading {total} bytes in {segments} segments...")
+                step = -(-total // segments)  # ceil
+                # segments stop on the caller's cancel and on the first failed segment
+                segment_token = CancelToken()
+                with cancel_token.on_cancel(lambda: segment_token.cancel(cancel_token.reason)):
+                    futures = [
+                        pool.submit(_fetch_segment, session, download_url, headers, buf,
+                                    start, min(start + step, total) - 1, i, segments, callback_message,
+                                    segment_token)
+                        for i, start in enumerate(range(0, total, step))
+                    ]
+                    done, _ = wait_futures(futures, return_when=FIRST_EXCEPTION)
+                    error = next((f.exception() for f in done if f.exception() is not None), None)
+                    if error is not None:
+                        # no worker may still write into buf once the mmap is closed
+                        segment_token.cancel("segment failed")
+                        wait_futures(futures)
+                        cancel_token.raise_if_cancelled()
+                        raise error
+
+                key = key_future.result()
+                callback_message("Decrypting file (AES-256-ECB)...")
+                pipeline = FirmwarePipeline(key, sink)
+                with memoryview(buf) as view:
+                    for pos in range(0, total, DOWNLOAD_CHUNK_SIZE):
+                        pipeline.feed(view[pos:pos + DOWNLOAD_CHUNK_SIZE])
+
+    return verify_firmware(pipeline, meta, callback_message)
+
+
+def download_firmware(download_url: str, headers: dict, file_id: str, sink, callback_message,
+                      segments: int = DOWNLOAD_SEGMENTS, http=None,
+                      cancel_token: CancelToken | None = None) -> dict:
+    """Pick the segmented or single-stream download based on DOWNLOAD_SEGMENTS."""
+    if segments > 1:
+        return fetch_firmware_segmented(download_url, headers, file_id, sink, callback_message, segments, http,
+                                        cancel_token)
+    return fetch_firmware(download_url, headers, file_id, sink, callback_message, http, cancel_token)
+
+
+# --------- firmware cache in front of the download ----------
+def firmware_request(token: str, file_id: str):
+    """(url, headers) of the fileDownload request for file_id."""
+    server_url = os.getenv("SERVER_URL")
+    if not server_url:
+        raise FirmwareDownloadError("SERVER_URL not set")
+    return f"{server_url}api/file/fileDownload/{file_id}", {"Authorization": f"Bearer {token}"}
+
+
+def probe_encrypted_hash(download_url: str, headers: dict, http=None) -> str | None:
+    """HEAD the download URL for x-encrypted-file-hash; None if unreachable or unsupported."""
+    try:
+        resp = (http or get_http()).head(download_url, headers=headers, timeout=HTTP_PROBE_TIMEOUT,
+                                         allow_redirects=True)
+    except requests.exceptions.RequestException:
+        return None
+    if resp.status_code != 200:
+        return None
+    return resp.headers.get("x-encrypted-file-hash")
+
+
+def get_verified_firmware(download_url: str, headers: dict, file_id: str, sink, callback_message,
+                          segments: int = DOWNLOAD_SEGMENTS, cache: FirmwareCache | None = None,
+                          http=None, cancel_token: CancelToken | None = None) -> dict:
+    """
+    Verified plaintext image for file_id in sink, from the firmware cache when
+    possible, otherwise downloaded (and then cached).
+
+    The cache key is the x-encrypted-file-hash from a HEAD request; when the
+    server is unreachable or does not answer HEAD, the hash last stored for
+    this file_id in the cache manifest is used, so a repeat flash needs no
+    network at all.
+    """
+    cache = cache or get_firmware_cache()
+    if cache.enabled:
+        callback_message("Checking firmware cache...")
+        encrypted_hash = probe_encrypted_hash(download_url, headers, http) or cache.lookup(file_id)
+        cached = cache.get(encrypted_hash, sink)
+        if cached is not None:
+            callback_message(f"Using cached firmware ({cached['size']} bytes, hash verified)")
+            return cached
+
+    firmware = download_firmware(download_url, headers, file_id, sink, callback_message, segments, http,
+                                 cancel_token)
+    if cache.enabled and cache.put(file_id, firmware, sink):
+        callback_message("Firmware stored in local cache")
+    return firmware
+
+
+# set to 1 to also send the image itself after the 64-byte hash packet (needs a DU
+# with the frame transfer protocol in firmware_transfer.py); off by default
+FLASH_SEND_IMAGE = os.getenv("FLASH_SEND_IMAGE", "0") == "1"
+
+
+# --------- DU readiness probe (replaces the fixed 4 s sleep) ----------
+DU_READY_TIMEOUT = float(os.getenv("DU_READY_TIMEOUT", "4"))  # ceiling, seconds
+# bytes that count as "ready" (hex). The default is the DU frame SOP 0x2A: with
+# no such byte the wait runs to DU_READY_TIMEOUT, the same as the old fixed
+# sleep. Set it empty to turn the check off and always wait the full timeout.
+DU_READY_BYTES_DEFAULT = "2a"
+
+
+def _parse_ready_bytes(value: str) -> bytes:
+    """DU_READY_BYTES as bytes; a value that is not hex falls back to the default."""
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        print(f"DU_READY_BYTES={value!r} is not hex, using {DU_READY_BYTES_DEFAULT!r}")
+        return bytes.fromhex(DU_READY_BYTES_DEFAULT)
+
+
+DU_READY_BYTES = _parse_ready_bytes(os.getenv("DU_READY_BYTES", DU_READY_BYTES_DEFAULT))
+DU_READY_POLL_START = 0.01
+DU_READY_POLL_MAX = 0.25
+
+# (seconds waited, ready?) for recent flashes, to tune DU_READY_TIMEOUT from real
+# data; ready is None for waits with the check off
+du_ready_waits = deque(maxlen=200)
+
+
+def wait_for_du_ready(ser, ceiling: float = DU_READY_TIMEOUT, ready_bytes: bytes = DU_READY_BYTES,
+                      cancel_token: CancelToken | None = None):
+    """
+    Poll an open serial port for one of ready_bytes from the DU. Polls
+    ser.in_waiting with exponential backoff (10 ms doubling up to 250 ms)
+    and gives up after `ceiling` seconds. Input received while waiting is
+    discarded so it cannot be mistaken for a reply later.
+
+    With no ready_bytes the check is off: it just waits `ceiling` seconds
+    (line noise must not count as a ready signal) and returns ready=None.
+
+    Returns (ready, seconds_waited); every wait is recorded in du_ready_waits.
+    Raises TaskCancelled if cancel_token is cancelled while waiting.
+    """
+    cancel_token = cancel_token or CancelToken()
+    start = time.monotonic()
+    if not ready_bytes:
+        cancel_token.sleep(ceiling)
+        ser.reset_input_buffer()
+        waited = time.monotonic() - start
+        du_ready_waits.append((waited, None))
+        return None, waited
+
+    delay = DU_READY_POLL_START
+    ready = False
+    while True:
+        waiting = ser.in_waiting
+        if waiting:
+            data = ser.read(waiting)
+            if any(b in ready_bytes for b in data):
+                ready = True
+                break
+        elapsed = time.monotonic() - start
+        if elapsed >= ceiling:
+            break
+        cancel_token.sleep(min(delay, ceiling - elapsed))
+        delay = min(delay * 2, DU_READY_POLL_MAX)
+
+    waited = time.monotonic() - start
+    ser.reset_input_buffer()
+    du_ready_waits.append((waited, ready))
+    return ready, waited
+
+
+def du_ready_stats() -> dict:
+    """
+    Summary of recorded readiness waits: count, unprobed (waits with the
+    check off), ready_ratio over the probed waits (None if there were none)
+    and min/avg/max seconds over all of them.
+    """
+    if not du_ready_waits:
+        return {"count": 0}
+    times = [w for w, _ in du_ready_waits]
+    probed = [r for _, r in du_ready_waits if r is not None]
+    return {
+        "count": len(times),
+        "unprobed": len(times) - len(probed),
+        "ready_ratio": sum(probed) / len(probed) if probed else None,
+        "min": min(times),
+        "avg": sum(times) / len(times),
+        "max": max(times),
+    }
+
 
 # --------- placeholder encrypt function (if you port Encrypt from JS) ----------
 def encrypt_final_packet(final_packet_bytes: bytes) -> bytes:
@@ -40,98 +661,48 @@ def download_and_flash(file_id: str,
                        is_encryption_enable: bool,
                        callback_message,   # callback_message(text) to update UI/log
                        callback_success,   # callback_success() when done
-                       callback_error):    # callback_error(error_text)
+                       callback_error,     # callback_error(error_text)
+                       segments: int = DOWNLOAD_SEGMENTS,
+                       serial_port: str = DEFAULT_SERIAL_PORT,
+                       http=None,
+                       cancel_token: CancelToken | None = None):
     """
-    Downloads BIN by file_id, verifies, decrypts, and writes final hash to serial.
+    Downloads BIN by file_id, verifies, decrypts, writes final hash to serial
+    and then transfers the image itself (firmware_transfer.transfer_image).
     Runs synchronously — call from a thread.
+    Cancelling cancel_token stops the download, readiness wait or transfer
+    right away; the run then reports "Cancelled" and returns False.
     """
+    cancel_token = cancel_token or CancelToken()
 
+    plain_file = None
+    # shared with the handshake: the port stays open between the two phases
+    session = get_session(serial_port)
     try:
         callback_message("Opening serial port...")
         # Raise BL detect HIGH at start (mimic Node behaviour where they set LOW earlier but here low is used after download)
         try:
-            turn_BL_Detect_High()
+            session.set_bl_detect(True)
         except Exception as e:
             callback_message(f"Warning: BL detect high failed: {e}")
 
         # 1) Download the file
         callback_message(f"Requesting file {file_id} from server...")
-        server_url = os.getenv("SERVER_URL")
-        if not server_url:
-            callback_error("SERVER_URL not set")
-            return False
-
-        download_url = f"{server_url}api/file/fileDownload/{file_id}"
-        headers = {"Authorization": f"Bearer {token}"}
-
-        resp = requests.get(download_url, headers=headers, timeout=30)
-        if resp.status_code != 200:
-            callback_error(f"Failed to fetch file: HTTP {resp.status_code}")
-            return False
-
-        # response content is bytes
-        file_bytes = resp.content
-
-        # Read headers (case-insensitive)
-        original_hash = resp.headers.get("x-original-file-hash") or resp.headers.get("X-Original-File-Hash")
-        encrypted_hash = resp.headers.get("x-encrypted-file-hash") or resp.headers.get("X-Encrypted-File-Hash")
-        encrypted_key_hdr = resp.headers.get("x-encrypted-key") or resp.headers.get("X-Encrypted-Key")
-
-        callback_message(f"Received {len(file_bytes)} bytes. Validating headers...")
 
-        if not original_hash or not encrypted_hash or not encrypted_key_hdr:
-            callback_error("Missing required headers from server")
-            return False
-
-        # 2) Validate encrypted file hash
-        callback_message("Checking encrypted file hash...")
-        calculated_encrypted_hash = sha256_hex_of_bytes(file_bytes)
-        if calculated_encrypted_hash != encrypted_hash:
-            callback_error("E23 - Encrypted File Mismatch")
-            return False
-
-        callback_message("Encrypted file hash OK. Parsing encrypted key...")
-
-        # 3) Parse encrypted key (expected to be JSON array string whose first element is base64)
+        # 2) Cached image, or stream, decrypt and verify (resumable) into a temp file
+        plain_file = tempfile.TemporaryFile(prefix="fw_", suffix=".bin")
         try:
-            parsed = json.loads(encrypted_key_hdr)
-            if not isinstance(parsed, list) or len(parsed) == 0:
-                callback_error("Invalid encrypted key header")
-                return False
-            buffer_key_b64 = parsed[0]
-            buffer_key_bytes = base64.b64decode(buffer_key_b64)
-        except Exception as e:
-            callback_error(f"Failed to parse encrypted key header: {e}")
-            return False
-
-        callback_message("Decrypting data key via KMS...")
-        decrypted_key = decrypt_key_kms(buffer_key_bytes)
-        if not decrypted_key:
-            callback_error("Failed to decrypt data key via KMS")
-            return False
-
-        # decrypted_key likely bytes (Uint8Array equivalent). Ensure length 32
-        if len(decrypted_key) not in (16, 24, 32):
-            # Expect 32 for AES-256; if AWS returns different, still allow but warn
-            callback_message(f"Warning: decrypted key length = {len(decrypted_key)}")
-
-        callback_message("Decrypting file with data key (AES-256-ECB)...")
-        # decrypt_file expects hex string as first arg, so convert bytes to hex
-        decrypted_bytes = decrypt_file(file_bytes.hex(), decrypted_key)
-        if decrypted_bytes is False:
-            callback_error("Failed to decrypt file content")
-            return False
-
-        callback_message("Decrypted file. Verifying original hash...")
-
-        calc_orig_hash = sha256_hex_of_bytes(decrypted_bytes)
-        if calc_orig_hash != original_hash:
-            callback_error("E24 - Original file Mismatch")
+            download_url, headers = firmware_request(token, file_id)
+            firmware = get_verified_firmware(download_url, headers, file_id, plain_file, callback_message,
+                                             segments, http=http, cancel_token=cancel_token)
+        except FirmwareDownloadError as e:
+            callback_error(str(e))
             return False
 
+        calc_orig_hash = firmware["original_hash"]
         callback_message("Original file hash matches. Preparing final packet...")
 
-        # 4) Prepare final hash packet (formatHashTo64Bytes)
+        # 3) Prepare final hash packet (formatHashTo64Bytes)
         final_packet = format_hash_to_64_bytes(calc_orig_hash)
         if final_packet is False:
             callback_error("Failed to format final packet")
@@ -146,47 +717,72 @@ def download_and_flash(file_id: str,
                 callback_error(f"Failed to encrypt final packet: {e}")
                 return False
 
-        # 5) Turn BL detect LOW before writing (as in node code)
+        # 4) Turn BL detect LOW before writing (as in node code)
         try:
-            turn_BL_Detect_Low()
+            session.set_bl_detect(False)
         except Exception as e:
             callback_message(f"Warning: BL detect low failed: {e}")
 
-        # 6) Wait 4 seconds (node had a setTimeout 4000)
-        callback_message("Waiting 4 seconds before flashing...")
-        time.sleep(4)
-
-        # 7) Write final packet to serial port
-        callback_message("Opening serial port to write final packet...")
+        # 5) Open the port right away and wait for the DU to signal it is ready
+        #    (node had a fixed setTimeout 4000; that is now only the ceiling)
+        callback_message(f"Opening serial port {session.port} to write final packet...")
         try:
-            port_name = os.getenv("SERIAL_PORT", "/dev/ttyAMA0")
-            ser = serial.Serial(port_name, baudrate=115200, timeout=5)
+            session.open()
         except Exception as e:
             callback_error(f"Serial port open failed: {e}")
             return False
 
-        try:
-            ser.write(final_packet)
-            ser.flush()
-            callback_message("Final packet written to serial. Closing port...")
-        except Exception as e:
-            callback_error(f"Error during serial write: {e}")
-            ser.close()
-            return False
-        finally:
+        with session.use(timeout=5) as ser:
+            callback_message("Waiting for DU to become ready...")
             try:
-                ser.close()
-            except:
-                pass
+                ready, waited = wait_for_du_ready(ser, cancel_token=cancel_token)
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                callback_error(f"Serial error while waiting for DU: {e}")
+                return False
+            if ready is None:
+                callback_message(f"Waited {waited:.2f}s for DU (readiness check off, DU_READY_BYTES empty)")
+            elif ready:
+                callback_message(f"DU ready after {waited:.2f}s")
+            else:
+                callback_message(f"No ready signal after {waited:.2f}s (ceiling {DU_READY_TIMEOUT}s), "
+                                 f"flashing anyway")
+
+            # 6) Write final packet to serial port
+            try:
+                ser.write(final_packet)
+                ser.flush()
+                callback_message("Final packet written to serial.")
+
+                # 7) Send the verified image itself (windowed, acknowledged frames)
+                if FLASH_SEND_IMAGE:
+                    transfer_image(ser, plain_file, firmware["size"], callback_message,
+                                   encrypt=is_encryption_enable, cancel_token=cancel_token)
+            except TaskCancelled:
+                raise
+            except FirmwareTransferError as e:
+                callback_error(str(e))
+                return False
+            except Exception as e:
+                callback_error(f"Error during serial write: {e}")
+                return False
 
         callback_message("File flashed successfully.")
         callback_success({"status": "success", "duNumber": None, "displayNumber": None})
         return True
 
     except Exception as e:
-        callback_error(f"Unexpected error: {e}")
+        if cancel_token.is_set():
+            # TaskCancelled, or whatever a closed response / port raised
+            callback_message(f"Cancelled ({cancel_token.reason})")
+        else:
+            callback_error(f"Unexpected error: {e}")
         try:
-            turn_BL_Detect_Low()
+            session.set_bl_detect(False)
         except:
             pass
         return False
+    finally:
+        if plain_file is not None:
+            plain_file.close()
@@ -1,5 +1,6 @@
 # decrypt_utils.py
-from Crypto.Cipher import AES
+# pycryptodome is imported inside each function: it is slow to import and
+# only needed once a DU link turns out to be encrypted.
 
 # ----------------------------------------------------
 # AES-256-CBC KEYS (converted from your keys.js)
@@ -18,6 +19,43 @@ AES_IV = bytes([
 ])
 
 
+# ----------------------------------------------------
+# Buffer API (bytes / bytearray / memoryview, no hex)
+# ----------------------------------------------------
+def decrypt_block(encrypted) -> bytes:
+    """
+    AES-256-CBC decrypt (fixed key/IV, no padding) of a bytes-like object.
+    Length must be a multiple of 16.
+    """
+    from Crypto.Cipher import AES
+    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
+    return cipher.decrypt(encrypted)
+
+
+def decrypt_into(dst, src) -> None:
+    """
+    Same as decrypt_block() but writes the plaintext into dst, a writable
+    preallocated buffer (bytearray / memoryview) of the same length as src.
+    """
+    from Crypto.Cipher import AES
+    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
+    cipher.decrypt(src, output=dst)
+
+
+def encrypt_block(plain) -> bytes:
+    """AES-256-CBC encrypt (fixed key/IV, no padding) of a bytes-like object."""
+    from Crypto.Cipher import AES
+    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
+    return cipher.encrypt(plain)
+
+
+def encrypt_into(dst, src) -> None:
+    """Same as encrypt_block() but writes the ciphertext into dst."""
+    from Crypto.Cipher import AES
+    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
+    cipher.encrypt(src, output=dst)
+
+
 # ----------------------------------------------------
 # EXACT replica of JS DECRYPT()
 # ----------------------------------------------------
@@ -33,19 +71,11 @@ def decrypt_hex_block(encrypted_hex: str) -> str:
         return decrypted.toString("hex");
     }
     """
-    encrypted_bytes = bytes.fromhex(encrypted_hex)
-
-    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
-    decrypted = cipher.decrypt(encrypted_bytes)
-
-    return decrypted.hex()
+    return decrypt_block(bytes.fromhex(encrypted_hex)).hex()
 
 
 # ----------------------------------------------------
 # EXACT replica of JS Encrypt()
 # ----------------------------------------------------
 def encrypt_hex_block(plain_hex: str) -> str:
-    data = bytes.fromhex(plain_hex)
-    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
-    encrypted = cipher.encrypt(data)
-    return encrypted.hex()
+    return encrypt_block(bytes.fromhex(plain_hex)).hex()
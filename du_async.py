@@ -0,0 +1,394 @@
+# du_async.py
+"""
+asyncio versions of the DU handshake and flash.
+
+Serial input is awaited on the port's file descriptor (loop.add_reader), so
+nothing busy-polls, and HTTP goes through httpx.AsyncClient. One event loop
+can run the handshake, the download and the UI status feed together:
+
+    result = await read_du_async(token, on_message)
+    await download_and_flash_async(file_id, token, result["isEncryptionEnable"], on_message)
+
+Errors are raised (DuSerialError, DuUpdateError, FirmwareDownloadError,
+FirmwareTransferError) with the same UI messages the callback API reports.
+Do not drive the same port from the sync and async API at the same time.
+"""
+import asyncio
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+try:
+    import httpx
+except ImportError:  # optional, only needed by this module
+    httpx = None
+
+from bootloader_download import (
+    DOWNLOAD_CHUNK_SIZE,
+    DU_READY_BYTES,
+    DU_READY_TIMEOUT,
+    FLASH_SEND_IMAGE,
+    FirmwareDownloadError,
+    FirmwarePipeline,
+    decrypt_data_key,
+    du_ready_waits,
+    encrypt_final_packet,
+    firmware_request,
+    read_firmware_headers,
+    verify_firmware,
+)
+from du_reader import (
+    HANDSHAKE_TIMEOUT,
+    DuFrameParser,
+    DuSerialError,
+    DuUpdateError,
+    du_update_cache,
+    du_update_request,
+    stale_notice,
+)
+from du_utils import format_hash_to_64_bytes
+from firmware_cache import FirmwareCache, get_firmware_cache
+from firmware_transfer import transfer_image
+from http_client import HTTP_CONNECT_TIMEOUT, HTTP_PROBE_TIMEOUT, HTTP_READ_TIMEOUT
+from serial_session import DEFAULT_BAUDRATE, DEFAULT_SERIAL_PORT, SerialSession, get_session
+
+
+def _no_message(_msg: str) -> None:
+    pass
+
+
+@asynccontextmanager
+async def _http_client(client=None):
+    """Use the caller's httpx.AsyncClient, or a temporary one with the http_client timeouts."""
+    if client is not None:
+        yield client
+        return
+    if httpx is None:
+        raise RuntimeError("httpx is required for the async API (pip install httpx)")
+    timeout = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    async with httpx.AsyncClient(timeout=timeout) as temp_client:
+        yield temp_client
+
+
+# ---------------------------
+# Serial port on the event loop
+# ---------------------------
+class AsyncSerialPort:
+    """
+    Awaitable reads/writes on a SerialSession. Reads wait for the fd to become
+    readable via loop.add_reader; ports without a selectable fd (Windows)
+    fall back to short sleeps between in_waiting checks.
+    """
+
+    def __init__(self, session: SerialSession):
+        self.session = session
+
+    def _fileno(self):
+        try:
+            return self.session.open().fileno()
+        except (AttributeError, OSError):
+            return None
+
+    async def wait_readable(self, timeout: float) -> bool:
+        if self.session.in_waiting:
+            return True
+        if timeout <= 0:
+            return False
+
+        fd = self._fileno()
+        if fd is None:
+            await asyncio.sleep(min(timeout, 0.05))
+            return bool(self.session.in_waiting)
+
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    async def read(self, size: int, timeout: float) -> bytes:
+        """Up to `size` bytes, or b"" if nothing arrives within timeout."""
+        if not await self.wait_readable(timeout):
+            return b""
+        return self.session.read(min(size, max(self.session.in_waiting, 1)))
+
+    async def write(self, data) -> None:
+        await asyncio.to_thread(self._write_all, data)
+
+    def _write_all(self, data) -> None:
+        # a blocking write can take a while at 115200 baud (or retry a reconnect)
+        self.session.write(data)
+        self.session.flush()
+
+
+async def _open_session(serial_port: str, **settings) -> SerialSession:
+    session = get_session(serial_port, **settings)
+    await asyncio.to_thread(session.open)
+    return session
+
+
+# ---------------------------
+# Handshake
+# ---------------------------
+async def aiter_du_frames(
+    port: AsyncSerialPort,
+    on_message: Callable[[str], None] = _no_message,
+    frame_timeout: float = HANDSHAKE_TIMEOUT,
+    read_size: int = 256,
+):
+    """Async counterpart of du_reader.iter_du_frames (same errors and timeouts)."""
+    parser = DuFrameParser()
+    last_data_time = time.monotonic()
+    pending_since = None
+
+    while True:
+        resyncs_before = parser.resyncs
+        frame = parser.next_frame()
+        if parser.resyncs != resyncs_before:
+            on_message("Corrupt frame received, re-syncing...")
+        if frame is not None:
+            pending_since = time.monotonic() if len(parser) else None
+            yield frame
+            continue
+
+        now = time.monotonic()
+        since = pending_since if pending_since is not None else last_data_time
+        remaining = frame_timeout - (now - since)
+        if remaining <= 0:
+            if pending_since is None:
+                raise DuSerialError("E31 - No data received during Handshake")
+            raise DuSerialError("E52 - Invalid Data Received")
+
+        try:
+            chunk = await port.read(read_size, remaining)
+        except Exception as e:
+            raise DuSerialError(f"E14 - Serial Port Error during Handshake: {e}") from e
+        if not chunk:
+            continue
+
+        last_data_time = time.monotonic()
+        if pending_since is None:
+            pending_since = last_data_time
+        parser.feed(chunk)
+        on_message(f"Received bytes: {len(parser)}")
+
+
+async def read_du_async(
+    token: str,
+    on_message: Callable[[str], None] = _no_message,
+    serial_port: str = DEFAULT_SERIAL_PORT,
+    baudrate: int = DEFAULT_BAUDRATE,
+    client=None,
+) -> dict:
+    """
+    Async DU handshake: first valid frame from the DU, then the DU_Update call.
+    Returns the same dict read_du_from_serial passes to callback_ui_success.
+    client: optional shared httpx.AsyncClient.
+    """
+    session = get_session(serial_port, baudrate=baudrate)
+    try:
+        await asyncio.to_thread(session.set_bl_detect, True)
+    except Exception as e:
+        on_message(f"Warning: turn_BL_Detect_High failed: {e}")
+
+    on_message(f"Opening serial port {serial_port}...")
+    try:
+        await _open_session(serial_port, baudrate=baudrate)
+        session.reset_input_buffer()
+    except Exception as e:
+        await asyncio.to_thread(session.set_bl_detect, False)
+        raise DuSerialError(f"E14 - Serial Port Error during Handshake: {e}") from e
+
+    on_message("Waiting for DU...")
+    frames = aiter_du_frames(AsyncSerialPort(session), on_message)
+    try:
+        frame = await frames.__anext__()
+    finally:
+        await frames.aclose()
+        await asyncio.to_thread(session.set_bl_detect, False)
+
+    du_number = frame.du_number
+    display_number = frame.display_number
+    on_message(f"DU detected: {du_number}, Display: {display_number}")
+
+    url, headers = du_update_request(token, du_number, display_number)
+    on_message("Querying server for DU update list...")
+    update, req_headers = du_update_cache.begin(headers)
+    if update is None:
+        async with _http_client(client) as http:
+            try:
+                resp = await http.get(url, headers=req_headers)
+            except Exception as e:
+                update = du_update_cache.offline(headers)
+                if update is None:
+                    raise DuUpdateError(f"Error contacting server: {e}")
+            else:
+                update = du_update_cache.finish(headers, resp)
+    notice = stale_notice(update)
+    if notice:
+        on_message(notice)
+
+    return {
+        "duNumber": du_number,
+        "displayNumber": display_number,
+        "options": update["options"],
+        "isEncryptionEnable": frame.is_encryption_enable,
+        "isStale": update["source"] == "stale",
+        "fetchedAt": update["fetchedAt"],
+    }
+
+
+# ---------------------------
+# Download + flash
+# ---------------------------
+async def fetch_firmware_async(http, download_url: str, headers: dict, file_id: str, sink,
+                               on_message: Callable[[str], None] = _no_message,
+                               cache: FirmwareCache | None = None) -> dict:
+    """
+    Async counterpart of bootloader_download.get_verified_firmware: firmware
+    cache first (keyed by the HEAD x-encrypted-file-hash or the manifest),
+    otherwise one streamed download through FirmwarePipeline.
+    """
+    cache = cache or get_firmware_cache()
+    if cache.enabled:
+        on_message("Checking firmware cache...")
+        encrypted_hash = None
+        try:
+            head = await http.head(download_url, headers=headers, timeout=HTTP_PROBE_TIMEOUT,
+                                   follow_redirects=True)
+            if head.status_code == 200:
+                encrypted_hash = head.headers.get("x-encrypted-file-hash")
+        except Exception:
+            pass
+        encrypted_hash = encrypted_hash or cache.lookup(file_id)
+        cached = await asyncio.to_thread(cache.get, encrypted_hash, sink)
+        if cached is not None:
+            on_message(f"Using cached firmware ({cached['size']} bytes, hash verified)")
+            return cached
+
+    try:
+        async with http.stream("GET", download_url, headers=headers) as resp:
+            if resp.status_code != 200:
+                raise FirmwareDownloadError(f"Failed to fetch file: HTTP {resp.status_code}")
+            meta = read_firmware_headers(resp)
+            on_message("Validating headers...")
+            key = await asyncio.to_thread(decrypt_data_key, meta["encrypted_key"], on_message)
+
+            on_message("Downloading and decrypting file (AES-256-ECB)...")
+            pipeline = FirmwarePipeline(key, sink)
+            async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                # SHA-256 + AES + the sink write would stall the loop for every chunk
+                await asyncio.to_thread(pipeline.feed, chunk)
+    except FirmwareDownloadError:
+        raise
+    except Exception as e:
+        raise FirmwareDownloadError(f"Failed to download/decrypt file content: {e}")
+
+    firmware = verify_firmware(pipeline, meta, on_message)
+    if cache.enabled and await asyncio.to_thread(cache.put, file_id, firmware, sink):
+        on_message("Firmware stored in local cache")
+    return firmware
+
+
+async def wait_for_du_ready_async(port: AsyncSerialPort, ceiling: float = DU_READY_TIMEOUT,
+                                  ready_bytes: bytes = DU_READY_BYTES):
+    """
+    Event-driven bootloader_download.wait_for_du_ready: (ready, seconds_waited).
+    With no ready_bytes the check is off: waits `ceiling` and returns ready=None.
+    """
+    start = time.monotonic()
+    if not ready_bytes:
+        await asyncio.sleep(ceiling)
+        port.session.reset_input_buffer()
+        waited = time.monotonic() - start
+        du_ready_waits.append((waited, None))
+        return None, waited
+
+    ready = False
+    while True:
+        remaining = ceiling - (time.monotonic() - start)
+        data = await port.read(256, remaining)
+        if data and any(b in ready_bytes for b in data):
+            ready = True
+            break
+        if remaining <= 0 or time.monotonic() - start >= ceiling:
+            break
+
+    waited = time.monotonic() - start
+    port.session.reset_input_buffer()
+    du_ready_waits.append((waited, ready))
+    return ready, waited
+
+
+async def download_and_flash_async(
+    file_id: str,
+    token: str,
+    is_encryption_enable: bool,
+    on_message: Callable[[str], None] = _no_message,
+    serial_port: str = DEFAULT_SERIAL_PORT,
+    client=None,
+    cache: FirmwareCache | None = None,
+) -> dict:
+    """
+    Async download_and_flash. Returns {"status": "success", ...}; raises on failure.
+    The windowed image transfer runs in a worker thread (it is paced by DU
+    ACKs on a blocking port), as do the per-chunk decrypt/hash and serial
+    writes; everything else runs on the event loop.
+    """
+    session = get_session(serial_port)
+    try:
+        await asyncio.to_thread(session.set_bl_detect, True)
+    except Exception as e:
+        on_message(f"Warning: BL detect high failed: {e}")
+
+    on_message(f"Requesting file {file_id} from server...")
+    download_url, headers = firmware_request(token, file_id)
+
+    with tempfile.TemporaryFile(prefix="fw_", suffix=".bin") as plain_file:
+        async with _http_client(client) as http:
+            firmware = await fetch_firmware_async(http, download_url, headers, file_id, plain_file,
+                                                  on_message, cache)
+
+        on_message("Original file hash matches. Preparing final packet...")
+        final_packet = format_hash_to_64_bytes(firmware["original_hash"])
+        if final_packet is False:
+            raise FirmwareDownloadError("Failed to format final packet")
+        if is_encryption_enable:
+            final_packet = encrypt_final_packet(final_packet)
+
+        try:
+            await asyncio.to_thread(session.set_bl_detect, False)
+        except Exception as e:
+            on_message(f"Warning: BL detect low failed: {e}")
+
+        on_message(f"Opening serial port {serial_port} to write final packet...")
+        try:
+            await _open_session(serial_port)
+        except Exception as e:
+            raise DuSerialError(f"Serial port open failed: {e}") from e
+        port = AsyncSerialPort(session)
+
+        on_message("Waiting for DU to become ready...")
+        ready, waited = await wait_for_du_ready_async(port)
+        if ready is None:
+            on_message(f"Waited {waited:.2f}s for DU (readiness check off, DU_READY_BYTES empty)")
+        elif ready:
+            on_message(f"DU ready after {waited:.2f}s")
+        else:
+            on_message(f"No ready signal after {waited:.2f}s (ceiling {DU_READY_TIMEOUT}s), flashing anyway")
+
+        await port.write(final_packet)
+        on_message("Final packet written to serial.")
+
+        if FLASH_SEND_IMAGE:
+            await asyncio.to_thread(transfer_image, session, plain_file, firmware["size"],
+                                    on_message, encrypt=is_encryption_enable)
+
+    on_message("File flashed successfully.")
+    return {"status": "success", "duNumber": None, "displayNumber": None}
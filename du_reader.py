@@ -1,22 +1,22 @@
 # du_reader.py
 import os
 import time
-import requests
-import serial
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Callable
 
-from decrypt_utils import decrypt_hex_block
-from du_utils import calculate_crc16, calculate_little_endian
-from gpio_control import turn_BL_Detect_High, turn_BL_Detect_Low
+from decrypt_utils import decrypt_into
+from du_utils import calculate_crc16, Crc16, FRAME_SIZE, FRAME_CRC_OFFSET
+from serial_session import DEFAULT_SERIAL_PORT, DEFAULT_BAUDRATE, get_session
+from task_runner import CancelToken, TaskCancelled
 
 from dotenv import load_dotenv
 load_dotenv()
 
-# Configurable defaults
-DEFAULT_SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/ttyS3")
-DEFAULT_BAUDRATE = int(os.getenv("SERIAL_BAUD", "115200"))
+# Configurable defaults (port/baud defaults live in serial_session)
 HANDSHAKE_TIMEOUT = 10  # seconds
-REQUIRED_HEX_LENGTH = 1024  # hex chars == 512 bytes
 
 
 def get_encryption_flag(fw1: int, fw2: int) -> bool:
@@ -62,6 +62,428 @@ def parse_du_and_display_from_hex(hex_str: str):
 
 
 
+# ---------------------------
+# DU frame parsing (bytes, no hex round-trips)
+# ---------------------------
+SOP_BYTE = 0x2A
+EOP_BYTE = 0x3C
+EOP_OFFSET = 509
+
+
+class DuFrame:
+    """
+    One validated 512-byte DU frame (already decrypted if it came in encrypted).
+    The field accessors are memoryview slices over the single frame buffer.
+    """
+
+    __slots__ = ("raw", "encrypted", "crc")
+
+    def __init__(self, data: bytes, encrypted: bool, crc: int):
+        self.raw = memoryview(data)
+        self.encrypted = encrypted
+        self.crc = crc
+
+    @property
+    def du_bytes(self) -> memoryview:
+        # JS: receivedData.slice(2, 10) on the hex string == bytes 1..4
+        return self.raw[1:5]
+
+    @property
+    def display_bytes(self) -> memoryview:
+        # JS: receivedData.slice(10, 18) on the hex string == bytes 5..8
+        return self.raw[5:9]
+
+    @property
+    def firmware_bytes(self) -> memoryview:
+        return self.raw[393:395]
+
+    @property
+    def crc_bytes(self) -> memoryview:
+        return self.raw[FRAME_CRC_OFFSET:FRAME_SIZE]
+
+    @property
+    def du_number(self) -> int:
+        return int.from_bytes(self.du_bytes, "big")
+
+    @property
+    def display_number(self) -> int:
+        return int.from_bytes(self.display_bytes, "big")
+
+    @property
+    def is_encryption_enable(self) -> bool:
+        fw = self.firmware_bytes
+        return get_encryption_flag_from_fw(fw[0], fw[1])
+
+
+class DuFrameParser:
+    """
+    Reassembles DU frames from raw serial chunks.
+
+    feed() appends bytes to one reusable bytearray; next_frame() returns a
+    DuFrame once a valid frame sits at the front of the buffer, or None if
+    more bytes are needed. A frame is valid when SOP (0x2A) is at byte 0,
+    EOP (0x3C) at byte 509 and the CRC of bytes 0..509 matches bytes
+    510..511 - either as received or after AES decryption.
+
+    When the front of the buffer is not a valid frame the parser re-syncs
+    instead of giving up: on a plain link it drops bytes up to the next SOP
+    candidate; while the link is encrypted (or not known yet) it slides one
+    byte at a time, since ciphertext does not start with SOP.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        # CRC of the plain candidate frame at the front of the buffer, folded
+        # in as bytes arrive (only while byte 0 is SOP)
+        self._crc = Crc16()
+        self.resyncs = 0
+        # None until the first valid frame tells us whether the link is encrypted
+        self.encrypted = None
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def feed(self, chunk: bytes) -> None:
+        self._buf += chunk
+        self._fold_crc()
+
+    def next_frame(self) -> "DuFrame | None":
+        while len(self._buf) >= FRAME_SIZE:
+            frame = self._plain_frame() or self._encrypted_frame()
+            if frame is not None:
+                self._consume(FRAME_SIZE)
+                self.encrypted = frame.encrypted
+                return frame
+            self._resync()
+        return None
+
+    def _fold_crc(self) -> None:
+        if not self._buf or self._buf[0] != SOP_BYTE:
+            return
+        end = min(len(self._buf), FRAME_CRC_OFFSET)
+        if self._crc.length < end:
+            with memoryview(self._buf) as view:
+                self._crc.update(view[self._crc.length:end])
+
+    def _plain_frame(self) -> "DuFrame | None":
+        buf = self._buf
+        if buf[0] != SOP_BYTE or buf[EOP_OFFSET] != EOP_BYTE:
+            return None
+        crc = self._crc.digest()
+        if crc != (buf[FRAME_CRC_OFFSET] | (buf[FRAME_CRC_OFFSET + 1] << 8)):
+            return None
+        return DuFrame(bytes(buf[:FRAME_SIZE]), False, crc)
+
+    def _encrypted_frame(self) -> "DuFrame | None":
+        plain = bytearray(FRAME_SIZE)
+        with memoryview(self._buf) as view:
+            decrypt_into(plain, view[:FRAME_SIZE])
+        if plain[0] != SOP_BYTE or plain[EOP_OFFSET] != EOP_BYTE:
+            return None
+        crc = calculate_crc16(memoryview(plain)[:FRAME_CRC_OFFSET])
+        if crc != (plain[FRAME_CRC_OFFSET] | (plain[FRAME_CRC_OFFSET + 1] << 8)):
+            return None
+        return DuFrame(plain, True, crc)
+
+    def _resync(self) -> None:
+        if self.encrypted is False:
+            nxt = self._buf.find(SOP_BYTE, 1)
+            self._consume(nxt if nxt != -1 else len(self._buf))
+        else:
+            self._consume(1)
+        self.resyncs += 1
+
+    def _consume(self, count: int) -> None:
+        del self._buf[:count]
+        self._crc.reset()
+        self._fold_crc()
+
+
+# ---------------------------
+# Multi-frame streaming over one open port
+# ---------------------------
+class DuSerialError(Exception):
+    """Serial handshake/stream failure. str(exc) is the UI message incl. error code."""
+
+
+def iter_du_frames(
+    ser,
+    callback_ui_message: Callable[[str], None] | None = None,
+    frame_timeout: float = HANDSHAKE_TIMEOUT,
+    read_size: int = 256,
+    stop_event=None,
+):
+    """
+    Generator yielding validated DuFrame objects one after another from an
+    already-open serial port. Decryption and CRC run per frame in the parser;
+    bytes after a frame stay buffered for the next one.
+
+    Raises DuSerialError:
+      - E31 if nothing arrives for frame_timeout seconds
+      - E52 if data arrives but no valid frame forms within frame_timeout
+      - E14 if the port read fails
+    Stops when stop_event (threading.Event) is set.
+    """
+    parser = DuFrameParser()
+    last_data_time = time.time()
+    pending_since = None  # when the bytes of the current (incomplete) frame started
+
+    while stop_event is None or not stop_event.is_set():
+        resyncs_before = parser.resyncs
+        frame = parser.next_frame()
+        if parser.resyncs != resyncs_before and callback_ui_message:
+            callback_ui_message("Corrupt frame received, re-syncing...")
+        if frame is not None:
+            pending_since = time.time() if len(parser) else None
+            yield frame
+            continue
+
+        now = time.time()
+        if pending_since is None and now - last_data_time > frame_timeout:
+            raise DuSerialError("E31 - No data received during Handshake")
+        if pending_since is not None and now - pending_since > frame_timeout:
+            raise DuSerialError("E52 - Invalid Data Received")
+
+        try:
+            chunk = ser.read(read_size)
+        except Exception as e:
+            raise DuSerialError(f"E14 - Serial Port Error during Handshake: {e}") from e
+
+        if not chunk:
+            # no data right now, continue looping
+            continue
+
+        last_data_time = time.time()
+        if pending_since is None:
+            pending_since = last_data_time
+        parser.feed(chunk)
+
+        if callback_ui_message:
+            callback_ui_message(f"Received bytes: {len(parser)}")
+
+
+@contextmanager
+def du_serial_stream(
+    serial_port: str = DEFAULT_SERIAL_PORT,
+    baudrate: int = DEFAULT_BAUDRATE,
+    callback_ui_message: Callable[[str], None] | None = None,
+    frame_timeout: float = HANDSHAKE_TIMEOUT,
+    stop_event=None,
+):
+    """
+    Use the shared SerialSession for the DU link and yield an
+    iter_du_frames() generator over it. BL_DETECT is raised on entry and
+    pulled low when the block exits, so any number of frames (telemetry,
+    config pages, multi-block replies) can be read in one session:
+
+        with du_serial_stream(port) as frames:
+            for frame in frames:
+                ...
+
+    The port itself stays open afterwards for the flash phase.
+    """
+    session = get_session(serial_port, baudrate=baudrate)
+    try:
+        session.set_bl_detect(True)
+    except Exception as e:
+        if callback_ui_message:
+            callback_ui_message(f"Warning: turn_BL_Detect_High failed: {e}")
+
+    if callback_ui_message:
+        callback_ui_message(f"Opening serial port {serial_port}...")
+    try:
+        session.open()
+    except Exception as e:
+        try:
+            session.set_bl_detect(False)
+        except:
+            pass
+        raise DuSerialError(f"E14 - Serial Port Error during Handshake: {e}") from e
+
+    with session.use(timeout=0.5) as ser:
+        frames = iter_du_frames(ser, callback_ui_message, frame_timeout, stop_event=stop_event)
+        try:
+            yield frames
+        finally:
+            frames.close()
+            # pull BL pin low like JS
+            try:
+                session.set_bl_detect(False)
+            except:
+                pass
+
+
+# ---------------------------
+# DU_Update API (shared by the sync and async handshakes)
+# ---------------------------
+class DuUpdateError(Exception):
+    """DU_Update API failure. str(exc) is the UI message."""
+
+
+def du_update_request(token: str, du_number: int, display_number: int):
+    """(url, headers) for the DU_Update call."""
+    server_url = os.getenv("SERVER_URL")
+    device_id = os.getenv("DEVICE_ID", "")
+    if not server_url:
+        raise DuUpdateError("SERVER_URL not configured")
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "deviceID": f"{device_id}",
+        "duNumber": str(du_number),
+        "displayNumber": str(display_number),
+    }
+    return f"{server_url}api/dispenserUnit/DU_Update", headers
+
+
+def parse_du_update_response(resp):
+    """
+    options list from a DU_Update response (requests or httpx).
+    Raises DuUpdateError with the UI message on failure.
+    """
+    if resp.status_code != 200:
+        # try to parse error message
+        try:
+            msg = resp.json().get("message", resp.text)
+        except Exception:
+            msg = resp.text
+        if isinstance(msg, str) and "No DU Assigned" in msg:
+            raise DuUpdateError("No DU Assigned")
+        raise DuUpdateError(f"DU_Update error: HTTP {resp.status_code}")
+
+    try:
+        return resp.json().get("response")
+    except Exception as e:
+        raise DuUpdateError(f"Malformed DU_Update response: {e}")
+
+
+# --------- DU_Update cache ----------
+DU_UPDATE_CACHE_TTL = float(os.getenv("DU_UPDATE_CACHE_TTL", "300"))  # seconds, 0 = always revalidate
+DU_UPDATE_CACHE_MAX_ENTRIES = int(os.getenv("DU_UPDATE_CACHE_MAX_ENTRIES", "64"))
+
+
+class DuUpdateCache:
+    """
+    In-memory cache of DU_Update option lists keyed by
+    (token hash, deviceID, duNumber, displayNumber), so a list fetched for
+    one login is never served (fresh or stale) to another.
+
+    Within ttl seconds an entry is served without a request. After that it
+    is revalidated with If-None-Match when the server sent an ETag (a 304
+    keeps the entry), and if the server cannot be reached (or answers 5xx)
+    the old entry is served marked stale. The oldest entry is dropped above
+    max_entries.
+
+    begin() / finish() / offline() hold the logic shared by the sync and
+    async handshakes; each returns the DU_Update result:
+      {"options", "source": "network" | "cache" | "revalidated" | "stale", "fetchedAt"}
+    """
+
+    def __init__(self, ttl: float = DU_UPDATE_CACHE_TTL, max_entries: int = DU_UPDATE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> {"options", "etag", "fetched_at", "checked_at"}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(headers: dict) -> tuple:
+        user = hashlib.sha256(headers.get("Authorization", "").encode()).hexdigest()
+        return user, headers["deviceID"], headers["duNumber"], headers["displayNumber"]
+
+    def begin(self, headers: dict):
+        """
+        (fresh result or None, headers to send). The returned headers carry
+        If-None-Match when a revalidation is possible.
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(headers))
+            if entry is None:
+                return None, headers
+            if time.time() - entry["checked_at"] < self.ttl:
+                self._entries.move_to_end(self.key(headers))
+                return self._result(entry, "cache"), headers
+            if entry["etag"]:
+                headers = dict(headers, **{"If-None-Match": entry["etag"]})
+            return None, headers
+
+    def finish(self, headers: dict, resp) -> dict:
+        """Handle a DU_Update response (requests or httpx). Raises DuUpdateError."""
+        key = self.key(headers)
+        if resp.status_code == 304:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["checked_at"] = time.time()
+                    return self._result(entry, "revalidated")
+            raise DuUpdateError("DU_Update error: HTTP 304 without a cached list")
+        if resp.status_code >= 500:
+            stale = self.offline(headers)
+            if stale is not None:
+                return stale
+
+        options = parse_du_update_response(resp)
+        now = time.time()
+        entry = {"options": options, "etag": resp.headers.get("ETag"), "fetched_at": now, "checked_at": now}
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return self._result(entry, "network")
+
+    def offline(self, headers: dict) -> dict | None:
+        """The last known list for these headers, marked stale; None if never fetched."""
+        with self._lock:
+            entry = self._entries.get(self.key(headers))
+            return self._result(entry, "stale") if entry is not None else None
+
+    def invalidate(self, headers: dict | None = None) -> None:
+        with self._lock:
+            if headers is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.key(headers), None)
+
+    @staticmethod
+    def _result(entry: dict, source: str) -> dict:
+        return {"options": entry["options"], "source": source, "fetchedAt": entry["fetched_at"]}
+
+
+du_update_cache = DuUpdateCache()
+
+
+def stale_notice(update: dict) -> str | None:
+    """UI note for a DU_Update result served from an old cache entry, else None."""
+    if update["source"] != "stale":
+        return None
+    fetched = time.strftime("%H:%M", time.localtime(update["fetchedAt"]))
+    return f"Offline: showing the DU update list from {fetched}, it may be out of date"
+
+
+def fetch_du_update(token: str, du_number: int, display_number: int, http=None,
+                    cache: DuUpdateCache | None = None) -> dict:
+    """
+    DU_Update through du_update_cache (see DuUpdateCache for the result).
+    Raises DuUpdateError with the UI message.
+    """
+    cache = cache or du_update_cache
+    url, headers = du_update_request(token, du_number, display_number)
+    cached, req_headers = cache.begin(headers)
+    if cached is not None:
+        return cached
+    if http is None:
+        from http_client import get_http  # requests: loaded on the first DU_Update call
+        http = get_http()
+    try:
+        resp = http.get(url, headers=req_headers)
+    except Exception as e:
+        stale = cache.offline(headers)
+        if stale is None:
+            raise DuUpdateError(f"Error contacting server: {e}")
+        return stale
+    return cache.finish(headers, resp)
+
+
 def read_du_from_serial(
     token: str,
     callback_ui_message: Callable[[str], None],
@@ -69,6 +491,8 @@ def read_du_from_serial(
     callback_ui_error: Callable[[str], None],
     serial_port: str = DEFAULT_SERIAL_PORT,
     baudrate: int = DEFAULT_BAUDRATE,
+    http=None,
+    cancel_token: CancelToken | None = None,
 ):
     """
     Blocking function that does the DU handshake. Call it from a worker thread.
@@ -78,263 +502,77 @@ def read_du_from_serial(
       callback_ui_message: fn(str) for status updates
       callback_ui_success: fn(dict) on success (receives options from DU_Update API)
       callback_ui_error: fn(str) on error
-      serial_port: device path (default '/dev/ttyS3')
+      serial_port: device path (default SERIAL_PORT, '/dev/ttyAMA0')
       baudrate: int baud
+      http: session for DU_Update (default: the shared http_client session)
+      cancel_token: cancelling it interrupts the blocked serial read; the
+        handshake then reports "Handshake cancelled" and calls neither callback
 
     Behavior mirrors your JS:
-      - toggle BL_DETECT HIGH
-      - open serial
-      - accumulate hex chunks until >= 1024 chars (512 bytes)
-      - build buffer, check SOP/EOP; if mismatch -> decrypt_hex_block(receivedHex)
-      - check CRC using calculate_crc16() and calculate_little_endian()
+      - toggle BL_DETECT HIGH and open the shared serial session (du_serial_stream)
+      - take the first valid 512-byte frame from iter_du_frames
+        (plain or AES-decrypted SOP/EOP/CRC check, re-syncing on corrupt data)
       - determine isEncryptionEnable via firmware bytes
       - call DU_Update API with headers Authorization Bearer, deviceID, duNumber, displayNumber
+        (served from du_update_cache within DU_UPDATE_CACHE_TTL, stale when offline)
       - callback_ui_success(options) on success
       - ensures turn_BL_Detect_Low() in error/final branches
     """
-
+    cancel_token = cancel_token or CancelToken()
     try:
-        # raise BL detect high (start handshake)
-        try:
-            turn_BL_Detect_High()
-        except Exception as e:
-            callback_ui_message(f"Warning: turn_BL_Detect_High failed: {e}")
-
-        callback_ui_message(f"Opening serial port {serial_port}...")
         try:
-            ser = serial.Serial(serial_port, baudrate=baudrate, timeout=0.5)
-        except Exception as e:
-            callback_ui_error(f"E14 - Serial Port Error during Handshake: {e}")
-            try:
-                turn_BL_Detect_Low()
-            except:
-                pass
+            with du_serial_stream(serial_port, baudrate, callback_ui_message, stop_event=cancel_token) as frames, \
+                    cancel_token.on_cancel(get_session(serial_port).cancel_read):
+                callback_ui_message("Waiting for DU...")
+                frame = next(frames, None)
+        except DuSerialError as e:
+            if cancel_token.is_set():
+                raise TaskCancelled(cancel_token.reason)
+            callback_ui_error(str(e))
             return
+        if frame is None:  # the frame loop only ends on stop_event
+            raise TaskCancelled(cancel_token.reason)
 
-        received_hex = ""
-        start_time = time.time()
-        is_encryption_enable = False
-        buffer_bytes = b""
-
-        callback_ui_message("Waiting for DU...")
-
-        while True:
-            # timeout if nothing arrives for HANDSHAKE_TIMEOUT seconds
-            if time.time() - start_time > HANDSHAKE_TIMEOUT and len(received_hex) == 0:
-                try:
-                    turn_BL_Detect_Low()
-                except:
-                    pass
-                ser.close()
-                callback_ui_error("E31 - No data received during Handshake")
-                return
-
-            # read any available bytes
-            try:
-                chunk = ser.read(256)  # read up to 256 bytes
-            except Exception as e:
-                try:
-                    turn_BL_Detect_Low()
-                except:
-                    pass
-                ser.close()
-                callback_ui_error(f"E14 - Serial Port Error during Handshake: {e}")
-                return
-
-            if not chunk:
-                # no data right now, continue looping
-                continue
-
-            # reset handshake timer (we got some data)
-            start_time = time.time()
-
-            # append chunk as hex string (exactly like JS Buffer.toString('hex'))
-            chunk_hex = chunk.hex()
-            received_hex += chunk_hex
-
-            # debug update
-            callback_ui_message(f"Received hex length: {len(received_hex)}")
-
-            # wait until we have at least 1024 hex chars (512 bytes)
-            if len(received_hex) < REQUIRED_HEX_LENGTH:
-                continue
-
-            # Work with the first 1024 hex chars (512 bytes) like JS
-            first_block_hex = received_hex[:REQUIRED_HEX_LENGTH]
-            try:
-                buffer_bytes = bytes.fromhex(first_block_hex)
-            except Exception:
-                ser.close()
-                try:
-                    turn_BL_Detect_Low()
-                except:
-                    pass
-                callback_ui_error("Invalid hex data received")
-                return
-
-            # SOP / EOP (JS used bufferData[0] and bufferData[509])
-            SOP = f"{buffer_bytes[0]:02x}"
-            EOP = f"{buffer_bytes[509]:02x}"
-
-            # firmware bytes
-            firmware_v1 = buffer_bytes[393]
-            firmware_v2 = buffer_bytes[394]
-
-            # Try unencrypted flow first
-            try:
-                if SOP == "2a" and EOP == "3c":
-                    # unencrypted; check CRC
-                    crc_calc = calculate_crc16(buffer_bytes[:510])  # int
-                    little_end = calculate_little_endian(crc_calc)
-                    crc_recv = buffer_bytes[510:512].hex()
-                    if little_end != crc_recv:
-                        # invalid CRC
-                        try:
-                            turn_BL_Detect_Low()
-                        except:
-                            pass
-                        ser.close()
-                        callback_ui_error("E52 - Invalid Data Received")
-                        return
-                    is_encryption_enable = get_encryption_flag_from_fw(firmware_v1, firmware_v2)
-                else:
-                    # encrypted: decrypt the 1024 hex block using AES-CBC (Decrypt)
-                    callback_ui_message("Encrypted data received, decrypting...")
-                    try:
-                        decrypted_hex = decrypt_hex_block(first_block_hex)
-                    except Exception as e:
-                        ser.close()
-                        try:
-                            turn_BL_Detect_Low()
-                        except:
-                            pass
-                        callback_ui_error(f"E52 - Decrypt failed: {e}")
-                        return
-
-                    # convert decrypted hex to bytes and re-evaluate SOP/EOP/CRC/firmware
-                    try:
-                        buffer_bytes = bytes.fromhex(decrypted_hex)
-                    except Exception as e:
-                        ser.close()
-                        try:
-                            turn_BL_Detect_Low()
-                        except:
-                            pass
-                        callback_ui_error("E52 - Decrypted data invalid hex")
-                        return
-
-                    SOP = f"{buffer_bytes[0]:02x}"
-                    EOP = f"{buffer_bytes[509]:02x}"
-                    firmware_v1 = buffer_bytes[393]
-                    firmware_v2 = buffer_bytes[394]
-
-                    if SOP != "2a" or EOP != "3c":
-                        ser.close()
-                        try:
-                            turn_BL_Detect_Low()
-                        except:
-                            pass
-                        callback_ui_error("E52 - Invalid Data Received")
-                        return
-
-                    crc_calc = calculate_crc16(buffer_bytes[:510])
-                    little_end = calculate_little_endian(crc_calc)
-                    crc_recv = buffer_bytes[510:512].hex()
-                    if little_end != crc_recv:
-                        ser.close()
-                        try:
-                            turn_BL_Detect_Low()
-                        except:
-                            pass
-                        callback_ui_error("E52 - Invalid Data Received")
-                        return
-
-                    is_encryption_enable = get_encryption_flag_from_fw(firmware_v1, firmware_v2)
-
-            except Exception as e:
-                ser.close()
-                try:
-                    turn_BL_Detect_Low()
-                except:
-                    pass
-                callback_ui_error(f"Error validating data: {e}")
-                return
-
-            # Passed validation — extract DU & Display numbers
-            try:
-                du_number, display_number = parse_du_and_display_from_hex(first_block_hex)
-            except Exception as e:
-                ser.close()
-                turn_BL_Detect_Low()
-                callback_ui_error(f"Parsing DU/Display failed: {e}")
-                return
+        if frame.encrypted:
+            callback_ui_message("Encrypted data received, decrypted OK")
 
+        # Passed validation — extract DU & Display numbers
+        du_number = frame.du_number
+        display_number = frame.display_number
+        is_encryption_enable = frame.is_encryption_enable
 
-            # close serial and pull BL pin low like JS
-            try:
-                ser.close()
-            except:
-                pass
-            try:
-                turn_BL_Detect_Low()
-            except:
-                pass
-
-            callback_ui_message(f"DU detected: {du_number}, Display: {display_number}")
-
-            # Now call DU_Update API to get file list
-            server_url = os.getenv("SERVER_URL")
-            device_id = os.getenv("DEVICE_ID", "")
-            if not server_url:
-                callback_ui_error("SERVER_URL not configured")
-                return
+        callback_ui_message(f"DU detected: {du_number}, Display: {display_number}")
 
+        # Now call DU_Update API to get file list (cached per login/DU/display, see DuUpdateCache)
+        cancel_token.raise_if_cancelled()
+        try:
             callback_ui_message("Querying server for DU update list...")
-            try:
-                resp = requests.get(
-                    f"{server_url}api/dispenserUnit/DU_Update",
-                    headers={
-                        "Authorization": f"Bearer {token}",
-                        "deviceID": f"{device_id}",
-                        "duNumber": str(du_number),
-                        "displayNumber": str(display_number),
-                    },
-                    timeout=20,
-                )
-            except Exception as e:
-                callback_ui_error(f"Error contacting server: {e}")
-                return
-
-            if resp.status_code != 200:
-                # try to parse error message
-                try:
-                    msg = resp.json().get("message", resp.text)
-                except Exception:
-                    msg = resp.text
-                if isinstance(msg, str) and "No DU Assigned" in msg:
-                    callback_ui_error("No DU Assigned")
-                else:
-                    callback_ui_error(f"DU_Update error: HTTP {resp.status_code}")
-                return
-
-            try:
-                options = resp.json().get("response")
-            except Exception as e:
-                callback_ui_error(f"Malformed DU_Update response: {e}")
-                return
-
-            # success: return options to UI
-            callback_ui_success({
-                "duNumber": du_number,
-                "displayNumber": display_number,
-                "options": options,
-                "isEncryptionEnable": is_encryption_enable
-            })
+            update = fetch_du_update(token, du_number, display_number, http)
+        except DuUpdateError as e:
+            callback_ui_error(str(e))
             return
+        cancel_token.raise_if_cancelled()
+        notice = stale_notice(update)
+        if notice:
+            callback_ui_message(notice)
+
+        # success: return options to UI
+        callback_ui_success({
+            "duNumber": du_number,
+            "displayNumber": display_number,
+            "options": update["options"],
+            "isEncryptionEnable": is_encryption_enable,
+            "isStale": update["source"] == "stale",
+            "fetchedAt": update["fetchedAt"],
+        })
+        return
 
+    except TaskCancelled as exc:
+        callback_ui_message(f"Handshake cancelled ({exc})")
+        return
     except Exception as exc:
         try:
-            turn_BL_Detect_Low()
+            get_session(serial_port).set_bl_detect(False)
         except:
             pass
         callback_ui_error(f"Unexpected error: {exc}")
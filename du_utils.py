@@ -1,34 +1,182 @@
 # du_utils.py
 import subprocess
 import hashlib
-from Crypto.Cipher import AES
 import binascii
-import boto3
-import requests
 import os
 import json
 import time
+import threading
+from collections import OrderedDict
+
+# boto3, pycryptodome, requests and numpy take a long time to import on a Pi;
+# they are imported inside the functions that need them.
+_np = False  # not tried yet
+
+
+def get_numpy():
+    """numpy if installed (imported on first use, optional: bulk CRC only), else None."""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
 
 # ---------------------------
 # CRC16 (Modbus/IBM) function
 # ---------------------------
-def calculate_crc16(data: bytes) -> int:
+CRC16_POLY = 0xA001
+CRC16_INIT = 0xFFFF
+FRAME_SIZE = 512        # bytes per DU frame
+FRAME_CRC_OFFSET = 510  # CRC covers bytes 0..509, stored in 510..511
+
+
+def calculate_crc16_bitwise(data: bytes) -> int:
     """
-    Calculate CRC-16 (polynomial 0xA001) same as the JS implementation.
-    Input: bytes
-    Returns: integer CRC (0..0xFFFF)
+    Reference bit-by-bit CRC-16 (polynomial 0xA001) same as the JS implementation.
+    Kept for verification and benchmarks; use calculate_crc16() in real code.
     """
-    crc = 0xFFFF
+    crc = CRC16_INIT
     for b in data:
         crc ^= b
         for _ in range(8):
             if (crc & 1) != 0:
-                crc = (crc >> 1) ^ 0xA001
+                crc = (crc >> 1) ^ CRC16_POLY
+            else:
+                crc >>= 1
+    return crc & 0xFFFF
+
+
+def _build_crc16_table() -> tuple:
+    """
+    Precompute the 256-entry lookup table: table[n] is the CRC register after
+    shifting the single byte n through the 8 rounds of calculate_crc16_bitwise.
+    """
+    table = []
+    for n in range(256):
+        crc = n
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC16_POLY
             else:
                 crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_crc16_table()
+
+
+def calculate_crc16(data: bytes, crc: int = CRC16_INIT) -> int:
+    """
+    Calculate CRC-16 (polynomial 0xA001) same as the JS implementation.
+    Input: bytes (or bytearray / memoryview)
+    crc: starting register, pass a previous result to continue a running CRC
+    Returns: integer CRC (0..0xFFFF)
+    """
+    table = CRC16_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
     return crc & 0xFFFF
 
 
+def calculate_crc16_bulk(frames, frame_size: int = FRAME_SIZE, length: int = FRAME_CRC_OFFSET) -> list:
+    """
+    CRC-16 of the first `length` bytes of every frame in one call.
+    frames: bytes / bytearray / memoryview holding back-to-back frames of
+            `frame_size` bytes, or a NumPy uint8 array of shape (n, frame_size).
+    Returns: list of integer CRCs, one per frame.
+
+    With NumPy installed the table lookup runs column-wise over all frames at
+    once (one vector step per byte position instead of per byte); without it
+    we fall back to calculate_crc16() per frame.
+    """
+    np = get_numpy()
+    if np is not None:
+        arr = np.asarray(frames if isinstance(frames, np.ndarray) else memoryview(frames), dtype=np.uint8)
+        arr = arr.reshape(-1, frame_size)
+        table = np.asarray(CRC16_TABLE, dtype=np.uint16)
+        crc = np.full(arr.shape[0], CRC16_INIT, dtype=np.uint16)
+        for col in arr[:, :length].T:
+            crc = (crc >> 8) ^ table[(crc ^ col) & 0xFF]
+        return crc.tolist()
+
+    view = memoryview(frames).cast("B")
+    if len(view) % frame_size:
+        raise ValueError("calculate_crc16_bulk: data length is not a multiple of frame_size")
+    return [
+        calculate_crc16(view[start:start + length])
+        for start in range(0, len(view), frame_size)
+    ]
+
+
+def match_crc16_bulk(frames, frame_size: int = FRAME_SIZE) -> list:
+    """
+    Bulk version of match_crc16(): checks every frame's CRC (bytes 510..511,
+    low byte first) against the CRC of its bytes 0..509.
+    Returns: list of bools, one per frame.
+    """
+    crc_offset = frame_size - 2
+    crcs = calculate_crc16_bulk(frames, frame_size, crc_offset)
+    np = get_numpy()
+    if np is not None and isinstance(frames, np.ndarray):
+        arr = frames.reshape(-1, frame_size).astype(np.uint16)
+        received = (arr[:, crc_offset] | (arr[:, crc_offset + 1] << 8)).tolist()
+    else:
+        view = memoryview(frames).cast("B")
+        received = [
+            view[start + crc_offset] | (view[start + crc_offset + 1] << 8)
+            for start in range(0, len(view), frame_size)
+        ]
+    return [calc == recv for calc, recv in zip(crcs, received)]
+
+
+class Crc16:
+    """
+    Running CRC-16 (polynomial 0xA001), for folding data in as it arrives.
+
+        crc = Crc16()
+        crc.update(chunk1)
+        crc.update(chunk2)
+        crc.digest() == calculate_crc16(chunk1 + chunk2)
+    """
+
+    __slots__ = ("_crc", "length")
+
+    def __init__(self, data: bytes = b""):
+        self._crc = CRC16_INIT
+        self.length = 0
+        if data:
+            self.update(data)
+
+    def update(self, chunk: bytes) -> "Crc16":
+        """Fold more bytes (bytes / bytearray / memoryview) into the CRC."""
+        self._crc = calculate_crc16(chunk, self._crc)
+        self.length += len(chunk)
+        return self
+
+    def digest(self) -> int:
+        """Integer CRC (0..0xFFFF) of everything passed to update() so far."""
+        return self._crc
+
+    def hexdigest(self) -> str:
+        """Same value in the on-wire format used by calculate_little_endian()."""
+        return calculate_little_endian(self._crc)
+
+    def copy(self) -> "Crc16":
+        """Independent copy, e.g. to branch a rolling check."""
+        other = Crc16()
+        other._crc = self._crc
+        other.length = self.length
+        return other
+
+    def reset(self) -> None:
+        self._crc = CRC16_INIT
+        self.length = 0
+
+
 def calculate_little_endian(crc: int) -> str:
     """
     Convert crc to "little-endian" 4-char hex string (lowercase), same as JS:
@@ -63,11 +211,27 @@ def generate_hash(hex_data: str) -> str:
     except Exception as e:
         raise ValueError(f"generate_hash: invalid hex data: {e}")
 
+    return generate_hash_bytes(file_bytes)
+
+
+def generate_hash_bytes(data) -> str:
+    """
+    Input: bytes / bytearray / memoryview
+    Return: sha256(data) as hex string
+    """
     h = hashlib.sha256()
-    h.update(file_bytes)
+    h.update(data)
     return h.hexdigest()
 
 
+def _check_aes256_key(key: bytes, caller: str) -> None:
+    if not isinstance(key, (bytes, bytearray)):
+        raise ValueError(f"{caller}: key must be bytes")
+
+    if len(key) != 32:
+        raise ValueError(f"{caller}: key must be 32 bytes for AES-256")
+
+
 def decrypt_file(hex_data: str, key: bytes) -> bytes:
     """
     AES-256-ECB decrypt.
@@ -75,38 +239,149 @@ def decrypt_file(hex_data: str, key: bytes) -> bytes:
     key: bytes (length must be 32 bytes)
     Returns decrypted bytes (not hex)
     """
-    if not isinstance(key, (bytes, bytearray)):
-        raise ValueError("decrypt_file: key must be bytes")
+    _check_aes256_key(key, "decrypt_file")
+    return decrypt_file_bytes(bytes.fromhex(hex_data), key)
 
-    if len(key) != 32:
-        raise ValueError("decrypt_file: key must be 32 bytes for AES-256")
 
-    encrypted_bytes = bytes.fromhex(hex_data)
+def decrypt_file_bytes(data, key: bytes) -> bytes:
+    """
+    AES-256-ECB decrypt without hex round-trips.
+    data: bytes / bytearray / memoryview of the encrypted file
+    key: bytes (length must be 32 bytes)
+    Returns decrypted bytes
+    """
+    from Crypto.Cipher import AES
+    _check_aes256_key(key, "decrypt_file_bytes")
     cipher = AES.new(key, AES.MODE_ECB)
-    decrypted = cipher.decrypt(encrypted_bytes)
-
     # In Node they used Buffer.concat(decipher.update(...), decipher.final()) - PyCryptodome decrypt gives complete bytes.
-    return decrypted
+    return cipher.decrypt(data)
+
+
+def decrypt_file_into(dst, src, key: bytes) -> None:
+    """
+    AES-256-ECB decrypt src into dst, a writable preallocated buffer
+    (bytearray / memoryview / mmap slice) of the same length.
+    """
+    from Crypto.Cipher import AES
+    _check_aes256_key(key, "decrypt_file_into")
+    cipher = AES.new(key, AES.MODE_ECB)
+    cipher.decrypt(src, output=dst)
 
 
 # ---------------------------
 # KMS decrypt (decryptKey)
 # ---------------------------
-def decrypt_key_kms(ciphertext: bytes, region: str = "ap-south-1") -> bytes | None:
+KMS_REGION = "ap-south-1"
+KMS_KEY_CACHE_TTL = float(os.getenv("KMS_KEY_CACHE_TTL", "900"))  # seconds
+KMS_KEY_CACHE_MAX_ENTRIES = int(os.getenv("KMS_KEY_CACHE_MAX_ENTRIES", "16"))
+
+_kms_clients = {}
+_kms_clients_lock = threading.Lock()
+
+
+def get_kms_client(region: str = KMS_REGION):
+    """
+    Process-wide boto3 KMS client per region, created on first use
+    (building a client costs hundreds of ms of botocore loading).
+    """
+    with _kms_clients_lock:
+        client = _kms_clients.get(region)
+        if client is None:
+            import boto3
+            client = boto3.client("kms", region_name=region)
+            _kms_clients[region] = client
+        return client
+
+
+class DataKeyCache:
+    """
+    In-memory cache of KMS-decrypted data keys, keyed by sha256 of the
+    ciphertext blob. Entries expire after ttl seconds and the oldest entry
+    is dropped above max_entries. The cached key bytes are overwritten with
+    zeros when an entry is evicted, expires or the cache is cleared.
+    """
+
+    def __init__(self, ttl: float = KMS_KEY_CACHE_TTL, max_entries: int = KMS_KEY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # digest -> (bytearray key, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(ciphertext: bytes, region: str) -> str:
+        return hashlib.sha256(region.encode() + b"\0" + bytes(ciphertext)).hexdigest()
+
+    def get(self, ciphertext: bytes, region: str = KMS_REGION) -> bytes | None:
+        digest = self._digest(ciphertext, region)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] < time.monotonic():
+                self._drop(digest)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return bytes(entry[0])
+
+    def put(self, ciphertext: bytes, plaintext: bytes, region: str = KMS_REGION) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        digest = self._digest(ciphertext, region)
+        with self._lock:
+            if digest in self._entries:
+                self._drop(digest)
+            self._entries[digest] = (bytearray(plaintext), time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            for digest in list(self._entries):
+                self._drop(digest)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _drop(self, digest: str) -> None:
+        key, _ = self._entries.pop(digest)
+        key[:] = bytes(len(key))  # zeroize
+
+
+data_key_cache = DataKeyCache()
+
+
+def decrypt_key_kms(ciphertext: bytes, region: str = KMS_REGION) -> bytes | None:
     """
     Uses boto3 KMS decrypt to decrypt a data key. Returns plaintext bytes or None.
     ciphertext: bytes (binary ciphertext blob)
+    Results are served from data_key_cache when the same blob was decrypted recently.
     """
+    cached = data_key_cache.get(ciphertext, region)
+    if cached is not None:
+        return cached
     try:
-        client = boto3.client("kms", region_name=region)
+        client = get_kms_client(region)
         resp = client.decrypt(CiphertextBlob=ciphertext)
         # resp['Plaintext'] is bytes
-        return resp.get("Plaintext")
+        plaintext = resp.get("Plaintext")
+        if plaintext:
+            data_key_cache.put(ciphertext, plaintext, region)
+        return plaintext
     except Exception as e:
         print("decrypt_key_kms error:", e)
         return None
 
 
+def kms_cache_stats() -> dict:
+    """Hit/miss counters and current size of the data-key cache."""
+    return data_key_cache.stats()
+
+
 # ---------------------------
 # formatHashTo64Bytes
 # ---------------------------
@@ -190,6 +465,7 @@ def run_commands(values: dict):
 # ---------------------------
 def check_connection(timeout: int = 5) -> bool:
     try:
+        import requests
         resp = requests.get("https://www.google.com", timeout=timeout)
         return resp.status_code == 200
     except Exception as e:
@@ -213,11 +489,22 @@ def convert_seconds(total_seconds) -> dict:
 # ---------------------------
 __all__ = [
     "calculate_crc16",
+    "calculate_crc16_bitwise",
+    "calculate_crc16_bulk",
+    "match_crc16_bulk",
+    "Crc16",
     "calculate_little_endian",
     "match_crc16",
     "generate_hash",
+    "generate_hash_bytes",
     "decrypt_file",
+    "decrypt_file_bytes",
+    "decrypt_file_into",
     "decrypt_key_kms",
+    "get_kms_client",
+    "DataKeyCache",
+    "data_key_cache",
+    "kms_cache_stats",
     "format_hash_to_64_bytes",
     "run_commands",
     "exec_command",
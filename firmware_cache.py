@@ -0,0 +1,244 @@
+# firmware_cache.py
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+FIRMWARE_CACHE_DIR = os.getenv(
+    "FIRMWARE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "python_bootloader", "firmware")
+)
+FIRMWARE_CACHE_MAX_BYTES = int(os.getenv("FIRMWARE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FirmwareCache:
+    """
+    On-disk cache of verified (decrypted) firmware images.
+
+    Images are stored as <encrypted_hash>.bin and described in manifest.json:
+      entries:  encrypted_hash -> {original_hash, encrypted_key, size, last_used}
+      file_ids: file_id -> encrypted_hash (lets a repeat flash find the image offline)
+
+    Writes are atomic (temp file + os.replace), every read re-checks the
+    plaintext against original_hash, and the least recently used images are
+    evicted once the total size goes over max_bytes.
+    Safe to share between threads.
+    """
+
+    def __init__(self, directory: str = FIRMWARE_CACHE_DIR, max_bytes: int = FIRMWARE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._manifest = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ---------------------------
+    # manifest
+    # ---------------------------
+    def _load(self) -> dict:
+        if self._manifest is None:
+            try:
+                with open(self._manifest_path, "r") as f:
+                    self._manifest = json.load(f)
+                if not isinstance(self._manifest, dict):
+                    raise ValueError("manifest is not an object")
+            except FileNotFoundError:
+                self._manifest = {}
+            except (OSError, ValueError) as e:
+                print("firmware cache: manifest unreadable, starting empty:", e)
+                self._manifest = {}
+            self._manifest.setdefault("entries", {})
+            self._manifest.setdefault("file_ids", {})
+            self._sweep()
+        return self._manifest
+
+    def _sweep(self) -> None:
+        """
+        Delete images the manifest does not know (a lost or truncated manifest,
+        or a crash between storing an image and saving the manifest) and
+        leftover temp files, so they cannot outgrow max_bytes unseen.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        entries = self._manifest["entries"]
+        for name in names:
+            stale = name.endswith(".tmp") or (name.endswith(".bin") and name[:-len(".bin")] not in entries)
+            if stale:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _save(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _blob_path(self, encrypted_hash: str) -> str:
+        return os.path.join(self.directory, f"{encrypted_hash}.bin")
+
+    # ---------------------------
+    # public API
+    # ---------------------------
+    def lookup(self, file_id: str) -> str | None:
+        """encrypted_hash last stored for file_id, or None."""
+        with self._lock:
+            return self._load()["file_ids"].get(str(file_id))
+
+    def contains(self, encrypted_hash: str) -> bool:
+        """True if an image for encrypted_hash is cached (not re-verified)."""
+        if not self.enabled or not encrypted_hash:
+            return False
+        with self._lock:
+            return encrypted_hash in self._load()["entries"]
+
+    def get(self, encrypted_hash: str, sink) -> dict | None:
+        """
+        Copy the cached image for encrypted_hash into sink (a writable binary
+        file) and return its metadata, or None on a miss. A corrupt entry is
+        dropped and reported as a miss.
+        """
+        if not self.enabled or not encrypted_hash:
+            return None
+        with self._lock:
+            entry = self._load()["entries"].get(encrypted_hash)
+            if entry is None:
+                return None
+
+            h = hashlib.sha256()
+            sink.seek(0)
+            sink.truncate()
+            try:
+                with open(self._blob_path(encrypted_hash), "rb") as f:
+                    while True:
+                        chunk = f.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        h.update(chunk)
+                        sink.write(chunk)
+            except OSError:
+                self._remove(encrypted_hash)
+                self._save()
+                return None
+
+            if h.hexdigest() != entry["original_hash"]:
+                print("firmware cache: integrity check failed, dropping", encrypted_hash)
+                sink.seek(0)
+                sink.truncate()
+                self._remove(encrypted_hash)
+                self._save()
+                return None
+
+            sink.flush()
+            entry["last_used"] = time.time()
+            self._save()
+            return dict(entry, encrypted_hash=encrypted_hash)
+
+    def put(self, file_id: str, meta: dict, source) -> bool:
+        """
+        Store a verified image. meta needs encrypted_hash and original_hash;
+        source is a readable binary file holding the plaintext (read from 0).
+        Returns False if the image does not match original_hash or does not fit.
+        """
+        if not self.enabled:
+            return False
+        encrypted_hash = meta["encrypted_hash"]
+        with self._lock:
+            manifest = self._load()  # sweeps leftovers first, never the image written below
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".bin.tmp")
+            h = hashlib.sha256()
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    source.seek(0)
+                    while True:
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        h.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+                if h.hexdigest() != meta["original_hash"] or size > self.max_bytes:
+                    os.remove(tmp_path)
+                    return False
+
+                os.replace(tmp_path, self._blob_path(encrypted_hash))
+            except OSError as e:
+                print("firmware cache: write failed:", e)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return False
+            finally:
+                source.seek(0)
+
+            manifest["entries"][encrypted_hash] = {
+                "original_hash": meta["original_hash"],
+                "encrypted_key": meta.get("encrypted_key"),
+                "size": size,
+                "last_used": time.time(),
+            }
+            manifest["file_ids"][str(file_id)] = encrypted_hash
+            self._evict(keep=encrypted_hash)
+            self._save()
+            return True
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e["size"] for e in self._load()["entries"].values())
+
+    # ---------------------------
+    # eviction
+    # ---------------------------
+    def _evict(self, keep: str | None = None) -> None:
+        entries = self._load()["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for encrypted_hash, _ in sorted(entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if encrypted_hash == keep:
+                continue
+            total -= entries[encrypted_hash]["size"]
+            self._remove(encrypted_hash)
+
+    def _remove(self, encrypted_hash: str) -> None:
+        manifest = self._load()
+        manifest["entries"].pop(encrypted_hash, None)
+        for file_id in [k for k, v in manifest["file_ids"].items() if v == encrypted_hash]:
+            del manifest["file_ids"][file_id]
+        try:
+            os.remove(self._blob_path(encrypted_hash))
+        except OSError:
+            pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_firmware_cache() -> FirmwareCache:
+    """Process-wide cache instance (created on first use)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FirmwareCache()
+        return _default_cache
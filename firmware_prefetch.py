@@ -0,0 +1,314 @@
+# firmware_prefetch.py
+"""
+Background download of the firmware the technician is likely to pick.
+
+As soon as DU_Update returns, start() ranks the options (the file last
+flashed on this DU first, then the newest versions) and downloads, verifies
+and caches up to PREFETCH_CANDIDATES of them one after the other, within a
+bandwidth limit (PREFETCH_RATE_LIMIT) and a disk budget (PREFETCH_MAX_BYTES).
+When a file is picked, select() cancels the other prefetches and lets the
+picked one finish at full speed, so download_and_flash() finds it in the
+firmware cache. A cancelled download keeps its partial file and is resumed
+by the next fetch of the same file.
+"""
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+
+from bootloader_download import (
+    FirmwareDownloadError,
+    firmware_request,
+    get_verified_firmware,
+    probe_encrypted_hash,
+)
+from firmware_cache import FIRMWARE_CACHE_DIR, get_firmware_cache
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+PREFETCH_CANDIDATES = int(os.getenv("PREFETCH_CANDIDATES", "2"))    # 0 disables prefetch
+PREFETCH_RATE_LIMIT = int(os.getenv("PREFETCH_RATE_LIMIT", "0"))    # bytes/s, 0 = unlimited
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", str(64 * 1024 * 1024)))  # per start()
+FLASH_HISTORY_PATH = os.getenv("FLASH_HISTORY_PATH", os.path.join(FIRMWARE_CACHE_DIR, "flash_history.json"))
+
+# keys tried, in order, on each DU_Update option
+FILE_ID_KEYS = ("fileId", "file_id", "_id", "id", "value")
+VERSION_KEYS = ("version", "fileVersion", "firmwareVersion", "createdAt", "updatedAt")
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+# ---------------------------
+# DU_Update options
+# ---------------------------
+def option_file_id(option) -> str | None:
+    """file id of one DU_Update option (a dict, or the id itself)."""
+    if isinstance(option, dict):
+        for key in FILE_ID_KEYS:
+            if option.get(key) is not None:
+                return str(option[key])
+        return None
+    return str(option) if option is not None else None
+
+
+def option_version(option) -> tuple:
+    """Sort key for an option's version: "1.10.2" > "1.9", ISO dates compare as text."""
+    if not isinstance(option, dict):
+        return ()
+    for key in VERSION_KEYS:
+        value = option.get(key)
+        if value is not None:
+            return tuple(int(p) if p.isdigit() else p for p in re.split(r"[.\-_ :T]", str(value)) if p)
+    return ()
+
+
+def rank_candidates(options, last_flashed: str | None = None, limit: int = PREFETCH_CANDIDATES) -> list:
+    """Most likely file ids first: the last flashed one (if still offered), then newest versions."""
+    options = list(options or [])
+    ranked = []
+    ids = [option_file_id(o) for o in options]
+    if last_flashed is not None and str(last_flashed) in ids:
+        ranked.append(str(last_flashed))
+    try:
+        newest = sorted(options, key=option_version, reverse=True)
+    except TypeError:  # mixed version formats: keep server order
+        newest = options
+    for option in newest:
+        file_id = option_file_id(option)
+        if file_id is not None and file_id not in ranked:
+            ranked.append(file_id)
+    return ranked[:max(limit, 0)]
+
+
+# ---------------------------
+# last flashed file per DU
+# ---------------------------
+class FlashHistory:
+    """duNumber -> file id last flashed successfully, kept in a small JSON file."""
+
+    def __init__(self, path: str = FLASH_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def last(self, du_number) -> str | None:
+        with self._lock:
+            return self._load().get(str(du_number))
+
+    def record(self, du_number, file_id) -> None:
+        with self._lock:
+            data = self._load()
+            data[str(du_number)] = str(file_id)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".json.tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print("flash history: write failed:", e)
+
+
+# ---------------------------
+# prefetch sink: cancel, bandwidth and disk budget
+# ---------------------------
+class _BudgetSink:
+    """
+    Wraps the temp file a prefetch writes into. Each write checks the cancel
+    flag and the disk budget, and sleeps as needed to stay under rate_limit
+    (bytes/s) unless the prefetch has been promoted to full speed.
+    """
+
+    def __init__(self, f, job, budget):
+        self._f = f
+        self._job = job
+        self._budget = budget  # shared [bytes left]
+        self._started = time.monotonic()
+        self._written = 0
+
+    def write(self, data) -> int:
+        job = self._job
+        if job.cancelled.is_set():
+            raise PrefetchCancelled(f"prefetch of {job.file_id} cancelled")
+        n = len(data)
+        self._budget[0] -= n
+        if self._budget[0] < 0 and not job.promoted.is_set():
+            raise PrefetchCancelled(f"prefetch of {job.file_id} over PREFETCH_MAX_BYTES")
+        self._written += n
+        if job.rate_limit > 0 and not job.promoted.is_set():
+            ahead = self._written / job.rate_limit - (time.monotonic() - self._started)
+            if ahead > 0:
+                # wakes early when cancelled or promoted
+                job.promoted.wait(min(ahead, 1.0))
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class _PrefetchJob:
+    def __init__(self, file_id: str, rate_limit: int):
+        self.file_id = file_id
+        self.rate_limit = rate_limit
+        self.cancelled = threading.Event()
+        self.promoted = threading.Event()  # picked: no rate limit / budget
+        self.done = threading.Event()
+        self.ok = False
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.promoted.set()  # wake a throttled write
+
+
+class FirmwarePrefetcher:
+    """
+    One background prefetch run at a time (start() replaces the previous run).
+
+        prefetcher.start(token, du_number, options)
+        ...
+        prefetcher.select(file_id)   # in the flash worker thread, before download_and_flash()
+        prefetcher.record_flash(du_number, file_id)  # after a successful flash
+    """
+
+    def __init__(self,
+                 cache=None,
+                 http=None,
+                 history: FlashHistory | None = None,
+                 candidates: int = PREFETCH_CANDIDATES,
+                 rate_limit: int = PREFETCH_RATE_LIMIT,
+                 max_bytes: int = PREFETCH_MAX_BYTES,
+                 callback_message=None):
+        self.cache = cache or get_firmware_cache()
+        self.http = http
+        self.history = history or FlashHistory()
+        self.candidates = candidates
+        self.rate_limit = rate_limit
+        self.max_bytes = max_bytes
+        self.callback_message = callback_message or (lambda text: print("PREFETCH:", text))
+        self._lock = threading.Lock()
+        self._jobs = []      # current run, in download order
+        self._thread = None
+
+    # ---------------------------
+    # public API
+    # ---------------------------
+    def start(self, token: str, du_number, options) -> list:
+        """Cancel any previous run and prefetch the ranked candidates; returns their file ids."""
+        file_ids = []
+        if self.cache.enabled and self.candidates > 0:
+            file_ids = rank_candidates(options, self.history.last(du_number), self.candidates)
+        jobs = [_PrefetchJob(file_id, self.rate_limit) for file_id in file_ids]
+        with self._lock:
+            previous_thread = self._thread
+            for job in self._jobs:
+                job.cancel()
+            self._jobs = jobs
+            self._thread = None
+            if jobs:
+                self._thread = threading.Thread(
+                    target=self._run, args=(token, jobs, previous_thread),
+                    name="firmware-prefetch", daemon=True,
+                )
+                self._thread.start()
+        return file_ids
+
+    def select(self, file_id, timeout: float | None = None) -> bool:
+        """
+        The technician picked file_id: cancel every other prefetch, and if
+        file_id is being (or about to be) prefetched, let it run at full speed
+        and wait for it. Returns True if it is now in the firmware cache.
+        Call from a worker thread.
+        """
+        file_id = str(file_id)
+        with self._lock:
+            picked = None
+            for job in self._jobs:
+                if job.file_id == file_id and not job.cancelled.is_set():
+                    picked = job
+                    job.promoted.set()
+                else:
+                    job.cancel()
+        if picked is None:
+            return False
+        picked.done.wait(timeout)
+        return picked.ok
+
+    def cancel(self) -> None:
+        with self._lock:
+            for job in self._jobs:
+                job.cancel()
+
+    def record_flash(self, du_number, file_id) -> None:
+        self.history.record(du_number, file_id)
+
+    # ---------------------------
+    # worker
+    # ---------------------------
+    def _run(self, token: str, jobs: list, previous_thread) -> None:
+        if previous_thread is not None:
+            # the cancelled run stops at its next write; never fetch the same file twice at once
+            previous_thread.join()
+        budget = [self.max_bytes]
+        for job in jobs:
+            try:
+                if budget[0] <= 0:
+                    self.callback_message(f"prefetch of {job.file_id} skipped: PREFETCH_MAX_BYTES used up")
+                elif not job.cancelled.is_set():
+                    job.ok = self._fetch(token, job, budget)
+            except PrefetchCancelled as e:
+                self.callback_message(str(e))
+            except FirmwareDownloadError as e:
+                self.callback_message(f"prefetch of {job.file_id} failed: {e}")
+            except Exception as e:
+                self.callback_message(f"prefetch of {job.file_id} failed: {e}")
+            finally:
+                job.done.set()
+
+    def _fetch(self, token: str, job: _PrefetchJob, budget: list) -> bool:
+        download_url, headers = firmware_request(token, job.file_id)
+        encrypted_hash = probe_encrypted_hash(download_url, headers, self.http)
+        if self.cache.contains(encrypted_hash):
+            return True
+        if job.cancelled.is_set():
+            return False
+
+        self.callback_message(f"Prefetching file {job.file_id}...")
+        started = time.monotonic()
+        with tempfile.TemporaryFile(prefix="fw_", suffix=".bin") as f:
+            # single stream: a segmented download would only hit the sink after all segments arrived
+            firmware = get_verified_firmware(download_url, headers, job.file_id, _BudgetSink(f, job, budget),
+                                             lambda text: None, segments=1, cache=self.cache, http=self.http)
+        cached = self.cache.contains(firmware["encrypted_hash"])
+        self.callback_message(
+            f"Prefetched file {job.file_id} ({firmware['size']} bytes in {time.monotonic() - started:.1f}s"
+            f"{'' if cached else ', not cached'})"
+        )
+        return cached
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> FirmwarePrefetcher:
+    """Process-wide prefetcher (created on first use)."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = FirmwarePrefetcher()
+        return _prefetcher
@@ -0,0 +1,236 @@
+# firmware_transfer.py
+import os
+import time
+from typing import Callable
+
+from decrypt_utils import encrypt_into
+from du_utils import calculate_crc16, FRAME_SIZE, FRAME_CRC_OFFSET
+from task_runner import CancelToken, TaskCancelled
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# ---------------------------
+# Frame layout (host -> DU), same envelope du_reader validates:
+#   [0]        SOP 0x2A
+#   [1:3]      sequence number (big-endian, wraps at 65536)
+#   [3:5]      payload length (big-endian, 0 = end of image)
+#   [5:509]    payload, zero padded
+#   [509]      EOP 0x3C
+#   [510:512]  CRC-16 of bytes 0..509, low byte first
+# Replies (DU -> host) are 4 bytes:
+#   [0]        ACK 0x06 / NAK 0x15
+#   [1:3]      sequence number (big-endian)
+#   [3]        check byte: XOR of bytes 0..2, inverted
+# ---------------------------
+SOP_BYTE = 0x2A
+EOP_BYTE = 0x3C
+EOP_OFFSET = 509
+HEADER_SIZE = 5
+PAYLOAD_SIZE = EOP_OFFSET - HEADER_SIZE  # 504 bytes per frame
+ACK_BYTE = 0x06
+NAK_BYTE = 0x15
+REPLY_SIZE = 4
+SEQ_MODULO = 0x10000
+
+# Configurable defaults
+FLASH_WINDOW = int(os.getenv("FLASH_WINDOW", "8"))              # frames in flight
+FLASH_ACK_TIMEOUT = float(os.getenv("FLASH_ACK_TIMEOUT", "1.0"))  # seconds per frame
+FLASH_MAX_RETRIES = int(os.getenv("FLASH_MAX_RETRIES", "5"))    # per frame
+FLASH_POLL_INTERVAL = 0.01
+FLASH_REPORT_INTERVAL = 0.5
+
+_ZERO_PAD = memoryview(bytes(PAYLOAD_SIZE))
+
+
+class FirmwareTransferError(Exception):
+    """Image transfer failure. str(exc) is the UI message incl. error code."""
+
+
+def build_frame(seq: int, payload, encrypt: bool = False, out: bytearray | None = None) -> bytearray:
+    """
+    Build one 512-byte data frame for `payload` (at most PAYLOAD_SIZE bytes).
+    With encrypt=True the finished frame is AES-encrypted like the DU's own
+    encrypted handshake frames. The frame is built (and encrypted) in place in
+    `out` when given, a 512-byte buffer that may hold an earlier frame, so a
+    transfer can recycle the buffers of acknowledged frames; returns the frame.
+    """
+    if len(payload) > PAYLOAD_SIZE:
+        raise ValueError(f"build_frame: payload larger than {PAYLOAD_SIZE} bytes")
+    frame = bytearray(FRAME_SIZE) if out is None else out
+    if len(frame) != FRAME_SIZE:
+        raise ValueError(f"build_frame: out must be {FRAME_SIZE} bytes")
+    end = HEADER_SIZE + len(payload)
+    frame[0] = SOP_BYTE
+    frame[1:3] = (seq % SEQ_MODULO).to_bytes(2, "big")
+    frame[3:5] = len(payload).to_bytes(2, "big")
+    frame[HEADER_SIZE:end] = payload
+    if out is not None:
+        frame[end:EOP_OFFSET] = _ZERO_PAD[:EOP_OFFSET - end]  # padding left over from the last frame
+    frame[EOP_OFFSET] = EOP_BYTE
+    crc = calculate_crc16(memoryview(frame)[:FRAME_CRC_OFFSET])
+    frame[FRAME_CRC_OFFSET] = crc & 0xFF
+    frame[FRAME_CRC_OFFSET + 1] = crc >> 8
+
+    if encrypt:
+        encrypt_into(frame, frame)
+    return frame
+
+
+def reply_check(reply) -> int:
+    """Check byte of a reply: XOR of kind and both sequence bytes, inverted."""
+    return (reply[0] ^ reply[1] ^ reply[2]) ^ 0xFF
+
+
+def build_reply(kind: int, seq: int) -> bytes:
+    """One DU reply (the DU side of the protocol; used by test emulators)."""
+    reply = bytes([kind]) + (seq % SEQ_MODULO).to_bytes(2, "big")
+    return reply + bytes([reply_check(reply)])
+
+
+class ReplyReader:
+    """
+    Collects ACK/NAK replies from serial input. A reply only counts when its
+    check byte matches; otherwise the reader drops one byte and resyncs, so
+    a stray 0x06/0x15 in line noise is never taken for an ACK/NAK.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Returns a list of (kind, seq) with kind ACK_BYTE or NAK_BYTE."""
+        self._buf += data
+        replies = []
+        while len(self._buf) >= REPLY_SIZE:
+            kind = self._buf[0]
+            if kind not in (ACK_BYTE, NAK_BYTE) or self._buf[3] != reply_check(self._buf):
+                del self._buf[0]
+                continue
+            replies.append((kind, int.from_bytes(self._buf[1:3], "big")))
+            del self._buf[:REPLY_SIZE]
+        return replies
+
+
+def transfer_image(
+    ser,
+    image,
+    size: int,
+    callback_message: Callable[[str], None],
+    encrypt: bool = False,
+    window: int = FLASH_WINDOW,
+    ack_timeout: float = FLASH_ACK_TIMEOUT,
+    max_retries: int = FLASH_MAX_RETRIES,
+    cancel_token: CancelToken | None = None,
+) -> dict:
+    """
+    Send a verified plaintext image to the DU over an open serial port.
+
+    image: readable binary file (read from offset 0), size: its length in bytes.
+    The image is split into PAYLOAD_SIZE frames and sent with a sliding window
+    of `window` unacknowledged frames. Each frame is retransmitted on its own
+    when the DU NAKs it or no ACK arrives within ack_timeout (selective repeat),
+    up to max_retries times. A final zero-length frame marks the end of image.
+
+    Progress and throughput are reported through callback_message.
+    Returns stats: frames, bytes, retransmits, seconds, bytes_per_sec.
+    Raises FirmwareTransferError, or TaskCancelled once cancel_token is
+    cancelled (checked every poll, so within FLASH_POLL_INTERVAL).
+    """
+    cancel_token = cancel_token or CancelToken()
+    frame_count = -(-size // PAYLOAD_SIZE) + 1  # data frames + end-of-image frame
+    window = max(1, min(window, SEQ_MODULO // 2))
+    reader = ReplyReader()
+
+    outstanding = {}  # index -> (frame bytes, sent_at, retries)
+    spare = []        # buffers of acknowledged frames, reused by load()
+    acked = bytearray(frame_count)
+    base = 0           # oldest unacknowledged frame
+    next_index = 0     # next frame never sent
+    retransmits = 0
+    started = time.monotonic()
+    last_report = started
+
+    def load(index: int) -> bytearray:
+        if index == frame_count - 1:
+            payload = b""
+        else:
+            image.seek(index * PAYLOAD_SIZE)
+            payload = image.read(PAYLOAD_SIZE)
+        return build_frame(index, payload, encrypt, spare.pop() if spare else None)
+
+    def send(index: int, frame, retries: int) -> None:
+        ser.write(frame)
+        outstanding[index] = (frame, time.monotonic(), retries)
+
+    def resend(index: int, reason: str) -> None:
+        nonlocal retransmits
+        frame, _, retries = outstanding[index]
+        if retries >= max_retries:
+            raise FirmwareTransferError(
+                f"E61 - Flash failed: frame {index + 1}/{frame_count} {reason} after {retries} retries"
+            )
+        retransmits += 1
+        send(index, frame, retries + 1)
+
+    old_timeout = ser.timeout
+    ser.timeout = FLASH_POLL_INTERVAL
+    callback_message(f"Flashing {size} bytes in {frame_count} frames...")
+    try:
+        image.seek(0)
+        while base < frame_count:
+            cancel_token.raise_if_cancelled()
+            # fill the window
+            while next_index < frame_count and next_index < base + window:
+                send(next_index, load(next_index), 0)
+                next_index += 1
+            ser.flush()
+
+            # replies
+            data = ser.read(max(ser.in_waiting, 1))
+            for kind, seq in reader.feed(data) if data else ():
+                # map the 16-bit sequence back into the window
+                index = base + ((seq - base) % SEQ_MODULO)
+                if index not in outstanding:
+                    continue  # duplicate / stale reply
+                if kind == ACK_BYTE:
+                    spare.append(outstanding.pop(index)[0])
+                    acked[index] = 1
+                else:
+                    resend(index, "rejected")
+
+            # per-frame timeouts
+            now = time.monotonic()
+            for index in [i for i, (_, sent_at, _) in outstanding.items() if now - sent_at > ack_timeout]:
+                resend(index, "not acknowledged")
+
+            while base < frame_count and acked[base]:
+                base += 1
+
+            if now - last_report >= FLASH_REPORT_INTERVAL:
+                last_report = now
+                done = min(base * PAYLOAD_SIZE, size)
+                rate = done / max(now - started, 1e-6)
+                callback_message(
+                    f"Flashing {done * 100 // max(size, 1)}% ({done}/{size} bytes, {rate / 1024:.1f} KiB/s)"
+                )
+    except (FirmwareTransferError, TaskCancelled):
+        raise
+    except Exception as e:
+        raise FirmwareTransferError(f"E14 - Serial Port Error during flash: {e}") from e
+    finally:
+        ser.timeout = old_timeout
+
+    seconds = max(time.monotonic() - started, 1e-6)
+    stats = {
+        "frames": frame_count,
+        "bytes": size,
+        "retransmits": retransmits,
+        "seconds": seconds,
+        "bytes_per_sec": size / seconds,
+    }
+    callback_message(
+        f"Flashed {size} bytes in {seconds:.1f}s ({stats['bytes_per_sec'] / 1024:.1f} KiB/s, "
+        f"{retransmits} retransmits)"
+    )
+    return stats
@@ -1,6 +1,16 @@
 import subprocess
 import os
 import platform
+import threading
+import time
+
+try:
+    import gpiod  # libgpiod Python bindings (v1 or v2)
+except ImportError:
+    gpiod = None
+
+from dotenv import load_dotenv
+load_dotenv()
 
 IS_WINDOWS = platform.system() == "Windows"
 
@@ -11,6 +21,10 @@ DISPLAY_ON_PIN = 27
 # DISPLAY_ON_PIN = int(os.getenv("DISPLAY_ON_PIN", "19"))    # example default
 
 GPIOCHIP = "gpiochip4"  # same as your Node code
+GPIO_CONSUMER = "python_bootloader"
+
+# auto | libgpiod | subprocess | mock
+GPIO_BACKEND = os.getenv("GPIO_BACKEND", "auto")
 
 
 def run_cmd(cmd):
@@ -26,25 +40,169 @@ def run_cmd(cmd):
         print("GPIO Command Error:", e)
 
 
-def turn_BL_Detect_High():
-    run_cmd(f"gpioset {GPIOCHIP} {BL_DETECT_Pin}=1")
+# ---------------------------
+# Backends: set(pin, value) / close()
+# ---------------------------
+class SubprocessBackend:
+    """Runs gpioset per toggle (forks a shell each time; original behaviour)."""
+
+    name = "subprocess"
+
+    def __init__(self, chip: str = GPIOCHIP):
+        self.chip = chip
+
+    def set(self, pin: int, value: int) -> None:
+        run_cmd(f"gpioset {self.chip} {pin}={value}")
+
+    def close(self) -> None:
+        pass
+
+
+class LibgpiodBackend:
+    """
+    Requests each output line once through libgpiod and keeps it open, so a
+    toggle is a single ioctl instead of a gpioset process. A line is requested
+    on first use with the wanted level as its initial value (no glitch).
+    Works with both the v1 (Chip.get_line) and v2 (request_lines) bindings.
+    The chip is opened up front with either, so a missing or inaccessible
+    chip raises here and create_backend("auto") falls back to gpioset.
+    """
+
+    name = "libgpiod"
+
+    def __init__(self, chip: str = GPIOCHIP):
+        if gpiod is None:
+            raise RuntimeError("libgpiod Python bindings (gpiod) not installed")
+        self.chip_path = chip if chip.startswith("/") else f"/dev/{chip}"
+        self._v2 = hasattr(gpiod, "request_lines")
+        self._chip = gpiod.Chip(self.chip_path)
+        self._lines = {}  # pin -> v1 line / v2 request
+        self._lock = threading.Lock()
+
+    def _request(self, pin: int, value: int):
+        if self._v2:
+            from gpiod.line import Direction, Value
+            return self._chip.request_lines(
+                consumer=GPIO_CONSUMER,
+                config={pin: gpiod.LineSettings(
+                    direction=Direction.OUTPUT,
+                    output_value=Value.ACTIVE if value else Value.INACTIVE,
+                )},
+            )
+        line = self._chip.get_line(pin)
+        line.request(consumer=GPIO_CONSUMER, type=gpiod.LINE_REQ_DIR_OUT, default_vals=[value])
+        return line
+
+    def set(self, pin: int, value: int) -> None:
+        with self._lock:
+            line = self._lines.get(pin)
+            if line is None:
+                self._lines[pin] = self._request(pin, value)
+                return
+            if self._v2:
+                from gpiod.line import Value
+                line.set_value(pin, Value.ACTIVE if value else Value.INACTIVE)
+            else:
+                line.set_value(value)
+
+    def close(self) -> None:
+        with self._lock:
+            for line in self._lines.values():
+                try:
+                    line.release()
+                except Exception:
+                    pass
+            self._lines.clear()
+            if self._chip is not None:
+                self._chip.close()
+                self._chip = None
+
+
+class MockBackend:
+    """No hardware. Records every toggle as (time.monotonic(), pin, value) in `toggles`."""
+
+    name = "mock"
+
+    def __init__(self):
+        self.toggles = []
+        self.levels = {}
+
+    def set(self, pin: int, value: int) -> None:
+        self.toggles.append((time.monotonic(), pin, value))
+        self.levels[pin] = value
+
+    def close(self) -> None:
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = GPIO_BACKEND):
+    """Backend by name; "auto" = mock on Windows, else libgpiod if it opens, else subprocess."""
+    if name == "mock" or (name == "auto" and IS_WINDOWS):
+        return MockBackend()
+    if name == "subprocess":
+        return SubprocessBackend()
+    if name == "libgpiod":
+        return LibgpiodBackend()
+    if name != "auto":
+        raise ValueError(f"Unknown GPIO_BACKEND: {name}")
+    try:
+        return LibgpiodBackend()
+    except Exception as e:
+        print("GPIO: libgpiod unavailable, using gpioset:", e)
+        return SubprocessBackend()
+
+
+def get_backend():
+    """Process-wide GPIO backend (created on first use)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend) -> None:
+    """Replace the process-wide backend (e.g. MockBackend() in tests); the old one is closed."""
+    global _backend
+    with _backend_lock:
+        old, _backend = _backend, backend
+    if old is not None and old is not backend:
+        old.close()
+
+
+def set_pin(pin: int, value: int) -> None:
+    try:
+        get_backend().set(pin, 1 if value else 0)
+    except Exception as e:
+        print("GPIO Error:", e)
+
+
+def turn_BL_Detect_High(pin=BL_DETECT_Pin):
+    set_pin(pin, 1)
     if not IS_WINDOWS:
-      print(f"GPIO {BL_DETECT_Pin} HIGH")
+      print(f"GPIO {pin} HIGH")
 
 
-def turn_BL_Detect_Low():
-    run_cmd(f"gpioset {GPIOCHIP} {BL_DETECT_Pin}=0")
+def turn_BL_Detect_Low(pin=BL_DETECT_Pin):
+    set_pin(pin, 0)
     if not IS_WINDOWS:
-        print(f"GPIO {BL_DETECT_Pin} LOW")
+        print(f"GPIO {pin} LOW")
 
 
 def turn_display_On():
-    run_cmd(f"gpioset {GPIOCHIP} {DISPLAY_ON_PIN}=1")
+    set_pin(DISPLAY_ON_PIN, 1)
     print("DISPLAY ON")
 
 
 def turn_display_Off():
-    run_cmd(f"gpioset {GPIOCHIP} {DISPLAY_ON_PIN}=0")
+    set_pin(DISPLAY_ON_PIN, 0)
     print("DISPLAY OFF")
 
 
+def close_gpio() -> None:
+    """Release any held GPIO lines (call on exit)."""
+    set_backend(None)
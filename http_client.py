@@ -0,0 +1,109 @@
+# http_client.py
+"""
+One shared HTTP session for every call to the backend (login, DU_Update,
+firmware download).
+
+- keep-alive connection pool, so repeated calls reuse the TCP/TLS connection
+- idempotent requests (GET/HEAD/PUT/DELETE/OPTIONS) are retried with
+  exponential backoff on connection errors and 502/503/504; POST is not
+- one timeout policy: (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT) unless the
+  caller passes its own
+- warm_up() resolves DNS and opens a TLS connection in the background as soon
+  as the network is up, so the first real request skips the handshake
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+HTTP_PROBE_TIMEOUT = float(os.getenv("HTTP_PROBE_TIMEOUT", "5"))  # HEAD probes / warm-up
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))  # 0.5, 1, 2 s ...
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))  # connections kept per host
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRY_STATUSES = (502, 503, 504)
+
+
+class PooledSession(requests.Session):
+    """requests.Session that applies HTTP_TIMEOUT when the caller gives none."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES) -> PooledSession:
+    """A new pooled session with the retry/timeout policy (most callers want get_http())."""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = PooledSession()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http() -> PooledSession:
+    """Process-wide pooled session (created on first use). Safe to share between threads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def close_http() -> None:
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def warm_up(url: str | None = None) -> threading.Thread | None:
+    """
+    Pre-connect to the backend in a background thread: DNS lookup, TCP and TLS
+    handshake via a HEAD on the server root, leaving the connection in the
+    pool. Errors are ignored (the real request reports them). Defaults to
+    SERVER_URL; returns the thread, or None when there is nothing to warm up.
+    """
+    url = url or os.getenv("SERVER_URL")
+    if not url:
+        return None
+    parts = urlsplit(url)
+    root = f"{parts.scheme}://{parts.netloc}/"
+
+    def _warm():
+        try:
+            get_http().head(root, timeout=HTTP_PROBE_TIMEOUT, allow_redirects=False)
+            print("HTTP warm-up done:", parts.netloc)
+        except requests.exceptions.RequestException as e:
+            print("HTTP warm-up failed:", e)
+
+    thread = threading.Thread(target=_warm, name="http-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -3,15 +3,17 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from wifi_utils import scan_wifi, connect_wifi, check_internet, get_connected_ssid
 from t9_keypad import T9Keypad
+from t9_predict import SOURCES, get_dictionary
 from tkinter import messagebox
-from ui_utils import LayoutManager
+from ui_utils import AnimationScheduler, LayoutManager, UiEventBus
+from task_runner import TaskRunner
 import os
 
 from gpio_control import (
-    turn_BL_Detect_High,
     turn_BL_Detect_Low,
     turn_display_On,
-    turn_display_Off
+    turn_display_Off,
+    close_gpio
 )
 
 from dotenv import load_dotenv
@@ -19,11 +21,50 @@ load_dotenv()
 
 
 import threading 
-from du_reader import read_du_from_serial
-from bootloader_download import download_and_flash
-
+import sys
 import time
 
+# du_reader / bootloader_download / http_client pull in requests, pyserial,
+# pycryptodome and boto3; they are imported where first used so the window
+# comes up quickly.
+
+# background task timeouts (seconds); a timed-out task is cancelled like a Cancel press
+WIFI_TASK_TIMEOUT = float(os.getenv("WIFI_TASK_TIMEOUT", "60"))
+LOGIN_TASK_TIMEOUT = float(os.getenv("LOGIN_TASK_TIMEOUT", "60"))
+HANDSHAKE_TASK_TIMEOUT = float(os.getenv("HANDSHAKE_TASK_TIMEOUT", "60"))
+FLASH_TASK_TIMEOUT = float(os.getenv("FLASH_TASK_TIMEOUT", "900"))
+
+
+def warm_up_backend():
+    """Pre-connect to the server in the background (requests is imported off the UI thread)."""
+    def run():
+        from http_client import warm_up
+        warm_up()
+    threading.Thread(target=run, daemon=True).start()
+
+
+class PageRegistry(dict):
+    """
+    App.frames: each page is built the first time it is looked up
+    (show_frame or frames[Page]), not all at startup. New pages start
+    lowered so they do not cover the current one until shown.
+    build_times records the construction time per page (seconds).
+    """
+
+    def __init__(self, controller):
+        super().__init__()
+        self.controller = controller
+        self.build_times = {}
+
+    def __missing__(self, page):
+        start = time.perf_counter()
+        frame = page(parent=self.controller.container, controller=self.controller)
+        frame.place(relwidth=1, relheight=1)
+        frame.lower()
+        self[page] = frame
+        self.build_times[page.__name__] = time.perf_counter() - start
+        return frame
+
 
 # ------------ MAIN APP ------------
 class App(ttk.Window):
@@ -53,22 +94,54 @@ class App(ttk.Window):
         self.container = ttk.Frame(self)
         self.container.pack(fill="both", expand=True)
 
-        self.frames = {}
-        for Page in (ScanPage, WifiListPage, WifiPasswordPage, WifiConnectingPage, LoginPage, ProgramPage):
-            frame = Page(parent=self.container, controller=self)
-            frame.place(relwidth=1, relheight=1)
-            self.frames[Page] = frame
+        self.frames = PageRegistry(self)
+
+        # worker threads reach Tk only through this queue (see UiEventBus)
+        self.bus = UiEventBus(self)
+        self.bus.start()
+
+        # every background job (scan, connect, login, handshake, flash) runs here;
+        # submitting a job again cancels the previous run of the same name
+        self.tasks = TaskRunner()
+        # load the predictive T9 word list off the Tk thread before the first keypad opens
+        self.tasks.submit("t9_dictionary", lambda cancel_token: get_dictionary())
 
-        # ---- Auto-detect WiFi ----
-        ssid = get_connected_ssid()
+        # dots / spinners: one timer, running only while a visible page animates
+        self.animations = AnimationScheduler(self)
+        self.current_frame = None
+
+        # shown until the Wi-Fi check below has picked the first page
+        self.splash = ttk.Label(self.container, text="Starting...", font=self.lm.font(20))
+        self.splash.place(relx=0.5, rely=0.5, anchor="center")
+
+        # ---- Auto-detect WiFi after the first paint ----
+        self.after_idle(self.detect_wifi)
+
+    def detect_wifi(self):
+        def run(cancel_token):
+            ssid = get_connected_ssid()
+            if not cancel_token.is_set():
+                self.bus.call(self.on_wifi_detected, ssid)
+        self.tasks.submit("detect_wifi", run, timeout=WIFI_TASK_TIMEOUT)
+
+    def on_wifi_detected(self, ssid):
+        self.splash.destroy()
         if ssid:
+            warm_up_backend()
             self.frames[LoginPage].show_change_wifi_button()
             self.show_frame(LoginPage)
         else:
             self.show_frame(ScanPage)
 
     def show_frame(self, page):
-        self.frames[page].tkraise()
+        """Raise page; the page being covered gets on_hide(), the new one on_show() (both optional)."""
+        frame = self.frames[page]
+        previous, self.current_frame = self.current_frame, frame
+        if previous is not None and previous is not frame and hasattr(previous, "on_hide"):
+            previous.on_hide()
+        frame.tkraise()
+        if hasattr(frame, "on_show"):
+            frame.on_show()
 
 
 # ------------ PAGE 1: Scan WiFi ------------
@@ -89,12 +162,19 @@ class ScanPage(ttk.Frame):
 
     def start_scan(self):
         self.controller.show_frame(WifiConnectingPage)
-        self.controller.frames[WifiConnectingPage].set_text("Scanning WiFi...")
-        threading.Thread(target=self.process_scan).start()
+        self.controller.frames[WifiConnectingPage].set_text("Scanning WiFi...", mode="scan")
+        self.controller.tasks.submit("scan", self.process_scan, timeout=WIFI_TASK_TIMEOUT)
 
-    def process_scan(self):
+    def process_scan(self, cancel_token):
         ssids = scan_wifi()
-        time.sleep(1)
+        if cancel_token.wait(1):
+            return
+        # pages are built on first use: do that on the Tk thread
+        self.controller.bus.call(self.show_list, ssids)
+
+    def show_list(self, ssids):
+        # predictive T9 suggests the networks of the latest scan
+        get_dictionary().set_ssids(ssids)
         self.controller.frames[WifiListPage].load_list(ssids)
         self.controller.show_frame(WifiListPage)
 
@@ -202,15 +282,19 @@ class WifiPasswordPage(ttk.Frame):
         self.password_entry.config(show="" if cur == "*" else "*")
 
     def open_keyboard(self, _):
-        self.close_keyboard()
-        # Pass layout manager for scaling
-        self.keyboard = T9Keypad(self, self.password_entry, self.close_keyboard, self.controller.lm)
+        # one keypad per page, built on first use and only shown / hidden afterwards
+        if self.keyboard is None:
+            # Pass layout manager for scaling
+            self.keyboard = T9Keypad(self, self.password_entry, self.close_keyboard, self.controller.lm,
+                                     predictor=get_dictionary(), password=True)
+        else:
+            self.keyboard.retarget(self.password_entry, password=True)
         self.keyboard.pack(side="bottom", fill="x")
 
     def close_keyboard(self):
-        if self.keyboard:
-            self.keyboard.destroy()
-            self.keyboard = None
+        if self.keyboard is not None:
+            self.keyboard.reset_cycle()
+            self.keyboard.pack_forget()
 
     def start_connect(self):
         pwd = self.password_entry.get()
@@ -219,47 +303,42 @@ class WifiPasswordPage(ttk.Frame):
 
         self.controller.wifi_password = pwd
         connecting_page = self.controller.frames[WifiConnectingPage]
-        connecting_page.set_text(f"Connecting to \n {self.controller.selected_ssid}...")
+        connecting_page.set_text(f"Connecting to \n {self.controller.selected_ssid}...", mode="wifi")
         self.controller.show_frame(WifiConnectingPage)
 
-        threading.Thread(target=self.process_connect).start()
+        self.controller.tasks.submit("wifi", self.process_connect, timeout=WIFI_TASK_TIMEOUT)
 
-    def process_connect(self):
+    def process_connect(self, cancel_token):
         connecting_page = self.controller.frames[WifiConnectingPage]
 
-        # Step 1: try to connect
-        ok = connect_wifi(self.controller.selected_ssid, self.controller.wifi_password)
-        time.sleep(1)
+        # Step 1: try to connect (Cancel kills nmcli / netsh)
+        ok = connect_wifi(self.controller.selected_ssid, self.controller.wifi_password, cancel_token)
 
         # Check if user cancelled during connect
-        if connecting_page.is_cancelled:
+        if cancel_token.wait(1):
             return
 
         if not ok:
-            self.controller.after(0, lambda: messagebox.showerror(
-                "Wrong Password", "Incorrect password. Try again."
-            ))
-            self.controller.after(0, lambda: self.controller.show_frame(ScanPage))
+            self.controller.bus.call(messagebox.showerror, "Wrong Password", "Incorrect password. Try again.")
+            self.controller.bus.call(self.controller.show_frame, ScanPage)
             return
 
         # Step 2: check internet
-        connecting_page.set_text("Checking Internet...")
-        time.sleep(1)
+        connecting_page.set_text("Checking Internet...", mode="wifi")
 
         # Check if user cancelled during checking
-        if connecting_page.is_cancelled:
+        if cancel_token.wait(1):
             return
 
         if not check_internet():
-            self.controller.after(0, lambda: messagebox.showerror(
-                "No Internet",
-                "Connected to WiFi but no internet. Try another network."
-            ))
-            self.controller.after(0, lambda: self.controller.show_frame(ScanPage))
+            self.controller.bus.call(messagebox.showerror, "No Internet",
+                                     "Connected to WiFi but no internet. Try another network.")
+            self.controller.bus.call(self.controller.show_frame, ScanPage)
             return
 
-        # Success
-        self.controller.after(0, lambda: self.controller.show_frame(LoginPage))
+        # Success: open the backend connection while the user types the login
+        warm_up_backend()
+        self.controller.bus.call(self.controller.show_frame, LoginPage)
 
 # ------------ PAGE 4: Connecting ------------
 class WifiConnectingPage(ttk.Frame):
@@ -267,7 +346,7 @@ class WifiConnectingPage(ttk.Frame):
         super().__init__(parent)
         self.controller = controller
         lm = self.controller.lm
-        self.mode = "wifi"   # can be "wifi" or "login"
+        self.mode = "wifi"   # "scan", "wifi" or "login": the task Cancel stops
         self.text = ""
         self.dots = 0
         self.is_cancelled = False
@@ -285,30 +364,36 @@ class WifiConnectingPage(ttk.Frame):
             command=self.cancel_connection
         ).pack(pady=lm.scaled(40))
 
-        # Start animation loop
-        self.animate()
+    # Dots run only while this page is on screen
+    def on_show(self):
+        self.controller.animations.start("connecting", self.animate, 500)
+
+    def on_hide(self):
+        self.controller.animations.stop("connecting")
 
     # Update main message
-    def set_text(self, text):
+    def set_text(self, text, mode=None):
         self.text = text
+        if mode is not None:
+            self.mode = mode
         self.is_cancelled = False  # reset cancel flag
 
     # When cancel button pressed
     def cancel_connection(self):
         self.is_cancelled = True
+        self.controller.tasks.cancel(self.mode)
 
-        if self.mode == "wifi":
-            self.controller.show_frame(ScanPage)
-        else:
+        if self.mode == "login":
             self.controller.show_frame(LoginPage)
+        else:
+            self.controller.show_frame(ScanPage)
 
 
-    # Dot animation loop
-    def animate(self):
+    # Dot animation frame (called by controller.animations)
+    def animate(self, frame):
         if self.text and not self.is_cancelled:
             self.label.config(text=self.text + "." * (self.dots % 4))
             self.dots += 1
-        self.after(500, self.animate)
 
 
 # ------------ PAGE 5: Login Page ------------
@@ -329,65 +414,131 @@ class ProgramPage(ttk.Frame):
             command=self.start_program_logic
         ).pack(pady=lm.scaled(100))
 
+        self.status_label = ttk.Label(self, text="", font=lm.font(12), wraplength=lm.scaled(400))
+        self.status_label.pack(pady=lm.scaled(10))
+        # progress messages arrive in bursts; the bus shows the newest once per frame
+        controller.bus.on_status("program", lambda text: self.status_label.config(text=text))
+
+        # spinner while a handshake / flash task runs and this page is shown
+        self.busy_label = ttk.Label(self, text="", font=lm.font(20))
+        self.busy_label.pack()
+        self.busy_task = None
+
+    def on_show(self):
+        if self.busy_task is not None:
+            self.controller.animations.start("program-busy", self.spin, 125)
+
+    def on_hide(self):
+        self.controller.animations.stop("program-busy")
+
+    def spin(self, frame):
+        self.busy_label.config(text="◐◓◑◒"[frame % 4])
+
+    def set_busy(self, task):
+        """Spin until task (a task_runner.Task) finishes."""
+        self.busy_task = task
+        task.future.add_done_callback(lambda _f: self.controller.bus.call(self.clear_busy, task))
+        if self.controller.current_frame is self:
+            self.controller.animations.start("program-busy", self.spin, 125)
+
+    def clear_busy(self, task):
+        if self.busy_task is task:
+            self.busy_task = None
+            self.controller.animations.stop("program-busy")
+            self.busy_label.config(text="")
+
     def start_program_logic(self):
-        print("Turning pins HIGH, LED ON, Display ON")
-        turn_BL_Detect_High()
+        from du_reader import read_du_from_serial
+
+        serial_port = os.getenv("SERIAL_PORT", "/dev/ttyAMA0")  # UART Port
+
+        # pressing PROGRAM again cancels a handshake still waiting for the DU;
+        # nothing here may touch the serial session, the old run holds it
+        # until the cancel reaches it. The worker drives BL_DETECT high.
+        self.controller.tasks.cancel("handshake", "replaced")
+
+        print("Display ON")
         turn_display_On()
 
-        from du_reader import read_du_from_serial
+        bus = self.controller.bus
 
         def ui_message(msg):
             print("STATUS:", msg)
+            bus.status("program", msg)
 
         def ui_success(data):
             print("SUCCESS — DU List:", data)
-            messagebox.showinfo("DU Loaded", "DU Data Received")
             # Save DU response for next page (file list)
             self.controller.du_options = data["options"]
+            self.controller.du_number = data["duNumber"]
             self.controller.is_encryption_enable = data["isEncryptionEnable"]
+            # start fetching the likely pick while the technician chooses
+            from firmware_prefetch import get_prefetcher
+            get_prefetcher().start(self.controller.token, data["duNumber"], data["options"])
+            bus.call(self.show_du_loaded, data)
             # TODO: Navigate to File Selection Page
 
         def ui_error(msg):
             print("ERROR:", msg)
-            messagebox.showerror("Error", msg)
-
-        threading.Thread(
-            target=read_du_from_serial,
-            args=(
-                self.controller.token,  # auth token
-                ui_message,
-                ui_success,
-                ui_error,
-                os.getenv("SERIAL_PORT", "/dev/ttyAMA0"),   # UART Port
-                115200
-            ),
-            daemon=True
-        ).start()
+            bus.call(messagebox.showerror, "Error", msg)
+
+        task = self.controller.tasks.submit(
+            "handshake",
+            read_du_from_serial,
+            self.controller.token,  # auth token
+            ui_message,
+            ui_success,
+            ui_error,
+            serial_port,
+            115200,
+            timeout=HANDSHAKE_TASK_TIMEOUT,
+        )
+        self.set_busy(task)
+
+    def show_du_loaded(self, data):
+        if data.get("isStale"):
+            fetched = time.strftime("%H:%M", time.localtime(data["fetchedAt"]))
+            messagebox.showwarning("DU Loaded (offline)",
+                                   f"Server unreachable.\nShowing DU data saved at {fetched}; it may be out of date.")
+        else:
+            messagebox.showinfo("DU Loaded", "DU Data Received")
 
     # inside ProgramPage class - on file selected & Download button pressed
     def on_download_and_flash(self, selected_file_id):
+        from bootloader_download import download_and_flash
+        from firmware_prefetch import get_prefetcher
+
         token = self.controller.token
         device_id = os.getenv("DEVICE_ID", "UNKNOWN")
         is_encryption = self.controller.is_encryption_enable if hasattr(self.controller, "is_encryption_enable") else False
 
+        bus = self.controller.bus
+
         def ui_msg(s): 
             print("STATUS:", s)
-            # update a label in GUI via after if needed
-            self.controller.after(0, lambda: self.status_label.config(text=s))
+            bus.status("program", s)
 
         def ui_success(data):
             print("SUCCESS:", data)
-            self.controller.after(0, lambda: messagebox.showinfo("Success", "Flashed successfully"))
+            get_prefetcher().record_flash(getattr(self.controller, "du_number", None), selected_file_id)
+            bus.call(messagebox.showinfo, "Success", "Flashed successfully")
 
         def ui_error(err):
             print("ERROR:", err)
-            self.controller.after(0, lambda: messagebox.showerror("Error", err))
+            bus.call(messagebox.showerror, "Error", err)
+
+        def run(cancel_token):
+            # drop the other prefetches; if this file is prefetching, finish it and flash from the cache
+            ui_msg("Preparing firmware...")
+            prefetcher = get_prefetcher()
+            with cancel_token.on_cancel(prefetcher.cancel):
+                prefetcher.select(selected_file_id)
+            if cancel_token.is_set():
+                return
+            download_and_flash(selected_file_id, token, device_id, is_encryption, ui_msg, ui_success, ui_error,
+                               cancel_token=cancel_token)
 
-        threading.Thread(
-            target=download_and_flash,
-            args=(selected_file_id, token, device_id, is_encryption, ui_msg, ui_success, ui_error),
-            daemon=True
-        ).start()
+        self.set_busy(self.controller.tasks.submit("flash", run, timeout=FLASH_TASK_TIMEOUT))
 
 
 
@@ -464,7 +615,7 @@ class LoginPage(ttk.Frame):
         # will be shown later using show_change_wifi_button()
 
     def start_login(self):
-        phone = self.phone.get().strip()
+        phone = typed_phone = self.phone.get().strip()
         if not phone.startswith("+"):
             phone = "+91" + phone
 
@@ -476,29 +627,34 @@ class LoginPage(ttk.Frame):
 
         # Start connecting page animation
         connecting_page = self.controller.frames[WifiConnectingPage]
-        connecting_page.set_text("Signing In...")
+        connecting_page.set_text("Signing In...", mode="login")
         self.controller.show_frame(WifiConnectingPage)
 
-        threading.Thread(target=self.process_login, args=(phone, password)).start()
+        self.controller.tasks.submit("login", self.process_login, phone, password, typed_phone,
+                                     timeout=LOGIN_TASK_TIMEOUT)
 
 
-    def process_login(self, phone, password):
+    def process_login(self, phone, password, typed_phone, cancel_token):
         from auth_api import login_api
         ok, token = login_api(phone, password)
 
+        # Cancel pressed while the request was in flight: drop the result
+        if cancel_token.is_set():
+            return
+
         if not ok:
-            self.controller.after(0, lambda: messagebox.showerror(
-                "Login Failed",
-                "Incorrect phone or password."
-            ))
-            self.controller.after(0, lambda: self.controller.show_frame(LoginPage))
+            self.controller.bus.call(messagebox.showerror, "Login Failed", "Incorrect phone or password.")
+            self.controller.bus.call(self.controller.show_frame, LoginPage)
             return
 
         # Save token globally on controller
         self.controller.token = token
 
+        # offered by predictive T9 next time, as typed
+        get_dictionary().record_login(typed_phone)
+
         # Move to program page
-        self.controller.after(0, lambda: self.controller.show_frame(ProgramPage))
+        self.controller.bus.call(self.controller.show_frame, ProgramPage)
 
 
     def show_change_wifi_button(self):
@@ -510,20 +666,34 @@ class LoginPage(ttk.Frame):
         cur = self.password.cget("show")
         self.password.config(show="" if cur == "*" else "*")
 
-    # Open keyboard
+    # Open keyboard (one keypad for both fields, moved to the focused Entry)
     def open_keyboard(self, entry):
-        self.close_keyboard()
-        self.keyboard = T9Keypad(self, entry, self.close_keyboard, self.controller.lm)
+        # the phone field only offers numbers that logged in before
+        sources = ("phones",) if entry is self.phone else SOURCES
+        if self.keyboard is None:
+            self.keyboard = T9Keypad(self, entry, self.close_keyboard, self.controller.lm,
+                                     predictor=get_dictionary(), password=entry is self.password,
+                                     sources=sources)
+        else:
+            self.keyboard.retarget(entry, password=entry is self.password, sources=sources)
         self.keyboard.pack(side="bottom", fill="x")
 
     # Close keyboard
     def close_keyboard(self):
-        if self.keyboard:
-            self.keyboard.destroy()
-            self.keyboard = None
+        if self.keyboard is not None:
+            self.keyboard.reset_cycle()
+            self.keyboard.pack_forget()
 
 
 # ------------ RUN ------------
 if __name__ == "__main__":
     app = App()
     app.mainloop()
+    # cancelled jobs release the serial port / HTTP response they were blocked on
+    app.tasks.shutdown()
+    close_gpio()
+    # only modules that were actually loaded have anything to close
+    if "serial_session" in sys.modules:
+        sys.modules["serial_session"].close_all_sessions()
+    if "http_client" in sys.modules:
+        sys.modules["http_client"].close_http()
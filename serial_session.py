@@ -0,0 +1,221 @@
+# serial_session.py
+import os
+import time
+import platform
+import threading
+from contextlib import contextmanager
+
+import serial
+
+from gpio_control import BL_DETECT_Pin, turn_BL_Detect_High, turn_BL_Detect_Low
+
+from dotenv import load_dotenv
+load_dotenv()
+
+IS_WINDOWS = platform.system() == "Windows"
+
+# Configurable defaults (one port for both handshake and flash)
+DEFAULT_SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/ttyAMA0")
+DEFAULT_BAUDRATE = int(os.getenv("SERIAL_BAUD", os.getenv("BAUDRATE", "115200")))
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 0.2  # seconds, doubled per attempt (USB-serial re-enumeration)
+
+# per-port overrides, see configure_port()
+PORT_SETTINGS = {}
+PORT_BL_DETECT_PINS = {}
+
+
+class SerialSession:
+    """
+    Owns one serial port across the handshake and flash phases.
+
+    The port is opened once (exclusively on POSIX) and stays open between
+    operations; use() hands it to one caller at a time and flushes stale
+    input/output first. read()/write() reopen the port and retry once if the
+    device disappeared (USB-serial reset). The BL_DETECT line state is
+    tracked so repeated requests for the same level do not toggle the pin.
+
+    The session exposes the subset of the serial.Serial API used by
+    du_reader / bootloader_download / firmware_transfer, so it can be passed
+    wherever a port object is expected.
+    """
+
+    def __init__(self, port: str = DEFAULT_SERIAL_PORT, **settings):
+        self.port = port
+        self.bl_detect_pin = PORT_BL_DETECT_PINS.get(port, BL_DETECT_Pin)
+        self.settings = {"baudrate": DEFAULT_BAUDRATE, "timeout": 0.5}
+        self.settings.update(PORT_SETTINGS.get(port, {}))
+        self.settings.update(settings)
+        self.bl_detect_high = None  # unknown until we set it
+        self._ser = None
+        self._lock = threading.RLock()
+
+    # ---------------------------
+    # open / close / reconnect
+    # ---------------------------
+    @property
+    def is_open(self) -> bool:
+        return self._ser is not None and self._ser.is_open
+
+    def open(self):
+        with self._lock:
+            if not self.is_open:
+                kwargs = dict(self.settings)
+                if not IS_WINDOWS:
+                    kwargs["exclusive"] = True
+                self._ser = serial.Serial(self.port, **kwargs)
+            return self._ser
+
+    def close(self) -> None:
+        with self._lock:
+            if self._ser is not None:
+                try:
+                    self._ser.close()
+                except Exception:
+                    pass
+                self._ser = None
+
+    def reconnect(self):
+        """
+        Close and reopen the port, waiting for the device to come back. The
+        timeout in effect (e.g. from use(timeout=...)) carries over to the new port.
+        """
+        with self._lock:
+            timeout = self._ser.timeout if self._ser is not None else None
+            self.close()
+            delay = RECONNECT_DELAY
+            for attempt in range(RECONNECT_ATTEMPTS):
+                try:
+                    ser = self.open()
+                    if timeout is not None:
+                        ser.timeout = timeout
+                    return ser
+                except (serial.SerialException, OSError):
+                    if attempt == RECONNECT_ATTEMPTS - 1:
+                        raise
+                    time.sleep(delay)
+                    delay *= 2
+
+    @contextmanager
+    def use(self, timeout: float | None = None, flush: bool = True):
+        """
+        Exclusive use of the open port for one operation:
+
+            with session.use(timeout=5) as ser:
+                ser.write(...)
+        """
+        with self._lock:
+            self.open()
+            if flush:
+                self._ser.reset_input_buffer()
+                self._ser.reset_output_buffer()
+            old_timeout = self._ser.timeout
+            if timeout is not None:
+                self._ser.timeout = timeout
+            try:
+                yield self
+            finally:
+                if self._ser is not None:
+                    self._ser.timeout = old_timeout
+
+    # ---------------------------
+    # BL_DETECT
+    # ---------------------------
+    def set_bl_detect(self, high: bool) -> None:
+        """Drive BL_DETECT, skipping the GPIO call if it is already at that level."""
+        with self._lock:
+            if self.bl_detect_high is high:
+                return
+            if high:
+                turn_BL_Detect_High(self.bl_detect_pin)
+            else:
+                turn_BL_Detect_Low(self.bl_detect_pin)
+            self.bl_detect_high = high
+
+    # ---------------------------
+    # serial.Serial subset
+    # ---------------------------
+    def read(self, size: int = 1) -> bytes:
+        try:
+            return self.open().read(size)
+        except (serial.SerialException, OSError):
+            return self.reconnect().read(size)
+
+    def write(self, data) -> int:
+        try:
+            return self.open().write(data)
+        except (serial.SerialException, OSError):
+            return self.reconnect().write(data)
+
+    def flush(self) -> None:
+        self.open().flush()
+
+    def cancel_read(self) -> None:
+        """Make a read blocked in another thread return now (safe from any thread)."""
+        ser = self._ser
+        if ser is not None and hasattr(ser, "cancel_read"):
+            try:
+                ser.cancel_read()
+            except Exception:
+                pass
+
+    def reset_input_buffer(self) -> None:
+        self.open().reset_input_buffer()
+
+    def reset_output_buffer(self) -> None:
+        self.open().reset_output_buffer()
+
+    @property
+    def in_waiting(self) -> int:
+        return self.open().in_waiting
+
+    @property
+    def timeout(self):
+        return self.open().timeout
+
+    @timeout.setter
+    def timeout(self, value) -> None:
+        self.open().timeout = value
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def configure_port(port: str, bl_detect_pin: int | None = None, **settings) -> None:
+    """
+    Per-port serial settings (baudrate, parity, ...) used when its session
+    opens, and the BL_DETECT GPIO wired to the DU on that port.
+    """
+    PORT_SETTINGS[port] = dict(settings)
+    if bl_detect_pin is not None:
+        PORT_BL_DETECT_PINS[port] = bl_detect_pin
+    with _sessions_lock:
+        session = _sessions.get(port)
+    if session is not None:
+        session.settings.update(settings)
+        if bl_detect_pin is not None:
+            session.bl_detect_pin = bl_detect_pin
+
+
+def get_session(port: str = DEFAULT_SERIAL_PORT, **settings) -> SerialSession:
+    """The shared SerialSession for a port (created on first use)."""
+    with _sessions_lock:
+        session = _sessions.get(port)
+        if session is None:
+            session = SerialSession(port, **settings)
+            _sessions[port] = session
+        elif settings:
+            changed = any(session.settings.get(k) != v for k, v in settings.items())
+            session.settings.update(settings)
+            if changed:
+                session.close()  # waits for the current user; reopened with the new settings on next use
+        return session
+
+
+def close_all_sessions() -> None:
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
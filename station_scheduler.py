@@ -0,0 +1,281 @@
+# station_scheduler.py
+"""
+Flash several DUs at once, one station per serial port.
+
+Each station runs handshake -> DU_Update -> download -> flash on its own
+worker thread. All stations share one firmware cache and the pooled HTTP
+session from http_client; a file wanted by several stations is downloaded
+once and the other stations take it from the cache. At most
+MAX_CONCURRENT_DOWNLOADS downloads run at a time so the Wi-Fi link is not
+saturated, and stations wired to the same BL_DETECT GPIO take turns for the
+phases that drive it.
+
+    with StationScheduler(token) as scheduler:
+        scheduler.start(lambda du: du["options"][0]["value"])
+        scheduler.wait()
+
+Stations are configured with STATION_PORTS, e.g.
+"/dev/ttyUSB0:17,/dev/ttyUSB1:22" (port, optional BL_DETECT pin).
+"""
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import nullcontext
+from typing import Callable
+
+from bootloader_download import (
+    DOWNLOAD_SEGMENTS,
+    FirmwareDownloadError,
+    download_and_flash,
+    firmware_request,
+    get_verified_firmware,
+    probe_encrypted_hash,
+)
+from du_reader import read_du_from_serial
+from firmware_cache import get_firmware_cache
+from http_client import get_http
+from serial_session import DEFAULT_SERIAL_PORT, configure_port, get_session
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+STATION_PORTS = os.getenv("STATION_PORTS", DEFAULT_SERIAL_PORT)
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "1"))
+
+# station states, in order
+IDLE = "idle"
+HANDSHAKE = "handshake"
+DOWNLOAD = "download"
+FLASH = "flash"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def parse_station_ports(spec: str = STATION_PORTS) -> list:
+    """
+    "port[:bl_pin],..." -> [port, ...]. Ports with a pin get it registered
+    through serial_session.configure_port().
+    """
+    ports = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        port, sep, pin = item.rpartition(":")
+        if not sep or not pin.isdigit():
+            port, pin = item, ""
+        if pin:
+            configure_port(port, bl_detect_pin=int(pin))
+        ports.append(port)
+    return ports
+
+
+class Station:
+    """
+    One DU on one serial port, with its own status stream.
+
+    Every status line and state change is put on `events` as
+    (timestamp, kind, text) with kind "message", "state" or "error", and
+    passed to on_status(port, kind, text) if given (called from the
+    station's worker thread).
+    """
+
+    def __init__(self, port: str, on_status: Callable[[str, str, str], None] | None = None):
+        self.port = port
+        self.state = IDLE
+        self.du = None        # read_du_from_serial result
+        self.file_id = None
+        self.error = None
+        self.events = queue.SimpleQueue()
+        self._on_status = on_status
+
+    def _emit(self, kind: str, text: str) -> None:
+        self.events.put((time.time(), kind, text))
+        if self._on_status is not None:
+            try:
+                self._on_status(self.port, kind, text)
+            except Exception as e:
+                print(f"station {self.port}: status callback failed: {e}")
+
+    def message(self, text: str) -> None:
+        self._emit("message", text)
+
+    def fail(self, text: str) -> None:
+        self.error = text
+        self._emit("error", text)
+        self.set_state(FAILED)
+
+    def set_state(self, state: str) -> None:
+        self.state = state
+        self._emit("state", state)
+
+    def drain(self) -> list:
+        """All events queued since the last drain."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class StationScheduler:
+    """
+    Runs the full flash sequence on several ports concurrently.
+
+    choose_file(du) is called with each station's handshake result
+    ({duNumber, displayNumber, options, isEncryptionEnable}) and returns the
+    file_id to flash, or None to skip that station.
+    """
+
+    def __init__(self,
+                 token: str,
+                 ports: list | None = None,
+                 device_id: str | None = None,
+                 max_downloads: int = MAX_CONCURRENT_DOWNLOADS,
+                 segments: int = DOWNLOAD_SEGMENTS,
+                 cache=None,
+                 http=None,
+                 on_status: Callable[[str, str, str], None] | None = None):
+        ports = ports or parse_station_ports()
+        self.token = token
+        self.device_id = device_id or os.getenv("DEVICE_ID")
+        self.segments = segments
+        self.cache = cache or get_firmware_cache()
+        self.stations = {port: Station(port, on_status) for port in ports}
+
+        self.http = http or get_http()
+
+        self._pool = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="station")
+        self._futures = {}
+        self._download_slots = threading.BoundedSemaphore(max(1, max_downloads))
+        self._locks_lock = threading.Lock()
+        self._file_locks = {}
+        self._pin_locks = {}
+
+    # ---------------------------
+    # shared-resource locks
+    # ---------------------------
+    def _named_lock(self, table: dict, name) -> threading.Lock:
+        with self._locks_lock:
+            lock = table.get(name)
+            if lock is None:
+                lock = table[name] = threading.Lock()
+            return lock
+
+    # ---------------------------
+    # public API
+    # ---------------------------
+    def start(self, choose_file: Callable[[dict], str | None]) -> dict:
+        """Start every idle station; returns {port: Future}."""
+        for port in self.stations:
+            self.run_station(port, choose_file)
+        return dict(self._futures)
+
+    def run_station(self, port: str, choose_file: Callable[[dict], str | None]):
+        """Start one station (again); returns its Future (True when flashed)."""
+        future = self._futures.get(port)
+        if future is not None and not future.done():
+            return future
+        station = self.stations[port]
+        station.set_state(IDLE)
+        station.du = station.file_id = station.error = None
+        future = self._pool.submit(self._run, station, choose_file)
+        self._futures[port] = future
+        return future
+
+    def wait(self, timeout: float | None = None) -> dict:
+        """Wait for the started stations; returns {port: state}."""
+        wait_futures(list(self._futures.values()), timeout=timeout)
+        return {port: station.state for port, station in self.stations.items()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    # ---------------------------
+    # one station
+    # ---------------------------
+    def _run(self, station: Station, choose_file) -> bool:
+        pin_lock = self._named_lock(self._pin_locks, get_session(station.port).bl_detect_pin)
+        try:
+            station.set_state(HANDSHAKE)
+            with pin_lock:
+                du = self._handshake(station)
+            if du is None:
+                return False
+            station.du = du
+
+            file_id = choose_file(du)
+            if file_id is None:
+                station.set_state(SKIPPED)
+                return False
+            station.file_id = file_id
+
+            # with a cache, download ahead (rate-limited) and flash from the cache;
+            # without one the download happens inside download_and_flash
+            if self.cache.enabled:
+                station.set_state(DOWNLOAD)
+                if not self._prefetch(station, file_id):
+                    return False
+                download_slot = nullcontext()
+            else:
+                download_slot = self._download_slots
+
+            station.set_state(FLASH)
+            errors = []
+            with pin_lock, download_slot:
+                ok = download_and_flash(
+                    file_id, self.token, self.device_id, du["isEncryptionEnable"],
+                    station.message, lambda _result: None, errors.append,
+                    segments=self.segments, serial_port=station.port, http=self.http,
+                )
+            if not ok:
+                station.fail(errors[-1] if errors else "Flash failed")
+                return False
+            station.set_state(DONE)
+            return True
+        except Exception as e:
+            station.fail(f"Unexpected error: {e}")
+            return False
+
+    def _handshake(self, station: Station) -> dict | None:
+        result = {}
+        read_du_from_serial(
+            self.token, station.message,
+            lambda du: result.update(du=du),
+            lambda error: result.update(error=error),
+            serial_port=station.port, http=self.http,
+        )
+        if "du" not in result:
+            station.fail(result.get("error", "DU handshake failed"))
+            return None
+        return result["du"]
+
+    def _prefetch(self, station: Station, file_id: str) -> bool:
+        """Put file_id in the cache; one download per file, MAX_CONCURRENT_DOWNLOADS overall."""
+        try:
+            download_url, headers = firmware_request(self.token, file_id)
+            with self._named_lock(self._file_locks, str(file_id)):
+                encrypted_hash = probe_encrypted_hash(download_url, headers, self.http)
+                if self.cache.contains(encrypted_hash or self.cache.lookup(file_id)):
+                    station.message("Firmware already in cache")
+                    return True
+                station.message("Waiting for a download slot...")
+                with self._download_slots, tempfile.TemporaryFile(prefix="fw_", suffix=".bin") as sink:
+                    get_verified_firmware(download_url, headers, file_id, sink, station.message,
+                                          self.segments, self.cache, self.http)
+            return True
+        except FirmwareDownloadError as e:
+            station.fail(str(e))
+            return False
@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import font as tkfont
 
+from t9_predict import SOURCES, T9_MAX_SUGGESTIONS, T9_PREDICT_PASSWORDS
+
 
 class T9Keypad(tk.Frame):
     """
@@ -9,7 +11,8 @@ class T9Keypad(tk.Frame):
     Compatible with OnScreenKeyboard interface
     """
     
-    def __init__(self, parent, target_entry, close_callback, layout_manager=None):
+    def __init__(self, parent, target_entry, close_callback, layout_manager=None,
+                 predictor=None, password=False, sources=SOURCES):
         """
         Initialize T9 Keypad
         
@@ -18,6 +21,9 @@ class T9Keypad(tk.Frame):
             target_entry: Entry widget to type into
             close_callback: Function to call when keyboard should close
             layout_manager: LayoutManager instance for scaling (optional)
+            predictor: t9_predict.T9Dictionary for predictive input (optional)
+            password: target is a password field (no prediction unless T9_PREDICT_PASSWORDS)
+            sources: t9_predict.SOURCES the target takes suggestions from
         """
         super().__init__(parent, bg="#2b2b2b")
         
@@ -26,6 +32,15 @@ class T9Keypad(tk.Frame):
         self.lm = layout_manager
         self.numpad_mode = False  # Default to T9 mode
         
+        # Predictive mode: one tap per letter, the word is picked from predictor
+        self.predictor = predictor
+        self.password = password
+        self.sources = sources
+        self.predict_on = True     # user toggle on the suggestion bar
+        self.sequence = ""         # keys typed for the word being composed
+        self.compose_len = 0       # its characters at the end of the entry
+        self.suggestion_labels = []
+        
         # Define T9 key mappings
         self.cap_keys = [
             {"number": "1", "letters": ["1"], "showletters": [""]},
@@ -89,20 +104,32 @@ class T9Keypad(tk.Frame):
         
         # State management
         self.layouts = [self.cap_keys, self.lower_keys, self.symbol_keys]
+        # number -> key dict per layout, so a key press is one lookup
+        self.layout_maps = [{k["number"]: k for k in layout} for layout in self.layouts]
         self.layout_number = 0
         self.t9_keys = self.cap_keys  # Start with capital letters
+        self.key_map = self.layout_maps[0]
         self.last_key = None
         self.cycle_index = 0
         self.timeout_id = None
         self.buttons = {}
         
+        # Fonts are created once per keypad (scaled if layout manager available)
+        main_size = self.lm.scaled(20) if self.lm else 20
+        sub_size = self.lm.scaled(10) if self.lm else 10
+        self.main_font = tkfont.Font(family="Arial", size=main_size, weight="bold")
+        self.sub_font = tkfont.Font(family="Arial", size=sub_size)
+        
         # Create UI
         self.create_keyboard()
     
     def create_keyboard(self):
-        """Create the keyboard UI"""
+        """Create the keyboard UI: the 3x4 grid of keys is built once, layouts only relabel it"""
+        if self.predictor is not None:
+            self.create_suggestion_bar()
+        
         # Keyboard frame with 3-column grid
-        keyboard_frame = tk.Frame(self, bg="#2b2b2b")
+        keyboard_frame = self.keyboard_frame = tk.Frame(self, bg="#2b2b2b")
         keyboard_frame.pack(expand=True, fill="both")
         
         # Configure grid weights for responsive layout
@@ -111,36 +138,17 @@ class T9Keypad(tk.Frame):
         for i in range(4):
             keyboard_frame.rowconfigure(i, weight=1)
         
-        # Create buttons
-        self.render_buttons(keyboard_frame)
-    
-    def render_buttons(self, parent):
-        """Render keyboard buttons"""
-        # Clear existing buttons
-        for widget in parent.winfo_children():
-            widget.destroy()
-        self.buttons.clear()
-        
-        # Font settings (scaled if layout manager available)
-        main_size = self.lm.scaled(20) if self.lm else 20
-        sub_size = self.lm.scaled(10) if self.lm else 10
-        main_font = tkfont.Font(family="Arial", size=main_size, weight="bold")
-        sub_font = tkfont.Font(family="Arial", size=sub_size)
-        
-        # Create 3x4 grid of buttons
         pad_val = self.lm.scaled(5) if self.lm else 5
         
+        # Every layout lists its keys in the same grid order, so each cell keeps its key number
         for idx, key_obj in enumerate(self.t9_keys):
             row = idx // 3
             col = idx % 3
-            
             key_num = key_obj["number"]
-            main_text = key_obj["letters"][0]
-            sub_text = "".join(key_obj["showletters"])
             
             # Create button frame to hold main and sub text
             btn_frame = tk.Frame(
-                parent,
+                keyboard_frame,
                 bg="#f0f0f0",
                 relief="raised",
                 borderwidth=2,
@@ -149,41 +157,151 @@ class T9Keypad(tk.Frame):
             btn_frame.grid(row=row, column=col, padx=pad_val, pady=pad_val, sticky="nsew")
             
             # Main text label
-            main_label = tk.Label(
-                btn_frame,
-                text=main_text,
-                font=main_font,
-                bg="#f0f0f0",
-                fg="#333333"
-            )
+            main_label = tk.Label(btn_frame, text="", font=self.main_font, bg="#f0f0f0", fg="#333333")
             main_label.pack(expand=True)
             
             # Sub text label
-            sub_label = tk.Label(
-                btn_frame,
-                text=sub_text,
-                font=sub_font,
-                bg="#f0f0f0",
-                fg="#666666"
-            )
+            sub_label = tk.Label(btn_frame, text="", font=self.sub_font, bg="#f0f0f0", fg="#666666")
             sub_label.pack()
             
-            # Disable key 10 in numpad mode
-            if self.numpad_mode and key_num == "10":
-                btn_frame.config(bg="#d0d0d0", cursor="")
-                main_label.config(bg="#d0d0d0", fg="#999999")
-                sub_label.config(bg="#d0d0d0")
-            else:
-                # Bind click events to all widgets
-                btn_frame.bind("<Button-1>", lambda e, k=key_num: self.handle_key_press(k))
-                main_label.bind("<Button-1>", lambda e, k=key_num: self.handle_key_press(k))
-                sub_label.bind("<Button-1>", lambda e, k=key_num: self.handle_key_press(k))
+            # Bind click events to all widgets (disabled keys are ignored in handle_key_press)
+            for widget in (btn_frame, main_label, sub_label):
+                widget.bind("<Button-1>", lambda e, k=key_num: self.handle_key_press(k))
             
             self.buttons[key_num] = (btn_frame, main_label, sub_label)
+        
+        self.render_buttons()
+    
+    def create_suggestion_bar(self):
+        """Row of suggested words plus the predictive on/off toggle (built once)"""
+        self.suggestion_bar = tk.Frame(self, bg="#2b2b2b")
+        self.suggestion_bar.pack(fill="x")
+        pad_val = self.lm.scaled(3) if self.lm else 3
+        
+        for i in range(T9_MAX_SUGGESTIONS):
+            label = tk.Label(self.suggestion_bar, text="", font=self.sub_font, bg="#3a3a3a", fg="#ffffff",
+                             padx=pad_val, pady=pad_val)
+            label.pack(side="left", padx=pad_val, pady=pad_val)
+            label.bind("<Button-1>", lambda e, i=i: self.choose_suggestion(i))
+            self.suggestion_labels.append(label)
+        
+        self.predict_toggle = tk.Label(self.suggestion_bar, text="", font=self.sub_font, bg="#555555",
+                                       fg="#ffffff", padx=pad_val, pady=pad_val)
+        self.predict_toggle.pack(side="right", padx=pad_val, pady=pad_val)
+        self.predict_toggle.bind("<Button-1>", lambda e: self.toggle_predictive())
+        self.render_suggestions([])
+    
+    def render_buttons(self):
+        """Show the current layout on the existing keys (only labels whose text changed are touched)"""
+        for key_obj in self.t9_keys:
+            btn_frame, main_label, sub_label = self.buttons[key_obj["number"]]
+            main_text = key_obj["letters"][0]
+            sub_text = "".join(key_obj["showletters"])
+            if main_label.cget("text") != main_text:
+                main_label.config(text=main_text)
+            if sub_label.cget("text") != sub_text:
+                sub_label.config(text=sub_text)
+        
+        # Disable key 10 in numpad mode
+        btn_frame, main_label, sub_label = self.buttons["10"]
+        if self.numpad_mode:
+            btn_frame.config(bg="#d0d0d0", cursor="")
+            main_label.config(bg="#d0d0d0", fg="#999999")
+            sub_label.config(bg="#d0d0d0")
+        else:
+            btn_frame.config(bg="#f0f0f0", cursor="hand2")
+            main_label.config(bg="#f0f0f0", fg="#333333")
+            sub_label.config(bg="#f0f0f0")
+    
+    def retarget(self, target_entry, password=False, sources=SOURCES):
+        """Type into another Entry (the keypad is kept per page and reused)"""
+        self.commit_word()
+        self.target = target_entry
+        self.password = password
+        self.sources = sources
+        self.reset_cycle()
+        self.render_suggestions([])
+    
+    # ---------------------------
+    # predictive input
+    # ---------------------------
+    def predictive_active(self):
+        """Prediction applies to the letter layouts of allowed fields only"""
+        return (self.predictor is not None and self.predict_on and self.layout_number in (0, 1)
+                and (T9_PREDICT_PASSWORDS or not self.password))
+    
+    def toggle_predictive(self):
+        self.commit_word()
+        self.predict_on = not self.predict_on
+        self.render_suggestions([])
+    
+    def render_suggestions(self, words):
+        if self.predictor is None:
+            return
+        if self.password and not T9_PREDICT_PASSWORDS:
+            self.suggestion_bar.pack_forget()
+            return
+        if not self.suggestion_bar.winfo_manager():
+            self.suggestion_bar.pack(fill="x", before=self.keyboard_frame)
+        for i, label in enumerate(self.suggestion_labels):
+            text = words[i] if i < len(words) else ""
+            if label.cget("text") != text:
+                label.config(text=text)
+        self.predict_toggle.config(text="T9 on" if self.predict_on else "T9 off")
+    
+    def replace_composition(self, text):
+        """Swap the word being composed (the last compose_len characters) for text"""
+        current = self.target.get()
+        if self.compose_len:
+            self.target.delete(len(current) - self.compose_len, tk.END)
+        self.target.insert(tk.END, text)
+        self.compose_len = len(text)
+    
+    def update_composition(self):
+        """Show the best word for self.sequence (typed digits when nothing matches exactly)"""
+        words = self.predictor.suggest(self.sequence, sources=self.sources) if self.sequence else []
+        exact = [w for w in words if len(w) == len(self.sequence)]
+        if exact:
+            shown = exact[0]
+        else:
+            # a longer completion only goes in when tapped: its prefix could
+            # be letters the user never meant ("7" is not "P" of "Pixel-7")
+            shown = "".join(self.key_map[k]["letters"][0] for k in self.sequence)
+        self.replace_composition(shown)
+        if not self.sequence:
+            self.compose_len = 0
+        self.render_suggestions(words)
+    
+    def choose_suggestion(self, index):
+        """Tap on a suggestion: put the whole word in the entry and start a new one"""
+        if index >= len(self.suggestion_labels):
+            return
+        word = self.suggestion_labels[index].cget("text")
+        if not word:
+            return
+        self.replace_composition(word)
+        self.commit_word()
+    
+    def commit_word(self):
+        """Keep the composed text as it is and start a new word"""
+        self.sequence = ""
+        self.compose_len = 0
+        if self.predictor is not None:
+            self.render_suggestions([])
+    
+    def reset_cycle(self):
+        """Forget the multi-tap state so the next press starts a new character"""
+        if self.timeout_id:
+            self.after_cancel(self.timeout_id)
+            self.timeout_id = None
+        self.last_key = None
+        self.cycle_index = 0
     
     def handle_key_press(self, key):
         """Handle key press events"""
-        key_obj = next((k for k in self.t9_keys if k["number"] == key), None)
+        if self.numpad_mode and key == "10":
+            return
+        key_obj = self.key_map.get(key)
         if not key_obj:
             return
         
@@ -191,17 +309,24 @@ class T9Keypad(tk.Frame):
         
         # T9 mode with cycling
         if key == "10":
-            # Switch layout
+            # Switch layout: relabel the keys in place
+            self.commit_word()
             self.layout_number = (self.layout_number + 1) % len(self.layouts)
             self.t9_keys = self.layouts[self.layout_number]
-            # Re-render entire keyboard
-            for widget in self.winfo_children():
-                widget.destroy()
-            self.create_keyboard()
+            self.key_map = self.layout_maps[self.layout_number]
+            self.render_buttons()
             print(f"Layout switched to {self.layout_number}")
         elif key == "11":
-            # Backspace
-            self.add_backspace()
+            # Backspace (drops the last key of the word being composed)
+            if self.sequence:
+                self.sequence = self.sequence[:-1]
+                self.update_composition()
+            else:
+                self.add_backspace()
+        elif self.predictive_active():
+            # One tap per letter: the shown word comes from the dictionary
+            self.sequence += key
+            self.update_composition()
         else:
             # Character input with cycling
             if key == self.last_key:
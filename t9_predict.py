@@ -0,0 +1,252 @@
+# t9_predict.py
+"""
+Predictive T9: one tap per letter instead of multi-tap.
+
+Words are indexed by their key sequence ("Home-WiFi" -> "466319434") in a
+compact trie whose nodes keep the best T9_MAX_SUGGESTIONS words of their
+subtree, so suggest("4663") is one walk down the trie plus a small merge,
+independent of the dictionary size.
+
+Words come from three sources, each in its own trie:
+- the SSIDs of the latest scan_wifi() (replaced on every scan)
+- phone numbers that logged in before (T9_HISTORY_PATH, weighted by use)
+- an optional word list file (T9_WORDS_PATH: "word" or "word<TAB>weight" per line)
+
+A field can restrict suggestions to some sources (the login phone field
+only offers phone numbers). Password fields use it only when
+T9_PREDICT_PASSWORDS=1.
+"""
+import os
+import json
+import tempfile
+import threading
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+T9_WORDS_PATH = os.getenv("T9_WORDS_PATH", "")
+T9_HISTORY_PATH = os.getenv(
+    "T9_HISTORY_PATH", os.path.join(os.path.expanduser("~"), ".cache", "python_bootloader", "t9_history.json")
+)
+T9_MAX_SUGGESTIONS = int(os.getenv("T9_MAX_SUGGESTIONS", "5"))
+T9_PREDICT_PASSWORDS = os.getenv("T9_PREDICT_PASSWORDS", "0") == "1"
+
+# same keys as T9Keypad; characters on no key (symbols) go to "1"
+KEY_LETTERS = {
+    "0": " ",
+    "2": "abc", "3": "def", "4": "ghi", "5": "jkl",
+    "6": "mno", "7": "pqrs", "8": "tuv", "9": "wxyz",
+}
+CHAR_TO_KEY = {c: key for key, letters in KEY_LETTERS.items() for c in letters}
+CHAR_TO_KEY.update({str(d): str(d) for d in range(10)})
+
+# word sources, in tie-break order
+SOURCES = ("ssids", "phones", "words")
+
+
+def key_sequence(word: str) -> str:
+    """Digits typed for word in predictive mode: "Ab-1" -> "2211"."""
+    return "".join(CHAR_TO_KEY.get(c, "1") for c in word.lower())
+
+
+def _rank(entry) -> tuple:
+    word, weight = entry
+    return (-weight, len(word), word)
+
+
+# ---------------------------
+# trie
+# ---------------------------
+class _Node:
+    __slots__ = ("children", "words", "top")
+
+    def __init__(self):
+        self.children = {}  # key digit -> _Node
+        self.words = {}     # word -> weight, words whose sequence ends here
+        self.top = []       # best (word, weight) of this subtree, best first
+
+
+class T9Trie:
+    """Key-sequence trie with the best `limit` completions cached per node."""
+
+    def __init__(self, limit: int = T9_MAX_SUGGESTIONS):
+        self.limit = limit
+        self.root = _Node()
+        self.size = 0
+
+    def add(self, word: str, weight: float = 1.0) -> None:
+        """Insert word, or raise its weight to `weight` if it is already there."""
+        if not word:
+            return
+        path = [self.root]
+        for key in key_sequence(word):
+            path.append(path[-1].children.setdefault(key, _Node()))
+        leaf = path[-1]
+        if word not in leaf.words:
+            self.size += 1
+        leaf.words[word] = max(weight, leaf.words.get(word, weight))
+        entry = (word, leaf.words[word])
+        rank = _rank(entry)
+        for node in path:
+            top = node.top
+            for i, (other, _) in enumerate(top):
+                if other == word:
+                    del top[i]
+                    break
+            if len(top) >= self.limit and rank >= _rank(top[-1]):
+                continue  # not among this subtree's best
+            i = 0
+            while i < len(top) and _rank(top[i]) <= rank:
+                i += 1
+            top.insert(i, entry)
+            del top[self.limit:]
+
+    def find(self, sequence: str):
+        node = self.root
+        for key in sequence:
+            node = node.children.get(key)
+            if node is None:
+                return None
+        return node
+
+
+# ---------------------------
+# dictionary over all sources
+# ---------------------------
+class T9Dictionary:
+    """
+    suggest(sequence) -> ranked words: exact-length matches first (what the
+    entry shows while typing), then longer completions; within each group by
+    weight, then source (SSIDs, phones, word list), then shorter words first.
+    `sources` limits the lookup to some of SOURCES.
+    """
+
+    def __init__(self, limit: int = T9_MAX_SUGGESTIONS, history_path: str = T9_HISTORY_PATH,
+                 words_path: str = T9_WORDS_PATH):
+        self.limit = limit
+        self.history_path = history_path
+        self._lock = threading.Lock()
+        self._ssids = T9Trie(limit)
+        self._phones = T9Trie(limit)
+        self._words = T9Trie(limit)
+        self._word_weights = {}  # word -> weight, everything in _words
+        self._load_lock = threading.Lock()
+        self._phone_counts = self._load_history()
+        for phone, count in self._phone_counts.items():
+            self._phones.add(phone, count)
+        if words_path:
+            self.load_words(words_path)
+
+    def suggest(self, sequence: str, limit: int | None = None, sources=SOURCES) -> list:
+        limit = limit or self.limit
+        exact, longer = {}, {}
+        with self._lock:
+            # at equal weight SSIDs beat phone numbers beat the word list
+            for source, trie in enumerate((self._ssids, self._phones, self._words)):
+                if SOURCES[source] not in sources:
+                    continue
+                node = trie.find(sequence)
+                if node is None:
+                    continue
+                for word, weight in node.words.items():
+                    exact.setdefault(word, (-weight, source, len(word), word))
+                for word, weight in node.top:
+                    if word not in node.words:
+                        longer.setdefault(word, (-weight, source, len(word), word))
+        ranked = sorted(exact.values())
+        ranked += sorted(key for word, key in longer.items() if word not in exact)
+        return [key[3] for key in ranked[:limit]]
+
+    # ---- sources ----
+    def set_ssids(self, ssids) -> None:
+        """SSIDs of the latest scan (the previous scan's are dropped); earlier in the list ranks higher."""
+        ssids = [s for s in ssids or [] if s]
+        trie = T9Trie(self.limit)
+        for i, ssid in enumerate(ssids):
+            trie.add(ssid, 1.0 + (len(ssids) - i) / (len(ssids) + 1))
+        with self._lock:
+            self._ssids = trie
+
+    def record_login(self, phone: str) -> None:
+        """Remember a phone number that logged in (persisted in history_path)."""
+        phone = (phone or "").strip()
+        if not phone:
+            return
+        with self._lock:
+            self._phone_counts[phone] = self._phone_counts.get(phone, 0) + 1
+            self._phones.add(phone, self._phone_counts[phone])
+            counts = dict(self._phone_counts)
+        self._save_history(counts)
+
+    def load_words(self, path: str) -> int:
+        """Add a word list file; returns the number of words read."""
+        count = 0
+        with self._load_lock:  # one load at a time, so no load drops another's words
+            with self._lock:
+                weights = dict(self._word_weights)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        word, _, weight = line.rstrip("\n").partition("\t")
+                        word = word.strip()
+                        if not word:
+                            continue
+                        try:
+                            weight = float(weight) if weight else 1.0
+                        except ValueError:
+                            weight = 1.0
+                        weights[word] = max(weight, weights.get(word, weight))
+                        count += 1
+            except OSError as e:
+                print("T9 word list not loaded:", e)
+                return count
+            # suggest() keeps using the old trie while the new one is built
+            trie = T9Trie(self.limit)
+            for word, weight in weights.items():
+                trie.add(word, weight)
+            with self._lock:
+                self._words = trie
+                self._word_weights = weights
+        return count
+
+    # ---- login history ----
+    def _load_history(self) -> dict:
+        try:
+            with open(self.history_path, "r") as f:
+                data = json.load(f)
+            return {str(k): int(v) for k, v in data.get("phones", {}).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_history(self, counts: dict) -> None:
+        try:
+            directory = os.path.dirname(self.history_path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".json.tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"phones": counts}, f)
+            os.replace(tmp_path, self.history_path)
+        except OSError as e:
+            print("T9 history: write failed:", e)
+
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+
+def get_dictionary() -> T9Dictionary:
+    """
+    Process-wide dictionary (created on first use). It is built outside the
+    lock, so a slow word list never blocks callers that already have it; if
+    two threads race to create it, the first one published wins.
+    """
+    global _dictionary
+    with _dictionary_lock:
+        if _dictionary is not None:
+            return _dictionary
+    dictionary = T9Dictionary()
+    with _dictionary_lock:
+        if _dictionary is None:
+            _dictionary = dictionary
+        return _dictionary
@@ -0,0 +1,204 @@
+# task_runner.py
+"""
+Bounded worker pool for the app's background jobs (scan, connect, login,
+handshake, flash) with cooperative cancellation.
+
+    task = runner.submit("flash", download_and_flash, file_id, ..., timeout=600)
+    ...
+    runner.cancel("flash")
+
+The job is called with an extra cancel_token=CancelToken() argument. Long
+running code checks the token (raise_if_cancelled / sleep) and registers
+blocking resources with token.on_cancel(close_fn) (serial reads, HTTP
+responses, child processes) so a cancel interrupts them right away instead
+of at the next timeout. A per-task timeout cancels the token with reason
+"timeout". Every finished task is recorded with its wall time.
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configurable defaults
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "4"))
+TASK_HISTORY = 100  # records kept
+
+
+class TaskCancelled(Exception):
+    """Raised inside a job whose token was cancelled. str(exc) is the reason."""
+
+
+class CancelToken:
+    """
+    Cancellation flag shared between the caller and one job. Also usable
+    wherever a threading.Event stop flag is expected (is_set / wait).
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 0
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print("cancel callback failed:", e)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """True once cancelled (threading.Event semantics)."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise TaskCancelled(self.reason)
+
+    def sleep(self, seconds: float) -> None:
+        """time.sleep that ends early with TaskCancelled."""
+        if self._event.wait(seconds):
+            raise TaskCancelled(self.reason)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """Call callback() (e.g. resp.close) if the token is cancelled inside the block."""
+        with self._lock:
+            if not self._event.is_set():
+                key = self._next_id
+                self._next_id += 1
+                self._callbacks[key] = callback
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            callback()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                if registered:
+                    self._callbacks.pop(key, None)
+
+
+class Task:
+    """Handle for one submitted job: future, token and (once finished) record."""
+
+    def __init__(self, name: str, timeout: float | None):
+        self.name = name
+        self.timeout = timeout
+        self.token = CancelToken()
+        self.future = None
+        self.record = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        self.token.cancel(reason)
+        self.future.cancel()  # if it has not started yet
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float | None = None):
+        return self.future.result(timeout)
+
+
+class TaskRunner:
+    """
+    ThreadPoolExecutor with at most max_workers jobs running. Submitting a
+    job under a name that is still running cancels the older one (reason
+    "replaced"), so a retry never competes with the attempt it replaces.
+    """
+
+    def __init__(self, max_workers: int = TASK_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self._lock = threading.Lock()
+        self._tasks = {}  # name -> latest Task
+        self.records = deque(maxlen=TASK_HISTORY)
+
+    def submit(self, name: str, fn, *args, timeout: float | None = None, **kwargs) -> Task:
+        task = Task(name, timeout)
+        with self._lock:
+            previous = self._tasks.get(name)
+            if previous is not None and not previous.done():
+                previous.cancel("replaced")
+            self._tasks[name] = task
+            task.future = self._pool.submit(self._run, task, fn, args, kwargs)
+        return task
+
+    def cancel(self, name: str, reason: str = "cancelled") -> bool:
+        with self._lock:
+            task = self._tasks.get(name)
+        if task is None or task.done():
+            return False
+        task.cancel(reason)
+        return True
+
+    def cancel_all(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            tasks = list(self._tasks.values())
+        for task in tasks:
+            if not task.done():
+                task.cancel(reason)
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.cancel_all("shutdown")
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Per task name: count, last state, avg / max wall time (seconds)."""
+        summary = {}
+        for record in list(self.records):
+            entry = summary.setdefault(record["name"], {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += record["wall_time"]
+            entry["max"] = max(entry["max"], record["wall_time"])
+            entry["last_state"] = record["state"]
+        for entry in summary.values():
+            entry["avg"] = entry.pop("total") / entry["count"]
+        return summary
+
+    def _run(self, task: Task, fn, args, kwargs):
+        timer = None
+        if task.timeout:
+            timer = threading.Timer(task.timeout, task.token.cancel, ("timeout",))
+            timer.daemon = True
+            timer.start()
+        started = time.monotonic()
+        state, error = "done", None
+        try:
+            return fn(*args, cancel_token=task.token, **kwargs)
+        except TaskCancelled:
+            state = task.token.reason or "cancelled"
+        except Exception as e:
+            state, error = "failed", str(e)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if state == "done" and task.token.is_set():
+                state = task.token.reason  # the job returned early after a cancel
+            wall_time = time.monotonic() - started
+            task.record = {"name": task.name, "state": state, "wall_time": wall_time,
+                           "started": time.time() - wall_time, "error": error}
+            self.records.append(task.record)
+            print(f"task {task.name}: {state} after {wall_time:.2f}s")
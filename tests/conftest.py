@@ -0,0 +1,295 @@
+# tests/conftest.py
+import os
+import sys
+import hashlib
+import select
+import threading
+import time
+import tty
+import http.server
+import socketserver
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from du_utils import calculate_crc16, FRAME_SIZE, FRAME_CRC_OFFSET  # noqa: E402
+from firmware_transfer import ACK_BYTE, EOP_BYTE, EOP_OFFSET, HEADER_SIZE, NAK_BYTE, SOP_BYTE, build_reply  # noqa: E402
+
+
+class FirmwareServer:
+    """
+    Local stand-in for the fileDownload endpoint: serves AES-256-ECB
+    encrypted images with the x-*-hash / x-encrypted-key headers (GET and
+    HEAD) and honours "Range: bytes=N-" and "Range: bytes=N-M".
+
+    plain: the image (served as file id "fw") or {file_id: image}.
+    cuts: bytes to send per request before dropping the connection
+    (consumed in order; None or an exhausted list = send everything).
+    misalign: answer the next Range request with a body starting 16 bytes early.
+    on_range(start, end): optional hook per Range request; may return
+    ("status", code) to fail it or ("cut", n) to drop it after n bytes.
+    chunk_delay: seconds to sleep between 16 KiB pieces of a body.
+    statuses: status codes to answer the next GETs with (consumed in order,
+    empty body) before serving the file normally.
+    keep_alive: leave the connection open after a full body instead of
+    sending "Connection: close".
+    active / peak: GETs being served now / at most at once.
+    peers: client (host, port) per GET/HEAD, to count connections.
+    """
+
+    def __init__(self, plain, key: bytes, cuts=None):
+        from Crypto.Cipher import AES
+
+        files = plain if isinstance(plain, dict) else {"fw": plain}
+        self.files = {str(file_id): (data, AES.new(key, AES.MODE_ECB).encrypt(data))
+                      for file_id, data in files.items()}
+        self.plain, self.encrypted = next(iter(self.files.values()))
+        self.key = key
+        self.cuts = list(cuts or [])
+        self.misalign = False
+        self.on_range = None
+        self.chunk_delay = 0.0
+        self.statuses = []
+        self.keep_alive = False
+        self.peers = []
+        self.requests = []  # Range header (or None) per GET
+        self.gets = []      # file id per GET
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _file(self):
+                with server._lock:
+                    server.peers.append(self.client_address)
+                entry = server.files.get(self.path.rstrip("/").rsplit("/", 1)[-1])
+                if entry is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                return entry
+
+            def _hash_headers(self, plain, encrypted):
+                self.send_header("x-original-file-hash", hashlib.sha256(plain).hexdigest())
+                self.send_header("x-encrypted-file-hash", hashlib.sha256(encrypted).hexdigest())
+                self.send_header("x-encrypted-key", '["a2V5"]')
+
+            def do_HEAD(self):
+                entry = self._file()
+                if entry is None:
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(entry[1])))
+                self._hash_headers(*entry)
+                self.end_headers()
+
+            def do_GET(self):
+                entry = self._file()
+                if entry is None:
+                    return
+                with server._lock:
+                    server.requests.append(self.headers.get("Range"))
+                    server.gets.append(self.path.rsplit("/", 1)[-1])
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                    status = server.statuses.pop(0) if server.statuses else None
+                try:
+                    if status is not None:
+                        self.send_response(status)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self._get(*entry)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def _get(self, plain, encrypted):
+                body, total = encrypted, len(encrypted)
+                start, end = 0, total - 1
+                status = 200
+                cut = None
+                range_header = self.headers.get("Range")
+                if range_header:
+                    first, _, last = range_header.split("=")[1].partition("-")
+                    start = int(first)
+                    end = min(int(last), total - 1) if last else total - 1
+                    action = server.on_range(start, end) if server.on_range else None
+                    if action and action[0] == "status":
+                        self.send_response(action[1])
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    if action and action[0] == "cut":
+                        cut = action[1]
+                    if start >= total:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{total}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    if server.misalign:
+                        server.misalign = False
+                        start = max(start - 16, 0)
+                    status = 206
+                body = body[start:end + 1]
+                self.send_response(status)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+                self.send_header("Content-Length", str(len(body)))
+                self._hash_headers(plain, encrypted)
+                if not server.keep_alive:
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                if cut is None and server.cuts:
+                    cut = server.cuts.pop(0)
+                body = body if cut is None else body[:cut]
+                try:
+                    for i in range(0, len(body), 16 * 1024):
+                        if server.chunk_delay:
+                            time.sleep(server.chunk_delay)
+                        self.wfile.write(body[i:i + 16 * 1024])
+                    self.wfile.flush()
+                except OSError:
+                    pass  # client went away (cancelled download)
+                self.close_connection = not server.keep_alive or cut is not None
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/"  # SERVER_URL
+        self.url = f"{self.base_url}api/file/fileDownload/fw"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def firmware_server():
+    servers = []
+
+    def start(plain, key: bytes = b"k" * 32, cuts=None) -> FirmwareServer:
+        server = FirmwareServer(plain, key, cuts)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+class DuEmulator(threading.Thread):
+    """
+    DU side of the frame transfer protocol on the master end of a pty.
+    Frames are checked like the DU does (SOP, EOP, CRC) and ACKed or NAKed;
+    nak_once / drop_once hold sequence numbers to NAK or leave unanswered
+    the first time they arrive, and `noise` is written before every reply.
+    greeting (a handshake frame, a ready byte) is repeated every 50 ms until
+    the host sends something, the way a DU keeps announcing itself; the
+    first `preamble` bytes from the host (the 64-byte hash packet) are
+    collected in `packet` before any frame.
+    """
+
+    def __init__(self, fd, nak_once=(), drop_once=(), noise=b"", never_ack=(), greeting=b"", preamble=0):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.greeting = greeting
+        self.preamble = preamble
+        self.packet = b""
+        self.nak_once = set(nak_once)
+        self.drop_once = set(drop_once)
+        self.never_ack = set(never_ack)
+        self.noise = noise
+        self.payloads = {}
+        self.received = 0
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        buf = bytearray()
+        greeting = self.greeting
+        while not self.stopped.is_set():
+            if greeting:
+                os.write(self.fd, greeting)
+            ready, _, _ = select.select([self.fd], [], [], 0.05)
+            if not ready:
+                continue
+            greeting = b""
+            try:
+                buf += os.read(self.fd, 4096)
+            except OSError:
+                return
+            if len(self.packet) < self.preamble:
+                take = self.preamble - len(self.packet)
+                self.packet += bytes(buf[:take])
+                del buf[:take]
+            while len(buf) >= FRAME_SIZE:
+                frame, buf = bytes(buf[:FRAME_SIZE]), buf[FRAME_SIZE:]
+                self.handle(frame)
+
+    def handle(self, frame: bytes) -> None:
+        self.received += 1
+        seq = int.from_bytes(frame[1:3], "big")
+        crc = frame[FRAME_CRC_OFFSET] | frame[FRAME_CRC_OFFSET + 1] << 8
+        valid = (frame[0] == SOP_BYTE and frame[EOP_OFFSET] == EOP_BYTE
+                 and crc == calculate_crc16(frame[:FRAME_CRC_OFFSET]))
+        if seq in self.drop_once:
+            self.drop_once.discard(seq)
+            return
+        if seq in self.never_ack:
+            return
+        if not valid or seq in self.nak_once:
+            self.nak_once.discard(seq)
+            self.reply(NAK_BYTE, seq)
+            return
+        length = int.from_bytes(frame[3:5], "big")
+        self.payloads[seq] = frame[HEADER_SIZE:HEADER_SIZE + length]
+        self.reply(ACK_BYTE, seq)
+        if length == 0:
+            self.finished.set()
+
+    def reply(self, kind: int, seq: int) -> None:
+        os.write(self.fd, self.noise + build_reply(kind, seq))
+
+    def image(self) -> bytes:
+        return b"".join(self.payloads[seq] for seq in sorted(self.payloads))
+
+
+@pytest.fixture
+def du_port():
+    """(pty slave path, start(**emulator options) -> DuEmulator on the master end)."""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    emulators = []
+
+    def start(**options):
+        emulator = DuEmulator(master, **options)
+        emulator.start()
+        emulators.append(emulator)
+        return emulator
+
+    yield os.ttyname(slave), start
+    for emulator in emulators:
+        emulator.stopped.set()
+        emulator.join(1)
+    os.close(slave)
+    os.close(master)
+
+
+@pytest.fixture
+def du_pty(du_port):
+    """(host serial.Serial, start(**emulator options) -> DuEmulator) over a pty pair."""
+    import serial
+
+    path, start = du_port
+    host = serial.Serial(path, baudrate=115200, timeout=1)
+    yield host, start
+    host.close()
@@ -0,0 +1,221 @@
+# tests/test_bootloader_download.py
+import io
+import json
+import os
+import random
+import time
+
+import pytest
+import requests
+
+import bootloader_download as bd
+from task_runner import CancelToken
+
+KEY = b"k" * 32
+
+
+@pytest.fixture
+def download_env(tmp_path, monkeypatch):
+    """Partial files under tmp_path, no KMS, no retry backoff."""
+    monkeypatch.setattr(bd, "FIRMWARE_DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(bd, "decrypt_data_key", lambda header, callback_message: KEY)
+    monkeypatch.setattr(CancelToken, "sleep", lambda self, seconds: None)
+    return tmp_path
+
+
+def _plain(size: int, seed: int = 0) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def _fetch(server, file_id="fw"):
+    sink = io.BytesIO()
+    with requests.Session() as http:
+        meta = bd.fetch_firmware(server.url, {}, file_id, sink, lambda text: None, http=http)
+    return meta, sink.getvalue()
+
+
+def test_resumes_after_connections_cut_at_random_offsets(download_env, firmware_server):
+    plain = _plain(1024 * 1024)
+    rng = random.Random(7)
+    # past the first read chunk, so every cut leaves something to resume from
+    cuts = [rng.randrange(bd.DOWNLOAD_CHUNK_SIZE + 1, 200 * 1024) for _ in range(bd.DOWNLOAD_MAX_RETRIES)]
+    server = firmware_server(plain, KEY, cuts)
+
+    meta, received = _fetch(server)
+
+    assert received == plain
+    assert meta["size"] == len(plain)
+    assert server.requests[0] is None
+    # every retry continued where the previous connection stopped
+    offsets = [int(r.split("=")[1].rstrip("-")) for r in server.requests[1:]]
+    assert offsets == sorted(offsets) and offsets[0] > 0
+    assert len(server.requests) == len(cuts) + 1
+    # a verified download leaves nothing to resume
+    assert os.listdir(download_env) == []
+
+
+def test_sidecar_survives_restart(download_env, firmware_server, monkeypatch):
+    plain = _plain(512 * 1024, seed=1)
+    server = firmware_server(plain, KEY, cuts=[200 * 1024])
+
+    # first run "crashes": no retries left after the cut
+    monkeypatch.setattr(bd, "DOWNLOAD_MAX_RETRIES", 0)
+    with pytest.raises(bd.FirmwareDownloadError):
+        _fetch(server)
+    partial = bd.PartialDownload("fw", str(download_env))
+    with open(partial.meta_path) as f:
+        sidecar = json.load(f)
+    assert sidecar["offset"] == partial.size > 0
+    assert sidecar["encrypted_hash"]
+
+    # a new run (fresh PartialDownload) picks up from the file on disk
+    monkeypatch.setattr(bd, "DOWNLOAD_MAX_RETRIES", 5)
+    _, received = _fetch(server)
+
+    assert received == plain
+    assert server.requests[-1] == f"bytes={sidecar['offset']}-"
+
+
+def test_416_restarts_from_zero(download_env, firmware_server):
+    plain = _plain(64 * 1024, seed=2)
+    server = firmware_server(plain, KEY)
+    # partial longer than the file now served (e.g. left by a bigger build)
+    partial = bd.PartialDownload("fw", str(download_env))
+    partial.open({"encrypted_hash": "old", "original_hash": "old", "encrypted_key": "[]"})
+    partial.append(b"\0" * (len(plain) + 4096))
+    partial.close()
+
+    _, received = _fetch(server)
+
+    assert received == plain
+    assert server.requests == [f"bytes={len(plain) + 4096}-", None]
+
+
+def test_misaligned_206_is_not_appended(download_env, firmware_server):
+    plain = _plain(512 * 1024, seed=3)
+    server = firmware_server(plain, KEY, cuts=[200 * 1024])
+    server.misalign = True
+
+    _, received = _fetch(server)
+
+    assert received == plain
+    # the cut is resumed with Range, the misaligned answer is dropped and the file fetched whole
+    assert server.requests[0] is None
+    assert server.requests[1].startswith("bytes=")
+    assert server.requests[2] is None
+
+
+def _fetch_segmented(server, segments):
+    sink = io.BytesIO()
+    with requests.Session() as http:
+        meta = bd.fetch_firmware_segmented(server.url, {}, "fw", sink, lambda text: None, segments, http)
+    return meta, sink.getvalue()
+
+
+def test_segmented_download(download_env, firmware_server):
+    plain = _plain(bd.DOWNLOAD_SEGMENT_MIN_SIZE + 4096, seed=4)
+    server = firmware_server(plain, KEY)
+
+    _, received = _fetch_segmented(server, 4)
+
+    assert received == plain
+    assert len(server.requests) == 1 + 4  # probe + segments
+
+
+def test_failed_segment_stops_the_others(tmp_path, firmware_server, monkeypatch):
+    # real retry backoff here: the other segments must not sit it out
+    monkeypatch.setattr(bd, "FIRMWARE_DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(bd, "decrypt_data_key", lambda header, callback_message: KEY)
+    plain = _plain(bd.DOWNLOAD_SEGMENT_MIN_SIZE, seed=5)
+    server = firmware_server(plain, KEY)
+
+    def on_range(start, end):
+        if start == end == 0:
+            return None  # probe
+        if start == 0:
+            time.sleep(0.3)  # the others are backing off by now
+            return ("status", 500)
+        return ("cut", 0)
+
+    server.on_range = on_range
+    started = time.monotonic()
+    with pytest.raises(bd.FirmwareDownloadError, match="HTTP 500"):
+        _fetch_segmented(server, 4)
+    # without the shared cancel the cut segments would retry for 1 + 2 + 4 + ... s
+    assert time.monotonic() - started < 2
+
+
+def test_segments_capped_at_pool_size(download_env, firmware_server, monkeypatch):
+    monkeypatch.setattr(bd, "HTTP_POOL_SIZE", 2)
+    plain = _plain(bd.DOWNLOAD_SEGMENT_MIN_SIZE, seed=6)
+    server = firmware_server(plain, KEY)
+
+    _, received = _fetch_segmented(server, 8)
+
+    assert received == plain
+    assert len(server.requests) == 1 + 2
+
+
+class FakeSerial:
+    """in_waiting/read/reset_input_buffer over bytes that arrive one poll at a time."""
+
+    def __init__(self, arrivals):
+        self.arrivals = list(arrivals)
+        self.buffer = b""
+
+    @property
+    def in_waiting(self):
+        if self.arrivals:
+            self.buffer += self.arrivals.pop(0)
+        return len(self.buffer)
+
+    def read(self, n):
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def reset_input_buffer(self):
+        self.buffer = b""
+
+
+def test_ready_byte_ends_wait(download_env):
+    ready, _ = bd.wait_for_du_ready(FakeSerial([b"\x00", b"\xff", b"\x2a"]), ceiling=1, ready_bytes=b"\x2a")
+    assert ready is True
+
+
+def test_noise_is_not_ready(monkeypatch):
+    monkeypatch.setattr(CancelToken, "sleep", lambda self, seconds: time.sleep(0.001))
+    ready, waited = bd.wait_for_du_ready(FakeSerial([b"\x00", b"\xff"]), ceiling=0.05, ready_bytes=b"\x2a")
+    assert ready is False
+    assert waited >= 0.05
+
+
+def test_empty_ready_bytes_turns_check_off(download_env):
+    slept = []
+    ser = FakeSerial([b"\x2a"])
+    token = CancelToken()
+    token.sleep = slept.append
+    ready, _ = bd.wait_for_du_ready(ser, ceiling=4, ready_bytes=b"", cancel_token=token)
+    assert ready is None
+    assert slept == [4]
+
+
+def test_every_wait_is_recorded(download_env, monkeypatch):
+    monkeypatch.setattr(bd, "du_ready_waits", bd.deque(maxlen=10))
+    assert bd.du_ready_stats() == {"count": 0}
+    bd.wait_for_du_ready(FakeSerial([]), ceiling=4, ready_bytes=b"")
+    stats = bd.du_ready_stats()
+    assert (stats["count"], stats["unprobed"], stats["ready_ratio"]) == (1, 1, None)
+
+    bd.wait_for_du_ready(FakeSerial([b"\x2a"]), ceiling=1, ready_bytes=b"\x2a")
+    bd.wait_for_du_ready(FakeSerial([]), ceiling=0, ready_bytes=b"\x2a")
+    stats = bd.du_ready_stats()
+    assert [r for _, r in bd.du_ready_waits] == [None, True, False]
+    assert (stats["count"], stats["unprobed"], stats["ready_ratio"]) == (3, 1, 0.5)
+
+
+def test_ready_bytes_default_to_sop_and_bad_hex_falls_back(capsys):
+    assert bd.DU_READY_BYTES_DEFAULT == "2a"
+    assert bd._parse_ready_bytes("2a06") == b"\x2a\x06"
+    assert bd._parse_ready_bytes("") == b""
+    assert bd._parse_ready_bytes("zz") == b"\x2a"
+    assert "not hex" in capsys.readouterr().out
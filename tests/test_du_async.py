@@ -0,0 +1,161 @@
+# tests/test_du_async.py
+import asyncio
+import functools
+import random
+import time
+
+import httpx
+import pytest
+
+import du_async
+import gpio_control
+from bootloader_download import FirmwarePipeline
+from du_reader import du_update_cache
+from du_utils import calculate_crc16, FRAME_SIZE, FRAME_CRC_OFFSET
+from firmware_cache import FirmwareCache
+from firmware_transfer import EOP_BYTE, EOP_OFFSET, PAYLOAD_SIZE, SOP_BYTE
+from serial_session import close_all_sessions
+
+KEY = b"k" * 32
+
+
+def handshake_frame(du_number: int, display_number: int) -> bytes:
+    """A plain (unencrypted) DU announcement frame."""
+    frame = bytearray(FRAME_SIZE)
+    frame[0] = SOP_BYTE
+    frame[1:5] = du_number.to_bytes(4, "big")
+    frame[5:9] = display_number.to_bytes(4, "big")
+    frame[EOP_OFFSET] = EOP_BYTE
+    crc = calculate_crc16(frame[:FRAME_CRC_OFFSET])
+    frame[FRAME_CRC_OFFSET] = crc & 0xFF
+    frame[FRAME_CRC_OFFSET + 1] = crc >> 8
+    return bytes(frame)
+
+
+@pytest.fixture
+def async_env(monkeypatch):
+    """Mock GPIO, no DU_Update cache carry-over, sessions closed afterwards."""
+    gpio_control.set_backend(gpio_control.MockBackend())
+    monkeypatch.setenv("SERVER_URL", "http://du-server.test/")
+    monkeypatch.setenv("DEVICE_ID", "dev-1")
+    du_update_cache.invalidate()
+    yield
+    close_all_sessions()
+    du_update_cache.invalidate()
+    gpio_control.set_backend(None)
+
+
+async def _with_heartbeat(coro, interval=0.01):
+    """Run coro while measuring the longest gap between event loop ticks."""
+    gaps = []
+
+    async def beat():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.ensure_future(beat())
+    try:
+        result = await coro
+    finally:
+        ticker.cancel()
+    return result, max(gaps, default=0.0)
+
+
+def test_read_du_async_over_pty(async_env, du_port):
+    port, start = du_port
+    # noise first: the parser has to re-sync onto the frame
+    start(greeting=b"\x00\x13\x37" + handshake_frame(1234, 2))
+    seen = {}
+
+    def du_update(request):
+        seen.update(request.headers)
+        return httpx.Response(200, json={"response": [{"fileId": "fw", "version": "1.0"}]})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(du_update)) as client:
+            return await du_async.read_du_async("token", serial_port=port, client=client)
+
+    result = asyncio.run(run())
+    assert result["duNumber"] == 1234
+    assert result["displayNumber"] == 2
+    assert result["options"] == [{"fileId": "fw", "version": "1.0"}]
+    assert result["isStale"] is False
+    assert seen["dunumber"] == "1234" and seen["authorization"] == "Bearer token"
+    levels = [value for _, _, value in gpio_control.get_backend().toggles]
+    assert levels == [1, 0]  # BL_DETECT high for the handshake, low afterwards
+
+
+def test_read_du_async_times_out_without_data(async_env, du_port, monkeypatch):
+    port, _ = du_port
+    original = du_async.aiter_du_frames
+    monkeypatch.setattr(du_async, "aiter_du_frames", functools.partial(original, frame_timeout=0.2))
+    with pytest.raises(du_async.DuSerialError, match="E31"):
+        asyncio.run(du_async.read_du_async("token", serial_port=port))
+
+
+def test_download_and_flash_async_over_pty(async_env, du_port, firmware_server, tmp_path, monkeypatch):
+    port, start = du_port
+    plain = random.Random(5).randbytes(6 * PAYLOAD_SIZE + 80)  # whole AES blocks
+    server = firmware_server(plain, KEY)
+    monkeypatch.setenv("SERVER_URL", server.base_url)
+    monkeypatch.setattr(du_async, "decrypt_data_key", lambda header, on_message: KEY)
+    monkeypatch.setattr(du_async, "FLASH_SEND_IMAGE", True)
+    monkeypatch.setattr(du_async, "wait_for_du_ready_async",
+                        functools.partial(du_async.wait_for_du_ready_async, ceiling=2, ready_bytes=b"\x2a"))
+    du = start(greeting=b"\x2a", preamble=64)
+    messages = []
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await du_async.download_and_flash_async(
+                "fw", "token", False, messages.append, serial_port=port, client=client,
+                cache=FirmwareCache(str(tmp_path / "cache")),
+            )
+
+    result = asyncio.run(run())
+    assert result["status"] == "success"
+    assert du.finished.wait(2)
+    assert du.image() == plain
+    assert du.packet[0] == 0x2A and len(du.packet) == 64
+    assert any(m.startswith("DU ready after") for m in messages)
+
+
+def test_download_does_not_block_the_event_loop(async_env, firmware_server, tmp_path, monkeypatch):
+    plain = random.Random(6).randbytes(4 * 64 * 1024)
+    server = firmware_server(plain, KEY)
+    monkeypatch.setattr(du_async, "decrypt_data_key", lambda header, on_message: KEY)
+
+    class SlowPipeline(FirmwarePipeline):
+        def feed(self, chunk):
+            time.sleep(0.3)  # stands in for SHA-256 + AES of a large chunk on a slow CPU
+            return super().feed(chunk)
+
+    monkeypatch.setattr(du_async, "FirmwarePipeline", SlowPipeline)
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            with open(tmp_path / "fw.bin", "w+b") as sink:
+                firmware = await du_async.fetch_firmware_async(client, server.url, {}, "fw", sink,
+                                                               cache=FirmwareCache(str(tmp_path), max_bytes=0))
+                sink.seek(0)
+                return firmware, sink.read()
+
+    (firmware, received), longest_gap = asyncio.run(_with_heartbeat(run()))
+    assert received == plain
+    assert firmware["size"] == len(plain)
+    assert longest_gap < 0.2
+
+
+def test_unprobed_ready_wait_is_recorded():
+    class Port:
+        class session:
+            reset_input_buffer = staticmethod(lambda: None)
+
+    du_async.du_ready_waits.clear()
+    ready, waited = asyncio.run(du_async.wait_for_du_ready_async(Port(), ceiling=0.01, ready_bytes=b""))
+    assert ready is None
+    assert list(du_async.du_ready_waits) == [(waited, None)]
@@ -0,0 +1,148 @@
+# tests/test_du_reader.py
+import du_reader
+from decrypt_utils import encrypt_into
+from du_reader import DuFrameParser, DuUpdateCache, iter_du_frames
+from du_utils import calculate_crc16, FRAME_SIZE, FRAME_CRC_OFFSET
+
+
+class FakeResponse:
+    def __init__(self, status_code, options=None, etag=None):
+        self.status_code = status_code
+        self.headers = {"ETag": etag} if etag else {}
+        self._options = options
+        self.text = ""
+
+    def json(self):
+        return {"response": self._options}
+
+
+def _headers(token, monkeypatch):
+    monkeypatch.setenv("SERVER_URL", "http://server/")
+    monkeypatch.setenv("DEVICE_ID", "dev-1")
+    return du_reader.du_update_request(token, 3, 1)[1]
+
+
+def test_cached_list_is_per_login(monkeypatch):
+    cache = DuUpdateCache(ttl=300)
+    alice = _headers("token-alice", monkeypatch)
+    bob = _headers("token-bob", monkeypatch)
+    cache.finish(alice, FakeResponse(200, ["alice.bin"]))
+
+    cached, _ = cache.begin(alice)
+    assert cached["options"] == ["alice.bin"]
+    assert cache.begin(bob) == (None, bob)
+    assert cache.offline(bob) is None
+
+
+def test_revalidation_only_with_own_etag(monkeypatch):
+    cache = DuUpdateCache(ttl=0)
+    alice = _headers("token-alice", monkeypatch)
+    bob = _headers("token-bob", monkeypatch)
+    cache.finish(alice, FakeResponse(200, ["alice.bin"], etag='"v1"'))
+
+    assert cache.begin(alice)[1]["If-None-Match"] == '"v1"'
+    assert "If-None-Match" not in cache.begin(bob)[1]
+
+
+# ---------------------------
+# DuFrameParser
+# ---------------------------
+def du_frame(du_number: int, display_number: int = 1, encrypted: bool = False) -> bytes:
+    frame = bytearray(FRAME_SIZE)
+    frame[0] = du_reader.SOP_BYTE
+    frame[1:5] = du_number.to_bytes(4, "big")
+    frame[5:9] = display_number.to_bytes(4, "big")
+    frame[du_reader.EOP_OFFSET] = du_reader.EOP_BYTE
+    crc = calculate_crc16(frame[:FRAME_CRC_OFFSET])
+    frame[FRAME_CRC_OFFSET] = crc & 0xFF
+    frame[FRAME_CRC_OFFSET + 1] = crc >> 8
+    if encrypted:
+        out = bytearray(FRAME_SIZE)
+        encrypt_into(out, frame)
+        return bytes(out)
+    return bytes(frame)
+
+
+def _parse(*chunks) -> tuple:
+    parser = DuFrameParser()
+    frames = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        while (frame := parser.next_frame()) is not None:
+            frames.append(frame)
+    return [f.du_number for f in frames], parser
+
+
+def test_frame_split_across_chunks():
+    data = du_frame(7)
+    numbers, parser = _parse(*(data[i:i + 1] for i in range(len(data))))
+    assert numbers == [7]
+    assert len(parser) == 0 and parser.resyncs == 0
+
+
+def test_several_frames_in_one_chunk():
+    numbers, parser = _parse(du_frame(1) + du_frame(2) + du_frame(3)[:100])
+    assert numbers == [1, 2]
+    assert len(parser) == 100  # the partial third frame waits for more bytes
+
+
+def test_resync_after_corrupt_crc():
+    bad = bytearray(du_frame(1))
+    bad[FRAME_CRC_OFFSET] ^= 0xFF
+    numbers, parser = _parse(bytes(bad[:300]), bytes(bad[300:]) + du_frame(2)[:50], du_frame(2)[50:])
+    assert numbers == [2]
+    assert parser.resyncs > 0
+
+
+def test_resync_after_bad_eop():
+    bad = bytearray(du_frame(1))
+    bad[du_reader.EOP_OFFSET] = 0x00
+    numbers, parser = _parse(b"\x2a\x00" + bytes(bad) + du_frame(2))
+    assert numbers == [2]
+
+
+def test_plain_link_resyncs_to_next_sop_after_first_frame():
+    bad = bytearray(du_frame(2))
+    bad[100] ^= 0x01  # payload damaged: CRC mismatch
+    numbers, parser = _parse(du_frame(1) + bytes(bad) + b"\x00" * 7 + du_frame(3))
+    assert numbers == [1, 3]
+    assert parser.encrypted is False
+
+
+def test_encrypted_frames_after_noise():
+    numbers, parser = _parse(b"\x01\x02\x03", du_frame(5, encrypted=True)[:200],
+                             du_frame(5, encrypted=True)[200:] + du_frame(6, encrypted=True))
+    assert numbers == [5, 6]
+    assert parser.encrypted is True
+
+
+class ChunkedPort:
+    """in_waiting/read over a list of chunks (one per read), then silence."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.timeout = 0.01
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        if not self.chunks:
+            return b""
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            self.chunks.insert(0, chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+
+def test_iter_du_frames_streams_and_reports_resyncs():
+    bad = bytearray(du_frame(1))
+    bad[FRAME_CRC_OFFSET + 1] ^= 0xFF
+    data = bytes(bad) + du_frame(2) + du_frame(3)
+    port = ChunkedPort([data[i:i + 97] for i in range(0, len(data), 97)])
+    messages = []
+    frames = iter_du_frames(port, messages.append, frame_timeout=0.5)
+    assert [next(frames).du_number, next(frames).du_number] == [2, 3]
+    assert "Corrupt frame received, re-syncing..." in messages
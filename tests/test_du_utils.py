@@ -0,0 +1,218 @@
+# tests/test_du_utils.py
+import random
+
+import pytest
+
+import du_utils
+from du_utils import (
+    Crc16,
+    DataKeyCache,
+    FRAME_CRC_OFFSET,
+    FRAME_SIZE,
+    calculate_crc16,
+    calculate_crc16_bitwise,
+    calculate_crc16_bulk,
+    match_crc16_bulk,
+)
+
+
+class FakeKms:
+    """Stands in for a boto3 KMS client: "decrypts" a blob by reversing it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def decrypt(self, CiphertextBlob):
+        self.calls.append(bytes(CiphertextBlob))
+        return {"Plaintext": bytes(reversed(CiphertextBlob))}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(du_utils.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def kms(monkeypatch):
+    """Fake client for every region and a fresh process-wide cache."""
+    client = FakeKms()
+    monkeypatch.setattr(du_utils, "get_kms_client", lambda region=du_utils.KMS_REGION: client)
+    monkeypatch.setattr(du_utils, "data_key_cache", DataKeyCache(ttl=60, max_entries=4))
+    return client
+
+
+def test_cache_hit_does_not_call_kms(kms, clock):
+    assert du_utils.decrypt_key_kms(b"blob-1") == b"1-bolb"
+    assert du_utils.decrypt_key_kms(b"blob-1") == b"1-bolb"
+    assert kms.calls == [b"blob-1"]
+    assert du_utils.kms_cache_stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_regions_are_cached_separately(kms, clock):
+    du_utils.decrypt_key_kms(b"blob", "ap-south-1")
+    du_utils.decrypt_key_kms(b"blob", "eu-west-1")
+    assert len(kms.calls) == 2
+
+
+def test_entry_expires_after_ttl(kms, clock):
+    du_utils.decrypt_key_kms(b"blob")
+    clock.now += 59
+    du_utils.decrypt_key_kms(b"blob")
+    assert len(kms.calls) == 1
+    clock.now += 2
+    assert du_utils.decrypt_key_kms(b"blob") == b"bolb"
+    assert len(kms.calls) == 2
+
+
+def test_oldest_entry_evicted_above_max_entries(kms, clock):
+    for i in range(5):
+        du_utils.decrypt_key_kms(b"blob-%d" % i)
+    assert du_utils.kms_cache_stats()["entries"] == 4
+    du_utils.decrypt_key_kms(b"blob-4")
+    assert len(kms.calls) == 5
+    du_utils.decrypt_key_kms(b"blob-0")
+    assert kms.calls[-1] == b"blob-0"
+    assert len(kms.calls) == 6
+
+
+def test_recently_used_entry_survives_eviction(clock):
+    cache = DataKeyCache(ttl=60, max_entries=2)
+    cache.put(b"a", b"key-a")
+    cache.put(b"b", b"key-b")
+    assert cache.get(b"a") == b"key-a"
+    cache.put(b"c", b"key-c")
+    assert cache.get(b"a") == b"key-a"
+    assert cache.get(b"b") is None
+
+
+def _stored(cache, ciphertext):
+    return cache._entries[cache._digest(ciphertext, du_utils.KMS_REGION)][0]
+
+
+def test_evicted_key_is_zeroized(clock):
+    cache = DataKeyCache(ttl=60, max_entries=1)
+    cache.put(b"a", b"secret-a")
+    stored = _stored(cache, b"a")
+    cache.put(b"b", b"secret-b")
+    assert stored == bytearray(8)
+
+
+def test_expired_key_is_zeroized(clock):
+    cache = DataKeyCache(ttl=60, max_entries=4)
+    cache.put(b"a", b"secret-a")
+    stored = _stored(cache, b"a")
+    clock.now += 61
+    assert cache.get(b"a") is None
+    assert stored == bytearray(8)
+
+
+def test_clear_zeroizes_and_get_returns_a_copy(clock):
+    cache = DataKeyCache(ttl=60, max_entries=4)
+    cache.put(b"a", b"secret-a")
+    stored = _stored(cache, b"a")
+    key = cache.get(b"a")
+    cache.clear()
+    assert stored == bytearray(8)
+    assert key == b"secret-a"
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_always_calls_kms(kms, monkeypatch):
+    monkeypatch.setattr(du_utils, "data_key_cache", DataKeyCache(ttl=0))
+    du_utils.decrypt_key_kms(b"blob")
+    du_utils.decrypt_key_kms(b"blob")
+    assert len(kms.calls) == 2
+
+
+def test_kms_error_is_not_cached(kms, clock, monkeypatch):
+    def fail(CiphertextBlob):
+        raise RuntimeError("AccessDenied")
+
+    monkeypatch.setattr(kms, "decrypt", fail)
+    assert du_utils.decrypt_key_kms(b"blob") is None
+    assert du_utils.kms_cache_stats()["entries"] == 0
+
+
+# ---------------------------
+# CRC16
+# ---------------------------
+CRC_SAMPLES = [
+    b"",
+    b"\x00",
+    b"\xff",
+    b"123456789",
+    bytes(range(256)),
+    random.Random(1).randbytes(FRAME_CRC_OFFSET),
+    random.Random(2).randbytes(4099),
+]
+
+
+@pytest.mark.parametrize("data", CRC_SAMPLES)
+def test_table_crc_matches_bitwise_reference(data):
+    assert calculate_crc16(data) == calculate_crc16_bitwise(data)
+    assert calculate_crc16(bytearray(data)) == calculate_crc16(memoryview(data))
+
+
+def test_crc_check_value():
+    # CRC-16/MODBUS check value
+    assert calculate_crc16_bitwise(b"123456789") == 0x4B37
+
+
+@pytest.mark.parametrize("data", CRC_SAMPLES)
+@pytest.mark.parametrize("chunk", [1, 7, 64, 510])
+def test_chunked_crc16_equals_single_pass(data, chunk):
+    crc = Crc16()
+    for start in range(0, len(data), chunk):
+        crc.update(memoryview(data)[start:start + chunk])
+    assert crc.digest() == calculate_crc16_bitwise(data)
+    assert crc.length == len(data)
+    assert Crc16(data).digest() == crc.digest()
+
+
+def test_crc16_copy_and_reset():
+    crc = Crc16(b"1234")
+    branch = crc.copy().update(b"56789")
+    assert crc.digest() == calculate_crc16(b"1234")
+    assert branch.digest() == calculate_crc16(b"123456789")
+    assert branch.hexdigest() == du_utils.calculate_little_endian(0x4B37)
+    crc.reset()
+    assert (crc.digest(), crc.length) == (du_utils.CRC16_INIT, 0)
+
+
+def _frames(count, seed=3):
+    frames = bytearray(random.Random(seed).randbytes(count * FRAME_SIZE))
+    for start in range(0, len(frames), FRAME_SIZE):
+        crc = calculate_crc16_bitwise(frames[start:start + FRAME_CRC_OFFSET])
+        frames[start + FRAME_CRC_OFFSET:start + FRAME_SIZE] = crc.to_bytes(2, "little")
+    return frames
+
+
+@pytest.mark.parametrize("numpy", [True, False], ids=["numpy", "fallback"])
+def test_bulk_crc_matches_bitwise_reference(numpy, monkeypatch):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(du_utils, "_np", None)
+    frames = _frames(5)
+    expected = [
+        calculate_crc16_bitwise(frames[start:start + FRAME_CRC_OFFSET])
+        for start in range(0, len(frames), FRAME_SIZE)
+    ]
+    assert calculate_crc16_bulk(frames) == expected
+    assert calculate_crc16_bulk(bytes(frames), length=100) == [
+        calculate_crc16_bitwise(frames[start:start + 100])
+        for start in range(0, len(frames), FRAME_SIZE)
+    ]
+
+    frames[2 * FRAME_SIZE + 40] ^= 0x01
+    assert match_crc16_bulk(frames) == [True, True, False, True, True]
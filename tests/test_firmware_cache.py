@@ -0,0 +1,123 @@
+# tests/test_firmware_cache.py
+import hashlib
+import io
+import os
+import random
+
+import requests
+
+import bootloader_download as bd
+from firmware_cache import FirmwareCache
+
+KEY = b"k" * 32
+
+
+def _image(size: int, seed: int = 0):
+    plain = random.Random(seed).randbytes(size)
+    meta = {
+        "encrypted_hash": hashlib.sha256(b"enc" + plain).hexdigest(),
+        "original_hash": hashlib.sha256(plain).hexdigest(),
+        "encrypted_key": '["a2V5"]',
+    }
+    return plain, meta
+
+
+def _put(cache, file_id, plain, meta):
+    return cache.put(file_id, meta, io.BytesIO(plain))
+
+
+def test_round_trip_and_miss(tmp_path):
+    cache = FirmwareCache(str(tmp_path), max_bytes=1 << 20)
+    plain, meta = _image(4096)
+    assert cache.get(meta["encrypted_hash"], io.BytesIO()) is None
+
+    assert _put(cache, "fw-1", plain, meta)
+    sink = io.BytesIO()
+    cached = cache.get(meta["encrypted_hash"], sink)
+    assert sink.getvalue() == plain
+    assert cached["size"] == len(plain)
+    assert cached["original_hash"] == meta["original_hash"]
+    assert cache.lookup("fw-1") == meta["encrypted_hash"]
+
+    # a new instance (app restart) reads the same manifest
+    reopened = FirmwareCache(str(tmp_path), max_bytes=1 << 20)
+    assert reopened.get(meta["encrypted_hash"], io.BytesIO()) is not None
+
+
+def test_image_not_matching_its_hash_is_not_stored(tmp_path):
+    cache = FirmwareCache(str(tmp_path), max_bytes=1 << 20)
+    plain, meta = _image(4096)
+    assert not _put(cache, "fw-1", plain[:-1] + b"\0", meta)
+    assert not cache.contains(meta["encrypted_hash"])
+    assert not any(name.endswith(".bin") for name in os.listdir(tmp_path))
+
+
+def test_least_recently_used_evicted_at_byte_budget(tmp_path, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr("firmware_cache.time.time", lambda: next(clock))
+    cache = FirmwareCache(str(tmp_path), max_bytes=10000)
+    images = [_image(4000, seed) for seed in range(3)]
+    assert _put(cache, "a", *images[0])
+    assert _put(cache, "b", *images[1])
+    cache.get(images[0][1]["encrypted_hash"], io.BytesIO())  # "a" is now the most recent
+
+    assert _put(cache, "c", *images[2])
+    assert cache.contains(images[0][1]["encrypted_hash"])
+    assert not cache.contains(images[1][1]["encrypted_hash"])
+    assert cache.lookup("b") is None
+    assert cache.total_bytes() == 8000
+    assert not os.path.exists(tmp_path / f"{images[1][1]['encrypted_hash']}.bin")
+
+
+def test_image_larger_than_budget_not_stored(tmp_path):
+    cache = FirmwareCache(str(tmp_path), max_bytes=1000)
+    assert not _put(cache, "big", *_image(4000))
+    assert cache.total_bytes() == 0
+
+
+def test_tampered_blob_rejected_and_refetched(tmp_path, monkeypatch, firmware_server):
+    monkeypatch.setattr(bd, "FIRMWARE_DOWNLOAD_DIR", str(tmp_path / "partial"))
+    monkeypatch.setattr(bd, "decrypt_data_key", lambda header, callback_message: KEY)
+    plain = random.Random(3).randbytes(64 * 1024)
+    server = firmware_server(plain, KEY)
+    cache = FirmwareCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+
+    def verified():
+        sink = io.BytesIO()
+        with requests.Session() as http:
+            meta = bd.get_verified_firmware(server.url, {}, "fw", sink, lambda text: None, segments=1,
+                                            cache=cache, http=http)
+        return meta, sink.getvalue()
+
+    meta, received = verified()
+    assert received == plain and len(server.requests) == 1
+    _, received = verified()
+    assert received == plain and len(server.requests) == 1  # served from the cache
+
+    blob = tmp_path / "cache" / f"{meta['encrypted_hash']}.bin"
+    data = bytearray(blob.read_bytes())
+    data[100] ^= 0xFF
+    blob.write_bytes(bytes(data))
+
+    _, received = verified()
+    assert received == plain
+    assert len(server.requests) == 2  # the tampered copy was dropped and downloaded again
+    assert blob.read_bytes() == plain
+
+
+def test_truncated_manifest_recovers(tmp_path):
+    cache = FirmwareCache(str(tmp_path), max_bytes=1 << 20)
+    plain, meta = _image(4096)
+    assert _put(cache, "fw-1", plain, meta)
+    manifest = tmp_path / "manifest.json"
+    manifest.write_bytes(manifest.read_bytes()[:20])  # cut short on disk (power loss, bad SD card)
+    (tmp_path / "leftover.bin.tmp").write_bytes(b"x" * 100)
+
+    reopened = FirmwareCache(str(tmp_path), max_bytes=1 << 20)
+    assert reopened.get(meta["encrypted_hash"], io.BytesIO()) is None
+    assert reopened.lookup("fw-1") is None
+    # the image the manifest lost and the temp file are gone, nothing unaccounted on disk
+    assert sorted(os.listdir(tmp_path)) == ["manifest.json"]
+
+    assert _put(reopened, "fw-1", plain, meta)
+    assert FirmwareCache(str(tmp_path)).get(meta["encrypted_hash"], io.BytesIO()) is not None
@@ -0,0 +1,136 @@
+# tests/test_firmware_prefetch.py
+import io
+import random
+import threading
+
+import pytest
+import requests
+
+import bootloader_download as bd
+from firmware_cache import FirmwareCache
+from firmware_prefetch import FirmwarePrefetcher, FlashHistory
+
+KEY = b"k" * 32
+SIZE = 256 * 1024
+
+
+@pytest.fixture
+def prefetch_env(tmp_path, monkeypatch, firmware_server):
+    """(server, cache, make_prefetcher(**kwargs)) with images "a", "b", "c" of SIZE bytes."""
+    images = {name: random.Random(name).randbytes(SIZE) for name in ("a", "b", "c")}
+    server = firmware_server(images, KEY)
+    monkeypatch.setenv("SERVER_URL", server.base_url)
+    monkeypatch.setattr(bd, "FIRMWARE_DOWNLOAD_DIR", str(tmp_path / "partial"))
+    monkeypatch.setattr(bd, "decrypt_data_key", lambda header, callback_message: KEY)
+    cache = FirmwareCache(str(tmp_path / "cache"), max_bytes=1 << 24)
+
+    # downloads in progress on the client side (the server may still be writing into a closed socket)
+    fetch_firmware, lock = bd.fetch_firmware, threading.Lock()
+    server.fetching = server.fetch_peak = 0
+
+    def counted_fetch(*args, **kwargs):
+        with lock:
+            server.fetching += 1
+            server.fetch_peak = max(server.fetch_peak, server.fetching)
+        try:
+            return fetch_firmware(*args, **kwargs)
+        finally:
+            with lock:
+                server.fetching -= 1
+
+    monkeypatch.setattr(bd, "fetch_firmware", counted_fetch)
+    http = requests.Session()
+    prefetchers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("candidates", 2)
+        prefetcher = FirmwarePrefetcher(cache=cache, http=http, history=FlashHistory(str(tmp_path / "history.json")),
+                                        callback_message=lambda text: None, **kwargs)
+        prefetchers.append(prefetcher)
+        return prefetcher
+
+    yield server, cache, make
+    for prefetcher in prefetchers:
+        prefetcher.cancel()
+        if prefetcher._thread is not None:
+            prefetcher._thread.join(10)
+    http.close()
+
+
+def _options(*file_ids):
+    # newest first after ranking: versions count down in the order given
+    return [{"fileId": f, "version": f"1.{len(file_ids) - i}"} for i, f in enumerate(file_ids)]
+
+
+def _cached(cache, file_id):
+    return cache.contains(cache.lookup(file_id))
+
+
+def _finish(prefetcher):
+    prefetcher._thread.join(10)
+
+
+def test_prefetches_ranked_candidates(prefetch_env):
+    server, cache, make = prefetch_env
+    prefetcher = make(max_bytes=1 << 24)
+    prefetcher.record_flash(7, "c")
+    assert prefetcher.start("token", 7, _options("a", "b", "c")) == ["c", "a"]
+    _finish(prefetcher)
+    assert _cached(cache, "c") and _cached(cache, "a") and not _cached(cache, "b")
+
+
+def test_disk_budget_stops_the_run(prefetch_env):
+    server, cache, make = prefetch_env
+    prefetcher = make(max_bytes=SIZE + SIZE // 2, candidates=3)
+    prefetcher.start("token", 1, _options("a", "b", "c"))
+    _finish(prefetcher)
+    assert _cached(cache, "a")
+    assert not _cached(cache, "b")   # cancelled once it went over the budget
+    assert server.gets == ["a", "b"]  # "c" was skipped without a request
+
+
+def test_new_du_cancels_the_previous_run(prefetch_env):
+    server, cache, make = prefetch_env
+    server.chunk_delay = 0.02  # ~0.3 s per image
+    prefetcher = make()
+    prefetcher.start("token", 1, _options("a"))
+    while not server.gets:
+        threading.Event().wait(0.01)
+    prefetcher.start("token", 2, _options("b"))
+    _finish(prefetcher)
+
+    assert _cached(cache, "b")
+    assert not _cached(cache, "a")
+    assert server.fetch_peak == 1  # the new run waited for the cancelled one to stop
+
+
+def test_select_waits_for_the_inflight_download(prefetch_env):
+    server, cache, make = prefetch_env
+    server.chunk_delay = 0.02
+    prefetcher = make()
+    prefetcher.start("token", 1, _options("a", "b"))
+    while not server.gets:
+        threading.Event().wait(0.01)
+
+    assert prefetcher.select("a", timeout=10) is True
+    _finish(prefetcher)
+    assert server.gets == ["a"]  # "b" was cancelled before it started
+
+    # the flash path now finds "a" in the cache instead of downloading it again
+    url, headers = bd.firmware_request("token", "a")
+    sink = io.BytesIO()
+    meta = bd.get_verified_firmware(url, headers, "a", sink, lambda text: None, segments=1, cache=cache,
+                                    http=prefetcher.http)
+    assert sink.getvalue() == server.files["a"][0]
+    assert meta["size"] == SIZE
+    assert server.gets == ["a"]
+
+
+def test_select_of_another_file_cancels_everything(prefetch_env):
+    server, cache, make = prefetch_env
+    server.chunk_delay = 0.02
+    prefetcher = make()
+    prefetcher.start("token", 1, _options("a", "b"))
+    assert prefetcher.select("c") is False
+    _finish(prefetcher)
+    assert not _cached(cache, "a") and not _cached(cache, "b")
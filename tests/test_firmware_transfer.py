@@ -0,0 +1,77 @@
+# tests/test_firmware_transfer.py
+import io
+import random
+
+import pytest
+
+from firmware_transfer import (
+    ACK_BYTE,
+    NAK_BYTE,
+    PAYLOAD_SIZE,
+    FirmwareTransferError,
+    ReplyReader,
+    build_frame,
+    build_reply,
+    transfer_image,
+)
+
+
+def _image(size: int, seed: int = 0):
+    data = random.Random(seed).randbytes(size)
+    return data, io.BytesIO(data)
+
+
+def test_transfer_over_pty(du_pty):
+    host, start = du_pty
+    du = start()
+    data, image = _image(20 * PAYLOAD_SIZE + 123)
+    stats = transfer_image(host, image, len(data), lambda msg: None, window=4, ack_timeout=0.5)
+    assert du.finished.wait(1)
+    assert du.image() == data
+    assert stats["frames"] == 22
+    assert stats["retransmits"] == 0
+
+
+def test_nak_and_lost_reply_are_retransmitted(du_pty):
+    host, start = du_pty
+    du = start(nak_once={3, 7}, drop_once={5})
+    data, image = _image(12 * PAYLOAD_SIZE)
+    stats = transfer_image(host, image, len(data), lambda msg: None, window=4, ack_timeout=0.2)
+    assert du.image() == data
+    assert stats["retransmits"] == 3
+
+
+def test_stray_ack_nak_bytes_are_not_replies(du_pty):
+    host, start = du_pty
+    du = start(noise=b"\x06\x15")
+    data, image = _image(10 * PAYLOAD_SIZE)
+    stats = transfer_image(host, image, len(data), lambda msg: None, window=4, ack_timeout=0.5)
+    assert du.image() == data
+    assert stats["retransmits"] == 0
+
+
+def test_gives_up_after_max_retries(du_pty):
+    host, start = du_pty
+    start(never_ack={2})
+    data, image = _image(5 * PAYLOAD_SIZE)
+    with pytest.raises(FirmwareTransferError, match="E61"):
+        transfer_image(host, image, len(data), lambda msg: None, window=4, ack_timeout=0.05, max_retries=2)
+
+
+@pytest.mark.parametrize("encrypt", [False, True])
+def test_build_frame_reuses_out(encrypt):
+    out = build_frame(1, b"\xff" * PAYLOAD_SIZE, encrypt)
+    frame = build_frame(2, b"abc", encrypt, out)
+    assert frame is out
+    assert frame == build_frame(2, b"abc", encrypt)
+    with pytest.raises(ValueError):
+        build_frame(3, b"", encrypt, bytearray(100))
+
+
+def test_reply_reader_needs_matching_check_byte():
+    reader = ReplyReader()
+    ack = build_reply(ACK_BYTE, 0x0102)
+    assert reader.feed(b"\x06\x01\x02\x00") == []
+    assert reader.feed(b"\x15" + ack[:2]) == []
+    assert reader.feed(ack[2:]) == [(ACK_BYTE, 0x0102)]
+    assert reader.feed(build_reply(NAK_BYTE, 0x10005)) == [(NAK_BYTE, 5)]
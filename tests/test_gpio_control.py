@@ -0,0 +1,48 @@
+# tests/test_gpio_control.py
+import types
+
+import pytest
+
+import gpio_control
+from gpio_control import LibgpiodBackend, SubprocessBackend, create_backend
+
+
+def _fake_gpiod_v2(chip_class):
+    return types.SimpleNamespace(Chip=chip_class, request_lines=lambda *a, **kw: None)
+
+
+def test_v2_missing_chip_raises(monkeypatch):
+    def missing(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(gpio_control, "gpiod", _fake_gpiod_v2(missing))
+    with pytest.raises(FileNotFoundError):
+        LibgpiodBackend("gpiochip9")
+
+
+def test_auto_falls_back_to_gpioset_when_v2_chip_missing(monkeypatch):
+    def missing(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(gpio_control, "gpiod", _fake_gpiod_v2(missing))
+    monkeypatch.setattr(gpio_control, "IS_WINDOWS", False)
+    assert isinstance(create_backend("auto"), SubprocessBackend)
+
+
+def test_v2_chip_opened_up_front_and_closed(monkeypatch):
+    opened = []
+
+    class Chip:
+        def __init__(self, path):
+            self.path = path
+            self.closed = False
+            opened.append(self)
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(gpio_control, "gpiod", _fake_gpiod_v2(Chip))
+    backend = LibgpiodBackend("gpiochip4")
+    assert [chip.path for chip in opened] == ["/dev/gpiochip4"]
+    backend.close()
+    assert opened[0].closed
@@ -0,0 +1,63 @@
+# tests/test_http_client.py
+import pytest
+
+import http_client
+
+
+@pytest.fixture
+def server(firmware_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF", 0)
+    monkeypatch.setattr(http_client, "_session", None)
+    server = firmware_server(b"\x5a" * 4096)
+    server.keep_alive = True
+    yield server
+    http_client.close_http()
+
+
+def test_5xx_is_retried_on_the_same_connection(server):
+    server.statuses = [503, 502]
+    with http_client.create_session(retries=3) as session:
+        response = session.get(server.url)
+    assert response.status_code == 200
+    assert response.content == server.encrypted
+    assert server.gets == ["fw", "fw", "fw"]
+    assert len(set(server.peers)) == 1
+
+
+def test_retries_are_bounded(server):
+    server.statuses = [503] * 5
+    with http_client.create_session(retries=2) as session:
+        response = session.get(server.url)
+    assert response.status_code == 503
+    assert len(server.gets) == 3
+
+
+def test_500_is_not_retried(server):
+    server.statuses = [500]
+    with http_client.create_session() as session:
+        assert session.get(server.url).status_code == 500
+    assert len(server.gets) == 1
+
+
+def test_shared_session_reuses_its_connection(server):
+    session = http_client.get_http()
+    assert http_client.get_http() is session
+    for _ in range(3):
+        assert session.get(server.url).status_code == 200
+    assert len(server.peers) == 3
+    assert len(set(server.peers)) == 1
+
+    http_client.close_http()
+    assert http_client.get_http() is not session
+
+
+def test_warm_up_leaves_a_connection_for_the_first_request(server):
+    http_client.warm_up(server.url).join(5)
+    assert http_client.get_http().get(server.url).status_code == 200
+    assert len(server.peers) == 2  # HEAD / from the warm-up, then the GET
+    assert len(set(server.peers)) == 1
+
+
+def test_warm_up_without_url_does_nothing(monkeypatch):
+    monkeypatch.delenv("SERVER_URL", raising=False)
+    assert http_client.warm_up() is None
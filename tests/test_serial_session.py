@@ -0,0 +1,41 @@
+# tests/test_serial_session.py
+import os
+import tty
+
+import pytest
+
+import serial_session
+from serial_session import SerialSession
+
+
+@pytest.fixture
+def pty_port():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    yield os.ttyname(slave)
+    os.close(slave)
+    os.close(master)
+
+
+def test_reconnect_keeps_temporary_timeout(pty_port):
+    session = SerialSession(pty_port, timeout=0.5)
+    try:
+        with session.use(timeout=5) as ser:
+            old_port = session._ser
+            ser.reconnect()
+            assert session._ser is not old_port
+            assert ser.timeout == 5
+        assert session.timeout == 0.5
+    finally:
+        session.close()
+
+
+def test_bl_detect_level_is_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(serial_session, "turn_BL_Detect_High", lambda pin: calls.append(("high", pin)))
+    monkeypatch.setattr(serial_session, "turn_BL_Detect_Low", lambda pin: calls.append(("low", pin)))
+    session = SerialSession("/dev/null-test")
+    session.set_bl_detect(True)
+    session.set_bl_detect(True)
+    session.set_bl_detect(False)
+    assert calls == [("high", session.bl_detect_pin), ("low", session.bl_detect_pin)]
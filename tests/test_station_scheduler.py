@@ -0,0 +1,127 @@
+# tests/test_station_scheduler.py
+import random
+import threading
+import time
+
+import pytest
+import requests
+
+import bootloader_download as bd
+import serial_session
+import station_scheduler
+from firmware_cache import FirmwareCache
+from station_scheduler import DONE, StationScheduler
+
+KEY = b"k" * 32
+
+
+class FakeDu:
+    """read_du_from_serial / download_and_flash stand-ins that record when each port is inside them."""
+
+    def __init__(self, cache, hold=0.05):
+        self.cache = cache
+        self.hold = hold
+        self.intervals = []  # (port, phase, start, end)
+        self.handshakes = []
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def _inside(self, port, phase):
+        start = time.monotonic()
+        time.sleep(self.hold)
+        with self._lock:
+            self.intervals.append((port, phase, start, time.monotonic()))
+
+    def read_du_from_serial(self, token, on_message, on_success, on_error, serial_port, http=None):
+        self.handshakes.append(serial_port)
+        self.release.wait(5)
+        self._inside(serial_port, "handshake")
+        on_success({"duNumber": 1, "displayNumber": 1, "options": [], "isEncryptionEnable": False})
+
+    def download_and_flash(self, file_id, token, device_id, encrypted, on_message, on_success, on_error,
+                           segments=1, serial_port=None, http=None):
+        assert self.cache.lookup(file_id), "flash started before the image was cached"
+        self._inside(serial_port, "flash")
+        return True
+
+
+@pytest.fixture
+def station_env(tmp_path, monkeypatch, firmware_server):
+    """(server, cache, fake DU, make_scheduler(ports, pins, **kwargs))."""
+    images = {name: random.Random(name).randbytes(256 * 1024) for name in ("a", "b", "c")}
+    server = firmware_server(images, KEY)
+    server.chunk_delay = 0.005
+    monkeypatch.setenv("SERVER_URL", server.base_url)
+    monkeypatch.setattr(bd, "FIRMWARE_DOWNLOAD_DIR", str(tmp_path / "partial"))
+    monkeypatch.setattr(bd, "decrypt_data_key", lambda header, callback_message: KEY)
+    cache = FirmwareCache(str(tmp_path / "cache"), max_bytes=1 << 24)
+    fake = FakeDu(cache)
+    monkeypatch.setattr(station_scheduler, "read_du_from_serial", fake.read_du_from_serial)
+    monkeypatch.setattr(station_scheduler, "download_and_flash", fake.download_and_flash)
+    http = requests.Session()
+    schedulers = []
+
+    def make(ports, pins, **kwargs):
+        for port, pin in zip(ports, pins):
+            monkeypatch.setitem(serial_session.PORT_BL_DETECT_PINS, port, pin)
+        scheduler = StationScheduler("token", ports=ports, device_id="dev", segments=1, cache=cache, http=http,
+                                     **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield server, cache, fake, make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+    http.close()
+
+
+def _overlaps(intervals):
+    intervals = sorted(intervals, key=lambda i: i[2])
+    return any(b[2] < a[3] for a, b in zip(intervals, intervals[1:]))
+
+
+@pytest.mark.parametrize("max_downloads", [1, 2])
+def test_download_concurrency_limit_and_one_download_per_file(station_env, max_downloads):
+    server, cache, fake, make = station_env
+    ports = [f"/dev/test-limit{max_downloads}-{i}" for i in range(4)]
+    files = dict(zip(ports, ["a", "a", "b", "c"]))
+    scheduler = make(ports, [100 + i for i in range(4)], max_downloads=max_downloads)
+
+    # choose_file only sees the DU, so each station gets its own
+    for port in ports:
+        scheduler.run_station(port, lambda du, port=port: files[port])
+    states = scheduler.wait(20)
+
+    assert set(states.values()) == {DONE}
+    assert sorted(server.gets) == ["a", "b", "c"]  # "a" was downloaded once for two stations
+    assert server.peak == max_downloads
+
+
+def test_station_runs_once_per_port(station_env):
+    _, _, fake, make = station_env
+    port = "/dev/test-once"
+    scheduler = make([port], [110])
+    fake.release.clear()
+    first = scheduler.run_station(port, lambda du: "a")
+    again = scheduler.run_station(port, lambda du: "a")
+    assert again is first
+    fake.release.set()
+    assert first.result(10) is True
+    assert fake.handshakes == [port]
+
+
+def test_ports_sharing_a_bl_detect_pin_take_turns(station_env):
+    _, _, fake, make = station_env
+    shared = ["/dev/test-shared-0", "/dev/test-shared-1"]
+    own = "/dev/test-own"
+    scheduler = make(shared + [own], [120, 120, 121])
+    scheduler.start(lambda du: "b")
+    assert set(scheduler.wait(20).values()) == {DONE}
+
+    on_shared_pin = [i for i in fake.intervals if i[0] in shared]
+    assert len(on_shared_pin) == 4
+    assert not _overlaps(on_shared_pin)
+    # the station on its own pin was not held back
+    handshakes = [i for i in fake.intervals if i[1] == "handshake"]
+    assert _overlaps(handshakes)
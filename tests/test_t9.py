@@ -0,0 +1,93 @@
+# tests/test_t9.py
+import os
+import threading
+import types
+
+import pytest
+
+import t9_predict
+from t9_keypad import T9Keypad
+from t9_predict import T9Dictionary
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    d = T9Dictionary(history_path=str(tmp_path / "history.json"))
+    d.set_ssids(["Pixel-7", "Home-WiFi"])
+    d.record_login("7709912345")
+    return d
+
+
+def test_sources_limit_suggestions(dictionary):
+    assert dictionary.suggest("7") == ["Pixel-7", "7709912345"]
+    assert dictionary.suggest("7", sources=("phones",)) == ["7709912345"]
+    assert dictionary.suggest("4663", sources=("phones",)) == []
+
+
+def _composer(dictionary, sources):
+    """The parts of a T9Keypad update_composition uses, without building widgets."""
+    keypad = types.SimpleNamespace(
+        predictor=dictionary,
+        sources=sources,
+        sequence="",
+        key_map={str(d): {"letters": [str(d)]} for d in range(10)},
+        shown=None,
+        suggestions=None,
+    )
+    keypad.replace_composition = lambda text: setattr(keypad, "shown", text)
+    keypad.render_suggestions = lambda words: setattr(keypad, "suggestions", words)
+    return keypad
+
+
+@pytest.mark.parametrize("sources", [("phones",), ("ssids", "phones", "words")])
+def test_no_exact_match_shows_typed_digit(dictionary, sources):
+    keypad = _composer(dictionary, sources)
+    keypad.sequence = "7"
+    T9Keypad.update_composition(keypad)
+    assert keypad.shown == "7"
+    assert "7709912345" in keypad.suggestions
+
+
+def test_exact_match_is_shown(dictionary):
+    keypad = _composer(dictionary, ("ssids",))
+    keypad.sequence = "7493517"
+    T9Keypad.update_composition(keypad)
+    assert keypad.shown == "Pixel-7"
+
+
+def test_suggest_is_not_blocked_while_a_word_list_loads(dictionary, tmp_path):
+    first = tmp_path / "first.txt"
+    first.write_text("good\ngone\t3\n")
+    assert dictionary.load_words(str(first)) == 2
+
+    fifo = str(tmp_path / "words.fifo")
+    os.mkfifo(fifo)
+    loader = threading.Thread(target=dictionary.load_words, args=(fifo,))
+    loader.start()
+    with open(fifo, "w") as writer:
+        writer.write("home\n")
+        writer.flush()
+        # the loader is now reading the file: suggest() still answers from the old words
+        result = []
+        lookup = threading.Thread(target=lambda: result.append(dictionary.suggest("4663", sources=("words",))),
+                                  daemon=True)
+        lookup.start()
+        lookup.join(2)
+        assert result == [["gone", "good"]]
+    loader.join(5)
+    assert dictionary.suggest("4663", sources=("words",)) == ["gone", "good", "home"]
+
+
+def test_get_dictionary_builds_outside_the_lock(monkeypatch):
+    built = []
+
+    def build():
+        assert not t9_predict._dictionary_lock.locked()
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(t9_predict, "_dictionary", None)
+    monkeypatch.setattr(t9_predict, "T9Dictionary", build)
+    assert t9_predict.get_dictionary() is built[0]
+    assert t9_predict.get_dictionary() is built[0]
+    assert len(built) == 1
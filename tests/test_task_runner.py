@@ -0,0 +1,101 @@
+# tests/test_task_runner.py
+import threading
+import time
+
+import pytest
+
+from task_runner import CancelToken, TaskCancelled, TaskRunner
+
+
+@pytest.fixture
+def runner():
+    runner = TaskRunner(max_workers=2)
+    yield runner
+    runner.shutdown(wait=True)
+
+
+def _wait_for_cancel(cancel_token):
+    cancel_token.sleep(10)
+    return "not cancelled"
+
+
+def test_resubmitting_cancels_the_previous_run(runner):
+    first = runner.submit("handshake", _wait_for_cancel)
+    second = runner.submit("handshake", lambda cancel_token: "second")
+    assert second.result(2) == "second"
+    assert first.token.cancelled and first.token.reason == "replaced"
+    first.future.exception(2)
+    assert first.record["state"] == "replaced"
+
+
+def test_other_names_are_not_cancelled(runner):
+    scan = runner.submit("scan", _wait_for_cancel)
+    runner.submit("login", lambda cancel_token: None).result(2)
+    assert not scan.token.cancelled
+    assert runner.cancel("scan")
+    scan.future.exception(2)
+    assert scan.record["state"] == "cancelled"
+
+
+def test_sleep_raises_when_cancelled():
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel, ("stop",)).start()
+    started = time.monotonic()
+    with pytest.raises(TaskCancelled, match="stop"):
+        token.sleep(10)
+    assert time.monotonic() - started < 2
+    with pytest.raises(TaskCancelled):
+        token.raise_if_cancelled()
+
+
+def test_on_cancel_callbacks():
+    token = CancelToken()
+    calls = []
+    with token.on_cancel(lambda: calls.append("inside")):
+        pass
+    token.cancel()  # the block has ended: nothing left to interrupt
+    assert calls == []
+    with token.on_cancel(lambda: calls.append("already")):
+        pass
+    assert calls == ["already"]
+
+
+def test_timeout_cancels_the_token(runner):
+    task = runner.submit("flash", _wait_for_cancel, timeout=0.05)
+    task.future.exception(2)
+    assert task.token.reason == "timeout"
+    assert task.record["state"] == "timeout"
+
+
+def test_pool_is_bounded(runner):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def job(cancel_token):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(2)
+        with lock:
+            running[0] -= 1
+
+    tasks = [runner.submit(f"job-{i}", job) for i in range(5)]
+    time.sleep(0.1)
+    assert running[0] == 2
+    release.set()
+    for task in tasks:
+        task.result(2)
+    assert peak[0] == 2
+
+
+def test_exceptions_propagate(runner):
+    def fail(cancel_token):
+        raise ValueError("E99 - boom")
+
+    task = runner.submit("login", fail)
+    with pytest.raises(ValueError, match="boom"):
+        task.result(2)
+    assert task.record["state"] == "failed"
+    assert task.record["error"] == "E99 - boom"
+    assert runner.stats()["login"]["last_state"] == "failed"
@@ -0,0 +1,98 @@
+# tests/test_ui_utils.py
+import threading
+
+from ui_utils import UiEventBus
+
+
+class FakeRoot:
+    """after / after_cancel without a display; fire() plays the Tk thread. Any use off that thread fails."""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.timers = {}
+        self.delays = []
+        self._next_id = 0
+
+    def _check_thread(self):
+        assert threading.current_thread() is self.thread, "Tk called from a worker thread"
+
+    def after(self, ms, fn):
+        self._check_thread()
+        self._next_id += 1
+        self.timers[self._next_id] = fn
+        self.delays.append(ms)
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        self._check_thread()
+        self.timers.pop(after_id, None)
+
+    def fire(self, times=1):
+        for _ in range(times):
+            (after_id, fn), = self.timers.items()
+            del self.timers[after_id]
+            fn()
+
+
+def test_idle_pump_backs_off():
+    root = FakeRoot()
+    bus = UiEventBus(root, interval_ms=16, idle_ms=250)
+    bus.start()
+    root.fire(8)
+    assert root.delays == [16, 32, 64, 128, 250, 250, 250, 250, 250]
+
+
+def test_event_returns_to_frame_rate_and_burst_collapses():
+    root = FakeRoot()
+    bus = UiEventBus(root, interval_ms=16, idle_ms=250)
+    bus.start()
+    root.fire(6)
+
+    shown = []
+    bus.on_status("program", shown.append)
+    for i in range(50):
+        bus.status("program", f"{i}%")
+    root.fire()
+    assert shown == ["49%"]
+    assert bus.collapsed == 49
+    assert root.delays[-1] == 16
+    root.fire()
+    assert root.delays[-1] == 32
+
+
+def test_workers_never_touch_tk():
+    root = FakeRoot()
+    bus = UiEventBus(root)
+    bus.start()
+    calls = []
+    threads = [threading.Thread(target=lambda n=n: [bus.call(calls.append, (n, i)) for i in range(200)])
+               for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    root.fire()
+    assert len(calls) == 800
+
+
+def test_failing_event_does_not_stop_the_pump():
+    root = FakeRoot()
+    bus = UiEventBus(root)
+    bus.start()
+    calls = []
+    bus.call(lambda: 1 / 0)
+    bus.call(calls.append, 1)
+    root.fire()
+    bus.call(calls.append, 2)
+    root.fire()
+    assert calls == [1, 2]
+
+
+def test_stop_cancels_the_pump():
+    root = FakeRoot()
+    bus = UiEventBus(root)
+    bus.start()
+    bus.start()
+    assert len(root.timers) == 1
+    bus.stop()
+    assert root.timers == {}
@@ -0,0 +1,65 @@
+# tests/test_wifi_utils.py
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import wifi_utils
+from task_runner import CancelToken
+
+
+@pytest.fixture
+def fake_nmcli(tmp_path, monkeypatch):
+    """Put an nmcli on PATH running `body` (a sh script); returns the dir it writes pid files to."""
+    monkeypatch.setattr(wifi_utils, "IS_WINDOWS", False)
+
+    def install(body: str):
+        script = tmp_path / "nmcli"
+        script.write_text("#!/bin/sh\n" + body)
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        return tmp_path
+
+    return install
+
+
+def _alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def test_connect_succeeds(fake_nmcli):
+    fake_nmcli('[ "$4" = "Home-WiFi" ] && exit 0\nexit 10\n')
+    assert wifi_utils.connect_wifi("Home-WiFi", "secret") is True
+    assert wifi_utils.connect_wifi("Other", "secret") is False
+
+
+def test_cancel_kills_nmcli_and_its_children(fake_nmcli):
+    pid_dir = fake_nmcli('sleep 30 &\necho $! > "$(dirname "$0")/child.pid"\nwait\n')
+    token = CancelToken()
+    threading.Timer(0.3, token.cancel).start()
+
+    started = time.monotonic()
+    assert wifi_utils.connect_wifi("Home-WiFi", "secret", cancel_token=token) is False
+    assert time.monotonic() - started < 5
+
+    child = int((pid_dir / "child.pid").read_text())
+    for _ in range(50):
+        if not _alive(child):
+            break
+        time.sleep(0.05)
+    assert not _alive(child)
+
+
+def test_cancelled_before_start_returns_false(fake_nmcli):
+    fake_nmcli("sleep 30\n")
+    token = CancelToken()
+    token.cancel()
+    started = time.monotonic()
+    assert wifi_utils.connect_wifi("Home-WiFi", "secret", cancel_token=token) is False
+    assert time.monotonic() - started < 5
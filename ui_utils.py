@@ -1,4 +1,8 @@
 import tkinter as tk
+import queue
+import time
+
+
 class LayoutManager:
     def __init__(self, root, base_width=450, base_height=750, width=None, height=None):
         self.root = root
@@ -26,4 +30,161 @@ class LayoutManager:
     
     def font(self, size, family="Segoe UI"):
         """Returns a scaled font tuple."""
-        return (family, self.scaled(size))
\ No newline at end of file
+        return (family, self.scaled(size))
+
+UI_PUMP_INTERVAL_MS = 16  # ~one redraw per display frame
+UI_PUMP_IDLE_MS = 250     # slowest poll once the queue has been idle a while
+
+
+class UiEventBus:
+    """
+    The only way worker threads talk to Tk.
+
+    Threads put events on a queue.SimpleQueue; an after() pump on the Tk
+    thread drains it and runs them in order:
+
+        bus.call(fn, *args)         run fn(*args) on the Tk thread
+        bus.status(key, text)       status line for `key`; all updates that
+                                    arrive between two pumps collapse into one
+                                    call of the handler set with on_status()
+
+    so a burst of progress messages costs one label redraw per frame.
+
+    Workers only touch the queue, never Tk. The pump re-arms itself: every
+    interval_ms while events keep coming, and with the delay doubling up to
+    idle_ms while the queue stays empty, so an idle app wakes a few times a
+    second instead of every frame. The first event after an idle spell waits
+    at most idle_ms.
+    """
+
+    def __init__(self, root, interval_ms=UI_PUMP_INTERVAL_MS, idle_ms=UI_PUMP_IDLE_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.idle_ms = max(idle_ms, interval_ms)
+        self._queue = queue.SimpleQueue()
+        self._status_handlers = {}
+        self._after_id = None
+        self._delay = interval_ms
+        self.collapsed = 0  # status updates dropped in favour of a newer one
+        self.wakeups = 0
+
+    # ---- any thread ----
+    def call(self, fn, *args, **kwargs):
+        self._queue.put(("call", fn, args, kwargs))
+
+    def status(self, key, text):
+        self._queue.put(("status", key, text, None))
+
+    # ---- Tk thread ----
+    def on_status(self, key, handler):
+        """handler(text) shows the latest status for key."""
+        self._status_handlers[key] = handler
+
+    def start(self):
+        if self._after_id is None:
+            self._delay = self.interval_ms
+            self._after_id = self.root.after(self._delay, self._pump)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _pump(self):
+        self.wakeups += 1
+        batch = []
+        try:
+            while True:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        # only the newest status per key is shown; order with calls is kept
+        last_status = {}
+        for i, event in enumerate(batch):
+            if event[0] == "status":
+                last_status[event[1]] = i
+        self.collapsed += sum(1 for e in batch if e[0] == "status") - len(last_status)
+
+        for i, (kind, target, args, kwargs) in enumerate(batch):
+            try:
+                if kind == "call":
+                    target(*args, **kwargs)
+                elif last_status[target] == i:
+                    handler = self._status_handlers.get(target)
+                    if handler is not None:
+                        handler(args)
+            except Exception as e:
+                print("UI event error:", e)
+
+        # back to frame rate while busy, back off while idle
+        self._delay = self.interval_ms if batch else min(self._delay * 2, self.idle_ms)
+        self._after_id = self.root.after(self._delay, self._pump)
+
+
+ANIMATION_SLACK_MS = 50  # animations due this close together share one wakeup
+
+
+class AnimationScheduler:
+    """
+    One after() timer for every animation in the app (dots, spinners,
+    progress and throughput gauges).
+
+        anim.start(key, callback, interval_ms)   callback(frame) every interval_ms
+        anim.stop(key)
+
+    The timer is armed only while some animation is running, and sleeps
+    until the earliest one is due; animations due within slack_ms of each
+    other run in the same wakeup. With nothing to animate the Tk thread
+    gets no wakeups at all. Pages start their animations when shown and
+    stop them when hidden (App.show_frame calls on_show / on_hide).
+    """
+
+    def __init__(self, root, slack_ms=ANIMATION_SLACK_MS):
+        self.root = root
+        self.slack = slack_ms / 1000
+        self._animations = {}  # key -> [callback, interval (s), next due, frame]
+        self._after_id = None
+        self._due = None
+        self.wakeups = 0
+
+    def start(self, key, callback, interval_ms):
+        """(Re)start an animation; its first frame is drawn right away."""
+        self._animations[key] = [callback, interval_ms / 1000, time.monotonic(), 0]
+        self._schedule()
+
+    def stop(self, key):
+        if self._animations.pop(key, None) is not None:
+            self._schedule()
+
+    def running(self, key):
+        return key in self._animations
+
+    def _schedule(self):
+        due = min((a[2] for a in self._animations.values()), default=None)
+        if due == self._due:
+            return
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._due = due
+        if due is not None:
+            delay = max(0, int((due - time.monotonic()) * 1000))
+            self._after_id = self.root.after(delay, self._tick)
+
+    def _tick(self):
+        self._after_id = self._due = None
+        self.wakeups += 1
+        now = time.monotonic()
+        for key, animation in list(self._animations.items()):
+            callback, interval, due, frame = animation
+            if due > now + self.slack:
+                continue
+            # keep the cadence; after a stall, skip missed frames instead of bursting
+            animation[2] = due + interval if due + interval > now else now + interval
+            animation[3] = frame + 1
+            try:
+                callback(frame)
+            except Exception as e:
+                print(f"animation {key} error:", e)
+        self._schedule()
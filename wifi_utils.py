@@ -1,9 +1,34 @@
+import os
+import signal
 import subprocess
 import platform
 import time
 
+from task_runner import CancelToken
+
 IS_WINDOWS = platform.system() == "Windows"
 
+def _run_cancellable(cmd, cancel_token):
+    """subprocess.run(cmd, shell=True) that kills the command when cancel_token is cancelled. None if cancelled."""
+    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            start_new_session=not IS_WINDOWS)
+
+    def kill():
+        # the shell's children hold the pipes open too: stop the whole group
+        try:
+            if IS_WINDOWS:
+                proc.terminate()
+            else:
+                os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    with cancel_token.on_cancel(kill):
+        stdout, stderr = proc.communicate()
+    if cancel_token.is_set():
+        return None
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
 def scan_wifi():
     if IS_WINDOWS:
         try:
@@ -41,7 +66,8 @@ def scan_wifi():
     except:
         return []
 
-def connect_wifi(ssid, password):
+def connect_wifi(ssid, password, cancel_token=None):
+    cancel_token = cancel_token or CancelToken()
     if IS_WINDOWS:
         try:
             # Create a WiFi profile XML
@@ -86,15 +112,11 @@ def connect_wifi(ssid, password):
                 )
                 
                 # Connect to the network
-                result = subprocess.run(
-                    f'netsh wlan connect name="{ssid}"',
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
+                result = _run_cancellable(f'netsh wlan connect name="{ssid}"', cancel_token)
                 
-                # Wait a bit for connection to establish
-                time.sleep(3)
+                # Wait a bit for connection to establish (returns early on cancel)
+                if result is None or cancel_token.wait(3):
+                    return False
                 
                 return result.returncode == 0
             finally:
@@ -111,8 +133,8 @@ def connect_wifi(ssid, password):
 
     try:
         cmd = f"nmcli dev wifi connect '{ssid}' password '{password}'"
-        result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return result.returncode == 0
+        result = _run_cancellable(cmd, cancel_token)
+        return result is not None and result.returncode == 0
     except:
         return False
 